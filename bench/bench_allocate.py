@@ -0,0 +1,67 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+"""
+Compares per-element store creation against StoreList.allocate, on its own and within the Reader.
+
+  PYTHONPATH=. python bench/bench_allocate.py [--ndocs N] [--ntokens N]
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+import argparse
+
+from schwa import dr
+import six
+from six.moves import xrange
+
+from corpus import Doc, Token, best_of, create_corpus
+
+
+class CreateReader(dr.Reader):
+  """A Reader which allocates each store element with StoreList.create, as it used to."""
+  __slots__ = ()
+
+  def _create_stores(self, rt, doc):
+    for rtstore in rt.doc.stores:
+      if self._is_skipped(rtstore):
+        continue
+      store = getattr(doc, rtstore.defn.name)
+      for i in xrange(rt.nelem[rtstore.store_id]):
+        store.create(**rtstore.klass.build_kwargs())
+
+
+def create(n):
+  store = dr.StoreList(Token)
+  for i in xrange(n):
+    store.create()
+
+
+def allocate(n):
+  dr.StoreList(Token).allocate(n)
+
+
+def read_all(reader_klass, data):
+  for doc in reader_klass(six.BytesIO(data), Doc):
+    pass
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+  parser.add_argument('--ndocs', type=int, default=200)
+  parser.add_argument('--ntokens', type=int, default=500)
+  parser.add_argument('--nelem', type=int, default=50000)
+  parser.add_argument('--repeat', type=int, default=3)
+  args = parser.parse_args()
+
+  print('allocating {0} tokens'.format(args.nelem))
+  for name, fn in (('create', create), ('allocate', allocate)):
+    elapsed = best_of(lambda: fn(args.nelem), args.repeat)
+    print('{0:>10}: {1:8.1f} ms'.format(name, elapsed * 1000))
+
+  data = create_corpus(args.ndocs, args.ntokens)
+  print('reading {0} docs of {1} tokens, {2} bytes'.format(args.ndocs, args.ntokens, len(data)))
+  for name, klass in (('create', CreateReader), ('allocate', dr.Reader)):
+    elapsed = best_of(lambda: read_all(klass, data), args.repeat)
+    print('{0:>10}: {1:8.1f} docs/sec'.format(name, args.ndocs / elapsed))
+
+
+if __name__ == '__main__':
+  main()
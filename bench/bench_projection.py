@@ -0,0 +1,50 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+"""
+Measures what the Reader's fields= and stores= projections save over reading every field.
+
+  PYTHONPATH=. python bench/bench_projection.py [--ndocs N] [--ntokens N]
+
+A fields= projection still unpacks every value on the stream; it saves the from_wire calls,
+pointer resolution and attribute assignments of the fields left out. A stores= projection hops
+over the serialised bytes of the stores left out without unpacking them at all.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+import argparse
+
+from schwa import dr
+import six
+
+from corpus import Doc, Entity, Token, best_of, create_corpus
+
+PROJECTIONS = (
+    ('all fields', {}),
+    ('Token.raw', {'fields': {Token: ['raw'], Entity: ['label']}}),
+    ('no pointers', {'fields': {Token: ['span', 'raw', 'norm', 'pos'], Entity: ['span', 'label']}}),
+    ('tokens store', {'stores': ['tokens']}),
+)
+
+
+def read_all(data, kwargs):
+  count = 0
+  for doc in dr.Reader(six.BytesIO(data), Doc, **kwargs):
+    count += 1
+  return count
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+  parser.add_argument('--ndocs', type=int, default=200)
+  parser.add_argument('--ntokens', type=int, default=500)
+  parser.add_argument('--repeat', type=int, default=3)
+  args = parser.parse_args()
+
+  data = create_corpus(args.ndocs, args.ntokens)
+  print('{0} docs of {1} tokens, {2} bytes'.format(args.ndocs, args.ntokens, len(data)))
+  for name, kwargs in PROJECTIONS:
+    elapsed = best_of(lambda: read_all(data, kwargs), args.repeat)
+    print('{0:>14}: {1:8.1f} docs/sec'.format(name, args.ndocs / elapsed))
+
+
+if __name__ == '__main__':
+  main()
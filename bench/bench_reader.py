@@ -0,0 +1,79 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+"""
+Compares the Reader's compiled instance decoders against the original per-key decoding loop.
+
+  PYTHONPATH=. python bench/bench_reader.py [--ndocs N] [--ntokens N]
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+import argparse
+
+from schwa import dr
+import six
+from six.moves import xrange
+
+from corpus import Doc, best_of, create_corpus
+
+
+class BaselineReader(dr.Reader):
+  """The Reader as it decoded instances before the compiled decoders were introduced."""
+  __slots__ = ()
+
+  def _create_stores(self, rt, doc):
+    for rtstore in rt.doc.stores:
+      if rtstore.is_lazy():
+        continue
+      store = getattr(doc, rtstore.defn.name)
+      for i in xrange(rt.nelem[rtstore.store_id]):
+        store.create(**rtstore.klass.build_kwargs())
+
+  def _process_instance(self, rtschema, doc, instance, obj, store):
+    for key, val in six.iteritems(instance):
+      rtfield = rtschema.fields[key]
+      if rtfield.is_lazy():
+        if obj._dr_lazy is None:
+          obj._dr_lazy = {}
+        obj._dr_lazy[key] = val
+      else:
+        field = rtfield.defn.defn
+        val = field.from_wire(val, rtfield, store, doc)
+        setattr(obj, rtfield.defn.name, val)
+
+  def _read_doc_instance(self, rt, doc):
+    self._unpacker.unpack()
+    self._process_instance(rt.doc, doc, self._unpacker.unpack(), doc, None)
+
+  def _read_instances(self, rt, doc):
+    for rtstore in rt.doc.stores:
+      nbytes = self._unpacker.unpack()
+      if rtstore.is_lazy():
+        rt.lazy[rtstore.store_id] = self._read_bytes(nbytes)
+      else:
+        store = getattr(doc, rtstore.defn.name)
+        for i, instance in enumerate(self._unpacker.unpack()):
+          self._process_instance(rtstore.klass, doc, instance, store[i], store)
+
+
+def read_all(reader_klass, data):
+  count = 0
+  for doc in reader_klass(six.BytesIO(data), Doc):
+    count += 1
+  return count
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+  parser.add_argument('--ndocs', type=int, default=200)
+  parser.add_argument('--ntokens', type=int, default=500)
+  parser.add_argument('--repeat', type=int, default=3)
+  args = parser.parse_args()
+
+  data = create_corpus(args.ndocs, args.ntokens)
+  print('{0} docs of {1} tokens, {2} bytes'.format(args.ndocs, args.ntokens, len(data)))
+  for name, klass in (('baseline', BaselineReader), ('compiled', dr.Reader)):
+    elapsed = best_of(lambda: read_all(klass, data), args.repeat)
+    print('{0:>10}: {1:8.1f} docs/sec'.format(name, args.ndocs / elapsed))
+
+
+if __name__ == '__main__':
+  main()
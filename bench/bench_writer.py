@@ -0,0 +1,50 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+"""
+Compares the Writer's compiled instance encoders against the original per-field encoding loop.
+
+  PYTHONPATH=. python bench/bench_writer.py [--ndocs N] [--ntokens N]
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+import argparse
+
+from schwa import dr
+import six
+
+from corpus import Doc, best_of, create_corpus
+
+
+class BaselineWriter(dr.Writer):
+  """The Writer as it encoded instances before the compiled encoders were introduced."""
+  __slots__ = ()
+
+  def _encode(self, objs, store, doc, rtschema):
+    return [self._build_instance(obj, store, doc, rtschema) for obj in objs]
+
+
+def write_all(writer_klass, docs):
+  out = six.BytesIO()
+  writer = writer_klass(out, Doc)
+  for doc in docs:
+    writer.write(doc)
+  return out.getvalue()
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+  parser.add_argument('--ndocs', type=int, default=200)
+  parser.add_argument('--ntokens', type=int, default=500)
+  parser.add_argument('--repeat', type=int, default=3)
+  args = parser.parse_args()
+
+  data = create_corpus(args.ndocs, args.ntokens)
+  docs = list(dr.Reader(six.BytesIO(data), Doc))
+  print('{0} docs of {1} tokens, {2} bytes'.format(args.ndocs, args.ntokens, len(data)))
+  assert write_all(BaselineWriter, docs) == write_all(dr.Writer, docs)
+  for name, klass in (('baseline', BaselineWriter), ('compiled', dr.Writer)):
+    elapsed = best_of(lambda: write_all(klass, docs), args.repeat)
+    print('{0:>10}: {1:8.1f} docs/sec'.format(name, args.ndocs / elapsed))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,94 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+"""
+Synthetic docrep corpora shared by the benchmark scripts in this directory.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+import random
+import time
+
+from schwa import dr
+import six
+from six.moves import xrange
+
+
+class Token(dr.Ann):
+  span = dr.Slice()
+  raw = dr.Field()
+  norm = dr.Field()
+  pos = dr.Field()
+  head = dr.SelfPointer()
+
+  class Meta:
+    name = 'bench.Token'
+
+
+class Sentence(dr.Ann):
+  span = dr.Slice(Token)
+
+  class Meta:
+    name = 'bench.Sentence'
+
+
+class Entity(dr.Ann):
+  span = dr.Slice(Token)
+  label = dr.Field()
+  mentions = dr.Pointers(Token)
+
+  class Meta:
+    name = 'bench.Entity'
+
+
+class Doc(dr.Doc):
+  docid = dr.Field()
+  lang = dr.Field()
+  tokens = dr.Store(Token)
+  sentences = dr.Store(Sentence)
+  entities = dr.Store(Entity)
+
+  class Meta:
+    name = 'bench.Doc'
+
+
+WORDS = ('the', 'quick', 'brown', 'fox', 'jumps', 'over', 'lazy', 'dog', '.', ',', 'and', 'a')
+TAGS = ('DT', 'JJ', 'NN', 'VBZ', 'IN', '.')
+
+
+def create_doc(i, ntokens, rng):
+  doc = Doc(docid='doc-{0}'.format(i), lang='en' if i % 4 else 'de')
+  offset = 0
+  sent_start = 0
+  for t in xrange(ntokens):
+    word = rng.choice(WORDS)
+    token = doc.tokens.create(span=slice(offset, offset + len(word)), raw=word, norm=word.lower(), pos=rng.choice(TAGS))
+    if t > sent_start:
+      token.head = doc.tokens[rng.randint(sent_start, t - 1)]
+    offset += len(word) + 1
+    if word == '.' or t == ntokens - 1:
+      doc.sentences.create(span=slice(sent_start, t + 1))
+      sent_start = t + 1
+  for start in xrange(0, ntokens - 2, 10):
+    doc.entities.create(span=slice(start, start + 2), label='PER', mentions=doc.tokens[start:start + 2])
+  return doc
+
+
+def create_corpus(ndocs, ntokens, seed=0):
+  """Returns the serialised bytes of ndocs documents of ntokens tokens each."""
+  rng = random.Random(seed)
+  out = six.BytesIO()
+  writer = dr.Writer(out, Doc)
+  for i in xrange(ndocs):
+    writer.write(create_doc(i, ntokens, rng))
+  return out.getvalue()
+
+
+def best_of(fn, repeat=3):
+  """Returns the fastest wall time in seconds of repeat calls to fn."""
+  best = None
+  for i in xrange(repeat):
+    start = time.time()
+    fn()
+    elapsed = time.time() - start
+    if best is None or elapsed < best:
+      best = elapsed
+  return best
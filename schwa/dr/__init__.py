@@ -1,16 +1,28 @@
 # vim: set et nosi ai ts=2 sts=2 sw=2:
 # coding: utf-8
 from __future__ import absolute_import, print_function, unicode_literals
+import sys
+
 from .containers import StoreList
+from .dataset import DatasetReader
 from .decoration import Decorator, decorator, method_requires_decoration, requires_decoration
 from .exceptions import DependencyException, ReaderException, WriterException
 from .fields_core import Field, Pointer, Pointers, SelfPointer, SelfPointers, Slice, Store
 from .fields_extra import DateTime, Text
+from .graph import CSRGraph
+from .index import DocumentIndex, IndexedReader
 from .meta import Ann, Doc, make_ann
+from .parallel import ParallelReader
+from .payload import PayloadDecoder, decode_many, loads
 from .reader import Reader
+from .stats import ReaderStats
 from .writer import Writer
 
 from . import decorators
 
 
-__all__ = ['StoreList', 'Decorator', 'decorator', 'decorators', 'requires_decoration', 'method_requires_decoration', 'DependencyException', 'ReaderException', 'Field', 'Pointer', 'Pointers', 'SelfPointer', 'SelfPointers', 'Slice', 'Store', 'DateTime', 'Text', 'Ann', 'Doc', 'make_ann', 'Token', 'Reader', 'Writer', 'WriterException']
+__all__ = ['StoreList', 'Decorator', 'decorator', 'decorators', 'requires_decoration', 'method_requires_decoration', 'DependencyException', 'ReaderException', 'Field', 'Pointer', 'Pointers', 'SelfPointer', 'SelfPointers', 'Slice', 'Store', 'DateTime', 'Text', 'CSRGraph', 'DatasetReader', 'DocumentIndex', 'IndexedReader', 'Ann', 'Doc', 'make_ann', 'Token', 'ParallelReader', 'PayloadDecoder', 'decode_many', 'loads', 'Reader', 'ReaderStats', 'Writer', 'WriterException']
+
+if sys.version_info >= (3, 5):
+  from .aio import AsyncReader
+  __all__.append('AsyncReader')
@@ -0,0 +1,87 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+"""
+Reading of docrep streams from asyncio byte sources. Requires Python >= 3.5.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+from .framing import DEFAULT_CHUNK_SIZE, FrameBuffer
+from .reader import Reader
+
+__all__ = ['AsyncReader']
+
+
+class _FeedReader(Reader):
+  """A Reader whose unpacker is fed the bytes of complete documents as they arrive."""
+  __slots__ = ()
+
+  def feed(self, data):
+    self._unpacker.feed(data)
+
+
+class AsyncReader(object):
+  """
+  Reads documents from an asynchronous byte source, for use with ``async for``. Bytes are buffered
+  until a whole document has arrived, so the event loop is never blocked waiting on input, and
+  each document is then decoded with the same machinery as the Reader.
+  """
+  __slots__ = ('_reader', '_read_chunk', '_frames', '_chunk_size')
+
+  def __init__(self, source, doc_schema_or_doc=None, automagic=False, encoding='utf-8', chunk_size=DEFAULT_CHUNK_SIZE, stores=None, fields=None, where=None, text=None):
+    """
+    @param source An asyncio.StreamReader, or any other object with a coroutine read(n) method, or an asynchronous iterable of bytes objects.
+    @param chunk_size The number of bytes to request from source at a time.
+    The remaining parameters are as for Reader.
+    """
+    self._reader = _FeedReader(None, doc_schema_or_doc, automagic=automagic, encoding=encoding, stores=stores, fields=fields, where=where, text=text)
+    self._frames = FrameBuffer()
+    self._chunk_size = chunk_size
+    if hasattr(source, 'read'):
+      self._read_chunk = lambda: source.read(chunk_size)
+    else:
+      self._read_chunk = _ChunkIterator(source).read
+
+  @property
+  def doc_schema(self):
+    """Returns the DocSchema instance used/created during the reading process."""
+    return self._reader.doc_schema
+
+  def __aiter__(self):
+    return self
+
+  async def __anext__(self):
+    doc = await self.read()
+    if doc is None:
+      raise StopAsyncIteration()
+    return doc
+
+  async def read(self):
+    """Returns the next document, or None at the end of the stream."""
+    while True:
+      frame = self._frames.pop()
+      if frame is None:
+        chunk = await self._read_chunk()
+        if not chunk:
+          self._frames.check_eof()
+          return None
+        self._frames.feed(chunk)
+        continue
+      self._reader.feed(frame)
+      try:
+        return self._reader.next()
+      except StopIteration:
+        # The document was rejected by the where predicate.
+        continue
+
+
+class _ChunkIterator(object):
+  __slots__ = ('_iterator', )
+
+  def __init__(self, iterable):
+    self._iterator = iterable.__aiter__()
+
+  async def read(self):
+    try:
+      return await self._iterator.__anext__()
+    except StopAsyncIteration:
+      return b''
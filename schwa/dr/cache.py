@@ -0,0 +1,60 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+"""
+The caches shared by the Reader and the Writer, of what is built once per document header or
+once per runtime class layout.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+import collections
+
+__all__ = ['HeaderCache', 'layout_key']
+
+
+def layout_key(rtschema):
+  """Returns a hashable key which is equal for RTAnn instances that decode and encode identically."""
+  fields = []
+  for rtfield in rtschema.fields:
+    points_to = None
+    if rtfield.defn is not None and rtfield.is_pointer:
+      points_to = rtfield.points_to.defn.name
+    fields.append((rtfield.field_id, rtfield.defn, points_to))
+  return (rtschema.defn, tuple(fields))
+
+
+class HeaderCache(object):
+  """
+  A bounded, least recently used cache of the runtime class graphs built from document
+  headers. Documents whose headers have the same fingerprint share one immutable graph. The
+  Writer keeps the packed headers of the graphs it writes in one too.
+  """
+  __slots__ = ('_entries', 'max_entries', 'hits', 'misses')
+
+  def __init__(self, max_entries=64):
+    self._entries = collections.OrderedDict()  # { fingerprint : RTManager }
+    self.max_entries = max_entries
+    self.hits = 0
+    self.misses = 0
+
+  def __len__(self):
+    return len(self._entries)
+
+  def get(self, key):
+    rt = self._entries.pop(key, None)
+    if rt is None:
+      self.misses += 1
+    else:
+      self._entries[key] = rt
+      self.hits += 1
+    return rt
+
+  def put(self, key, rt):
+    self._entries[key] = rt
+    while len(self._entries) > self.max_entries:
+      self._evicted(*self._entries.popitem(last=False))
+
+  def clear(self):
+    while self._entries:
+      self._evicted(*self._entries.popitem(last=False))
+
+  def _evicted(self, key, rt):
+    pass
@@ -0,0 +1,17 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+"""
+Helpers shared by the generated instance decoders and encoders.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+import keyword
+import re
+
+__all__ = ['is_identifier']
+
+_IDENTIFIER_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def is_identifier(name):
+  """Returns whether name can be written as an attribute in generated source, as in obj.name."""
+  return bool(_IDENTIFIER_RE.match(name)) and not keyword.iskeyword(name)
@@ -0,0 +1,199 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+"""
+Transparent decompression of gzip, bz2 and xz compressed docrep streams.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+import bz2
+import zlib
+
+from .exceptions import ReaderException
+from .framing import DEFAULT_CHUNK_SIZE
+
+try:
+  import lzma
+except ImportError:  # Python 2 without backports.lzma.
+  try:
+    from backports import lzma
+  except ImportError:
+    lzma = None
+
+__all__ = ['DecompressedStream', 'detect_compression', 'open_decompressed']
+
+
+def _new_gzip():
+  return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+
+def _new_xz():
+  if lzma is None:
+    raise ReaderException('Reading xz compressed streams requires the lzma module')
+  return lzma.LZMADecompressor()
+
+
+# ( compression name, magic bytes, decompressor factory )
+COMPRESSIONS = (
+    ('gzip', b'\x1f\x8b', _new_gzip),
+    ('bz2', b'BZh', bz2.BZ2Decompressor),
+    ('xz', b'\xfd7zXZ\x00', _new_xz),
+)
+MAGIC_NBYTES = max(len(magic) for _, magic, _ in COMPRESSIONS)
+_ERRORS = (IOError, zlib.error) if lzma is None else (IOError, zlib.error, lzma.LZMAError)
+
+
+def detect_compression(data):
+  """Returns the name of the compression whose magic bytes data starts with, or None."""
+  for name, magic, _ in COMPRESSIONS:
+    if data.startswith(magic):
+      return name
+  return None
+
+
+def _read_exactly(istream, nbytes):
+  parts = []
+  while nbytes:
+    data = istream.read(nbytes)
+    if not data:
+      break
+    parts.append(data)
+    nbytes -= len(data)
+  return b''.join(parts)
+
+
+def _is_seekable(istream):
+  try:
+    return istream.seekable()
+  except AttributeError:
+    return hasattr(istream, 'seek') and hasattr(istream, 'tell')
+  except ValueError:  # Closed.
+    return False
+
+
+class _Prefixed(object):
+  """A file-like object which replays bytes already read from a non-seekable stream."""
+  __slots__ = ('_prefix', '_istream')
+
+  def __init__(self, prefix, istream):
+    self._prefix = prefix
+    self._istream = istream
+
+  def read(self, n=-1):
+    if not self._prefix:
+      return self._istream.read(n)
+    if n is None or n < 0:
+      data = self._prefix + self._istream.read()
+      self._prefix = b''
+    else:
+      data = self._prefix[:n]
+      self._prefix = self._prefix[n:]
+    return data
+
+
+class _Detecting(object):
+  """
+  A file-like object over a non-seekable stream, which is decompressed if it starts with the magic
+  bytes of a supported compression. Nothing is read from the stream before the first read, so
+  that a pipe or socket with no data yet does not block until then.
+  """
+  __slots__ = ('_istream', '_buffer_size', '_stream')
+
+  def __init__(self, istream, buffer_size):
+    self._istream = istream
+    self._buffer_size = buffer_size
+    self._stream = None
+
+  def read(self, n=-1):
+    if self._stream is None:
+      magic = _read_exactly(self._istream, MAGIC_NBYTES)
+      compression = detect_compression(magic)
+      self._stream = _Prefixed(magic, self._istream)
+      if compression is not None:
+        self._stream = DecompressedStream(self._stream, compression, self._buffer_size)
+    return self._stream.read(n)
+
+
+class DecompressedStream(object):
+  """
+  A read-only file-like object over the decompressed bytes of a compressed stream. Compressed bytes
+  are read from the underlying stream buffer_size bytes at a time. Concatenated compressed streams,
+  as produced by appending to a compressed file, are read as one.
+  """
+  __slots__ = ('_istream', '_new_decompressor', '_decompressor', '_buffer_size', '_buffer', '_fed', '_eof', 'compression')
+
+  def __init__(self, istream, compression, buffer_size=DEFAULT_CHUNK_SIZE):
+    """
+    @param istream A file-like object to read compressed bytes from
+    @param compression The name of the compression used, one of 'gzip', 'bz2' or 'xz'
+    @param buffer_size The number of compressed bytes to read from istream at a time
+    """
+    for name, _, new_decompressor in COMPRESSIONS:
+      if name == compression:
+        break
+    else:
+      raise ValueError('Unknown compression {0!r}'.format(compression))
+    self.compression = compression
+    self._istream = istream
+    self._new_decompressor = new_decompressor
+    self._decompressor = new_decompressor()
+    self._buffer_size = buffer_size
+    self._buffer = bytearray()
+    self._fed = False  # Whether the current decompressor has been given any input.
+    self._eof = False
+
+  def read(self, n=-1):
+    if n is None or n < 0:
+      while not self._eof:
+        self._fill()
+      n = len(self._buffer)
+    else:
+      while len(self._buffer) < n and not self._eof:
+        self._fill()
+    data = bytes(self._buffer[:n])
+    del self._buffer[:n]
+    return data
+
+  def _fill(self):
+    data = self._istream.read(self._buffer_size)
+    if not data:
+      self._eof = True
+      if self._fed and not getattr(self._decompressor, 'eof', True):
+        raise ReaderException('Truncated {0} compressed stream'.format(self.compression))
+      return
+    while data:
+      if getattr(self._decompressor, 'eof', False):
+        self._decompressor = self._new_decompressor()
+        self._fed = False
+      try:
+        self._buffer += self._decompressor.decompress(data)
+      except EOFError:  # A finished BZ2Decompressor on Python 2, which has no eof attribute.
+        self._decompressor = self._new_decompressor()
+        self._fed = False
+        continue
+      except _ERRORS as e:
+        raise ReaderException('Invalid {0} compressed stream: {1}'.format(self.compression, e))
+      self._fed = True
+      # Bytes past the end of one compressed stream start the next.
+      data = self._decompressor.unused_data
+      if data:
+        self._decompressor = self._new_decompressor()
+        self._fed = False
+
+
+def open_decompressed(istream, buffer_size=DEFAULT_CHUNK_SIZE):
+  """
+  Returns a file-like object over the decompressed bytes of istream if it starts with the magic
+  bytes of a supported compression, and otherwise a file-like object over its bytes as they are.
+  For seekable streams that are not compressed, this is istream itself, positioned where it was.
+  Non-seekable streams are not read from until the returned object is, and are always wrapped.
+  @param istream A file-like object to read from
+  @param buffer_size The number of compressed bytes to read from istream at a time
+  """
+  if not _is_seekable(istream):
+    return _Detecting(istream, buffer_size)
+  pos = istream.tell()
+  magic = _read_exactly(istream, MAGIC_NBYTES)
+  istream.seek(pos)
+  compression = detect_compression(magic)
+  if compression is None:
+    return istream
+  return DecompressedStream(istream, compression, buffer_size)
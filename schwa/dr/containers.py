@@ -1,18 +1,20 @@
 # vim: set et nosi ai ts=2 sts=2 sw=2:
 # coding: utf-8
 from __future__ import absolute_import, print_function, unicode_literals
+import itertools
 
-from six.moves import xrange
+from six.moves import map, xrange
 
 __all__ = ['StoreList']
 
 
 class StoreList(list):
-  __slots__ = ('_klass', )
+  __slots__ = ('_klass', '_graphs')
 
   def __init__(self, klass, *args, **kwargs):
     super(StoreList, self).__init__(*args, **kwargs)
     self._klass = klass
+    self._graphs = None  # { field name : CSRGraph } read by the Reader
 
   def __repr__(self):
     r = super(StoreList, self).__repr__()
@@ -33,3 +35,26 @@ class StoreList(list):
       obj = self._klass(**kwargs)
       self.append(obj)
     return slice(len(self) - n, len(self))
+
+  def graph(self, name, target_store=None):
+    """
+    Returns a CSRGraph of the pointer field name over this store's objects. If the Reader was asked
+    to read the field as a graph, that graph is returned; it reflects the field as it was read.
+    Otherwise the graph is built from the objects' current values.
+    @param target_store the store the field points into, if it is not this store
+    """
+    if self._graphs is not None and name in self._graphs:
+      return self._graphs[name]
+    from .graph import CSRGraph
+    return CSRGraph.from_store(self, name, target_store)
+
+  def allocate(self, n):
+    """
+    Appends n objects of this store's klass, returning the corresponding slice. The objects are
+    created without calling __init__, so none of their attributes are set. This is for callers,
+    such as the Reader, which go on to set every attribute of every object themselves.
+    """
+    klass = self._klass
+    start = len(self)
+    self.extend(map(klass.__new__, itertools.repeat(klass, n)))
+    return slice(start, len(self))
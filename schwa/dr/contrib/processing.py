@@ -6,7 +6,7 @@ import io
 import sys
 import threading
 
-from schwa.dr import Reader, Writer
+from schwa.dr import PayloadDecoder, Reader, Writer
 from six.moves import xrange
 
 try:
@@ -24,17 +24,16 @@ def stream_coroutine(istream, ostream, doc_class=None, automagic=False):
 
 
 def zmq_coroutine(context, dealer_url, doc_class=None, automagic=False):
-  # FIXME: reduce overhead of reader/writer creation
+  # One decoder is reused across messages, keeping its schema and header state.
+  decoder = PayloadDecoder(doc_class, automagic)
   ostream = io.BytesIO()
   socket = context.socket(zmq.REP)
   socket.connect(dealer_url)
   while True:
     msg = socket.recv()
-    istream = io.BytesIO(msg)
-    istream.seek(0)
-    reader = Reader(istream, doc_class, automagic)
-    writer = Writer(ostream, reader.doc_schema)
-    for doc in reader:
+    docs = decoder.decode(msg)
+    writer = Writer(ostream, decoder.doc_schema)
+    for doc in docs:
       res = yield(doc)
       writer.write(res or doc)
     ostream.seek(0)
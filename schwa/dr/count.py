@@ -0,0 +1,46 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+"""
+Counts the documents in docrep streams without decoding them.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+import argparse
+import sys
+
+from .reader import Reader
+
+__all__ = ['count_docs', 'main']
+
+
+def count_docs(istream, use_mmap=False):
+  """
+  Returns the number of documents remaining in the file-like object istream.
+  @param use_mmap Whether or not to read istream, which must be a regular file, through a memory map.
+  """
+  return Reader(istream, automagic=True, use_mmap=use_mmap).count()
+
+
+def main(args=None):
+  parser = argparse.ArgumentParser(description='Counts the documents in docrep streams without decoding them. Reads from stdin if no paths are given.')
+  parser.add_argument('paths', nargs='*', metavar='PATH', help='The docrep files to count')
+  args = parser.parse_args(args)
+
+  if not args.paths:
+    print(count_docs(getattr(sys.stdin, 'buffer', sys.stdin)))
+    return
+
+  total = 0
+  for path in args.paths:
+    with open(path, 'rb') as f:
+      try:
+        n = count_docs(f, use_mmap=True)
+      except ValueError:
+        n = count_docs(f)
+    total += n
+    print(n, path)
+  if len(args.paths) > 1:
+    print(total, 'total')
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,196 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+"""
+Reading of datasets which are sharded across many docrep files.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+import collections
+import glob
+import multiprocessing
+
+import six
+
+from .compression import open_decompressed
+from .framing import DEFAULT_CHUNK_SIZE
+from .parallel import _decode_batch, _init_worker, _iter_stream_tasks
+from .reader import Reader
+
+__all__ = ['DatasetReader', 'ShardProgress']
+
+SEQUENTIAL = 'sequential'
+INTERLEAVED = 'interleaved'
+ORDERS = (SEQUENTIAL, INTERLEAVED)
+
+_DONE = object()  # Marks the end of a shard.
+
+
+class ShardProgress(object):
+  """The progress of a DatasetReader through one of its shards."""
+  __slots__ = ('index', 'path', 'docs', 'started', 'done')
+
+  def __init__(self, index, path):
+    self.index = index
+    self.path = path
+    self.docs = 0  # The number of documents, or results of fn, yielded so far.
+    self.started = False
+    self.done = False
+
+  def __repr__(self):
+    return 'ShardProgress(index={0}, path={1!r}, docs={2}, done={3})'.format(self.index, self.path, self.docs, self.done)
+
+
+class _ShardReader(Reader):
+  """A Reader which reads one shard after another, keeping its schema, header cache and decoders."""
+  __slots__ = ()
+
+  def iter_docs(self, istream):
+    # The unpacker is set before each read so that the documents of several shards can be interleaved.
+    unpacker = self._new_unpacker(open_decompressed(istream))
+    while True:
+      if self._unpacker is not unpacker:
+        self._set_unpacker(unpacker)
+      try:
+        doc = self.next()
+      except StopIteration:
+        return
+      yield doc
+
+
+class DatasetReader(object):
+  """
+  Reads the documents of a dataset sharded across many docrep files. All of the shards are read
+  with one schema, header cache and set of instance decoders, so repeated headers are only ever
+  decoded once. Shards are read either one after another, or interleaved by cycling through up to
+  cycle_length of them at a time. The order is deterministic either way, including when the shards
+  are decoded in worker processes, in which case they are interleaved a batch rather than a
+  document at a time.
+
+  The progress through each shard is kept as a ShardProgress in shards, and the progress callback
+  is called with each ShardProgress once its shard has been read in full.
+  """
+
+  def __init__(self, shards, doc_schema_or_doc=None, automagic=False, processes=0, order=SEQUENTIAL, cycle_length=16, progress=None, fn=None, window=None, batch_bytes=DEFAULT_CHUNK_SIZE, encoding='utf-8'):
+    """
+    @param shards A glob pattern matching the shard files, which are read in sorted order, or a list of their paths.
+    @param doc_schema_or_doc A DocSchema instance or a Doc subclass.
+    @param automagic Whether or not to instantiate unknown classes at runtime. Not supported with processes. False by default.
+    @param processes The number of worker processes to decode the shards in, or 0 to decode them in this process. 0 by default.
+    @param order SEQUENTIAL to read the shards one after another, or INTERLEAVED to cycle through several of them at a time.
+    @param cycle_length The number of shards to cycle through at a time when order is INTERLEAVED.
+    @param progress An optional function called with the ShardProgress of each shard once it has been read.
+    @param fn An optional function applied to each document, in the worker processes if there are any, whose results are yielded instead of the documents.
+    @param window The maximum number of batches being decoded by worker processes at any time. Defaults to twice the number of processes.
+    @param batch_bytes The approximate number of serialised bytes to send to a worker process at a time.
+    @param encoding The encoding used to decode strings.
+    """
+    if isinstance(shards, (six.binary_type, six.text_type)):
+      paths = sorted(glob.glob(shards))
+      if not paths:
+        raise ValueError('No shards match {0!r}'.format(shards))
+    else:
+      paths = list(shards)
+    if order not in ORDERS:
+      raise ValueError('Invalid order {0!r}. Must be one of {1}'.format(order, ', '.join(ORDERS)))
+    if processes and doc_schema_or_doc is None:
+      raise ValueError('Reading in worker processes requires doc_schema_or_doc as automagic reading is not supported')
+    self.shards = [ShardProgress(i, path) for i, path in enumerate(paths)]
+    self._cycle_length = cycle_length if order == INTERLEAVED else 1
+    self._progress = progress
+    self._fn = fn
+    self._window = window or 2 * processes
+    self._batch_bytes = batch_bytes
+    self._reader = _ShardReader(None, doc_schema_or_doc, automagic=automagic, encoding=encoding)
+    self._pool = None
+    if processes:
+      self._pool = multiprocessing.Pool(processes, _init_worker, (doc_schema_or_doc, encoding, fn))
+
+  @property
+  def doc_schema(self):
+    """Returns the DocSchema instance used/created when reading in this process."""
+    return self._reader.doc_schema
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
+
+  def close(self):
+    """Terminates any worker processes."""
+    if self._pool is not None:
+      self._pool.terminate()
+      self._pool.join()
+      self._pool = None
+
+  def __iter__(self):
+    if self._pool is not None:
+      return self._iter_parallel()
+    return self._iter_serial()
+
+  def _interleave(self, open_shard):
+    # Cycles through the iterators returned by open_shard for up to cycle_length shards at a time,
+    # yielding ( shard, item ) pairs, and ( shard, _DONE ) once a shard's iterator is exhausted.
+    pending = iter(self.shards)
+    active = collections.deque()
+    while True:
+      while len(active) < self._cycle_length:
+        shard = next(pending, None)
+        if shard is None:
+          break
+        shard.started = True
+        active.append((shard, open_shard(shard)))
+      if not active:
+        return
+      shard, items = active.popleft()
+      item = next(items, _DONE)
+      yield shard, item
+      if item is not _DONE:
+        active.append((shard, items))
+
+  def _finish(self, shard):
+    shard.done = True
+    if self._progress is not None:
+      self._progress(shard)
+
+  def _read_shard(self, shard):
+    with open(shard.path, 'rb') as f:
+      for doc in self._reader.iter_docs(f):
+        yield doc
+
+  def _iter_serial(self):
+    fn = self._fn
+    for shard, doc in self._interleave(self._read_shard):
+      if doc is _DONE:
+        self._finish(shard)
+        continue
+      shard.docs += 1
+      yield doc if fn is None else fn(doc)
+
+  def _shard_tasks(self, shard):
+    with open(shard.path, 'rb') as f:
+      for task in _iter_stream_tasks(f, shard.path, self._batch_bytes):
+        yield task
+
+  def _iter_parallel(self):
+    pending = collections.deque()  # ( shard, AsyncResult or _DONE )
+    try:
+      for shard, task in self._interleave(self._shard_tasks):
+        if task is not _DONE:
+          if len(pending) >= self._window:
+            for item in self._collect(*pending.popleft()):
+              yield item
+          task = self._pool.apply_async(_decode_batch, (task, ))
+        pending.append((shard, task))
+      while pending:
+        for item in self._collect(*pending.popleft()):
+          yield item
+    finally:
+      self.close()
+
+  def _collect(self, shard, result):
+    if result is _DONE:
+      self._finish(shard)
+      return ()
+    items = result.get()
+    shard.docs += len(items)
+    return items
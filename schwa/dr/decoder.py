@@ -0,0 +1,217 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+"""
+Specialised per-class instance decoders used by the Reader.
+
+A decoder is generated once per distinct runtime layout of an annotation class (the fields on
+the stream, their field ids, and the stores their pointers point into). Field ids are resolved
+to fixed attribute assignments and pointer stores are bound once per call, so each object is
+built in a single pass over its class's fields.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+import array
+
+import six
+from six.moves import xrange
+
+from .codegen import is_identifier
+from .fields_core import Field, Pointer, Pointers, SelfPointer, SelfPointers, Slice
+from .framing import DeferredText
+from .graph import IN_GRAPH, TYPECODE, CSRGraph
+from .meta import Ann, Doc
+
+__all__ = ['InstanceDecoder']
+
+def _assign(name, expr):
+  if is_identifier(name):
+    return 'obj.{0} = {1}'.format(name, expr)
+  return 'setattr(obj, {0!r}, {1})'.format(str(name), expr)
+
+
+def _resolves_in_bulk(field):
+  # Subclasses of the pointer fields are resolved a column at a time through from_wire_many,
+  # unless they change how a single value is read.
+  for base in (SelfPointers, SelfPointer, Pointers, Pointer):
+    if isinstance(field, base):
+      return six.get_unbound_function(type(field).from_wire) is six.get_unbound_function(base.from_wire)
+  return False
+
+
+def _has_default_init(klass):
+  base = Doc if issubclass(klass, Doc) else Ann
+  return six.get_unbound_function(klass.__init__) is six.get_unbound_function(base.__init__)
+
+
+class InstanceDecoder(object):
+  """
+  Decodes the wire instances of one RTAnn layout into objects of its registered class.
+  """
+  __slots__ = ('klass', 'decode', 'lazy', 'text', 'needs_stores', 'source', '_bare')
+
+  def __init__(self, rtschema, stores=None, fields=None, text=None, graphs=None):
+    """
+    @param rtschema the RTAnn to decode the instances of
+    @param stores the names of the stores being read, or None if all of them are. The unpacked wire values of pointers into any other store are kept in _dr_lazy.
+    @param fields the names of the fields to decode, or None to decode all of them. The unpacked wire values of any other field are kept in _dr_lazy.
+    @param text the names of the Field fields whose str values are decoded only when first read, or None. Until then they are kept in _dr_deferred.
+    @param graphs the names of the pointer fields to read into a CSRGraph per store rather than onto the objects, or None. The field is set to IN_GRAPH on the objects, and the Writer writes the graph's edges for any object whose field is still IN_GRAPH.
+    """
+    self.klass = rtschema.defn.defn
+    # Objects can only be allocated without running __init__ if nothing but the default
+    # docrep initialisation would have happened there.
+    self._bare = issubclass(self.klass, Ann) and _has_default_init(self.klass)
+    self.lazy = frozenset(rtfield.field_id for rtfield in rtschema.fields if rtfield.is_lazy())  # ids of the fields unknown to the class, whose values are kept as RawValue spans
+    self.text = frozenset()  # field ids whose str values are unpacked as DeferredText
+    self.needs_stores = False  # Whether decoding can refer to the objects of the document's stores.
+    self.source, namespace = self._generate(rtschema, stores, fields, text or (), graphs or ())
+    six.exec_(compile(self.source, '<decoder {0}>'.format(rtschema.serial), 'exec'), namespace)
+    self.decode = namespace['decode']
+
+  def allocate(self, store, n):
+    """Appends n objects to the store, ready to be filled in by decode."""
+    if self._bare:
+      store.allocate(n)
+    else:
+      klass = self.klass
+      store.extend([klass() for i in xrange(n)])
+
+  def _generate(self, rtschema, stores, fields, text, graphs):
+    namespace = {'zip': six.moves.zip, 'setattr': setattr, 'delattr': delattr, 'slice': slice, 'DeferredText': DeferredText, 'array': array.array, 'TYPECODE': TYPECODE, 'CSRGraph': CSRGraph, 'IN_GRAPH': IN_GRAPH}
+    on_stream = {}  # { attr : RTField }
+    lazy = []
+    for rtfield in rtschema.fields:
+      if rtfield.is_lazy():
+        lazy.append(rtfield.field_id)
+      elif fields is not None and rtfield.defn.name not in fields:
+        lazy.append(rtfield.field_id)
+      elif stores is not None and rtfield.is_pointer and not (rtfield.is_slice or rtfield.is_self_pointer) and rtfield.points_to.defn.name not in stores:
+        # Pointers into stores which are not being read keep their wire value.
+        lazy.append(rtfield.field_id)
+      else:
+        on_stream[rtfield.defn.name] = rtfield
+
+    prologue = []
+    body = []
+    epilogue = []
+    deferred = []  # field ids
+    graph_names = []
+    for name, field in six.iteritems(self.klass._dr_fields):
+      kind = type(field)
+      rtfield = on_stream.get(name)
+      if rtfield is None:
+        # The field is not on the stream so it is always set to its default value.
+        if kind in (Field, Pointer, SelfPointer, Slice):
+          body.append(_assign(name, 'None'))
+        elif kind in (Pointers, SelfPointers):
+          body.append(_assign(name, '[]'))
+        else:
+          fvar = 'D_{0}'.format(len(namespace))
+          namespace[fvar] = field
+          body.append(_assign(name, '{0}.default()'.format(fvar)))
+        continue
+
+      fid = rtfield.field_id
+      if kind is Field and name in text:
+        # Deferred text is left unset, so that reading it goes through Base.__getattr__.
+        deferred.append(fid)
+        body.append('v = get({0})'.format(fid))
+        body.append('if v.__class__ is DeferredText:')
+        body.append('  deferred[{0!r}] = v'.format(str(name)))
+        if not self._bare:
+          body.append('  delattr(obj, {0!r})'.format(str(name)))
+        body.append('else:')
+        body.append('  ' + _assign(name, 'v'))
+        continue
+      elif kind is Field:
+        body.append(_assign(name, 'get({0})'.format(fid)))
+        continue
+      elif name in graphs:
+        # The wire indices go straight into the arrays of the graph, which is written out in place
+        # of the field for as long as it is left as IN_GRAPH.
+        ovar, tvar = 'O_{0}'.format(fid), 'G_{0}'.format(fid)
+        if kind in (Pointer, Pointers):
+          target = 'T_{0}'.format(fid)
+          prologue.append('{0} = getattr(doc, {1!r})'.format(target, str(rtfield.points_to.defn.name)))
+        else:
+          target = 'store'
+        graph_names.append((name, ovar, tvar, target))
+        prologue.append('{0} = array(TYPECODE, [0])'.format(ovar))
+        prologue.append('{0} = array(TYPECODE)'.format(tvar))
+        body.append('v = get({0})'.format(fid))
+        if field.is_collection:
+          body.append('if v:')
+          body.append('  {0}.extend(v)'.format(tvar))
+        else:
+          body.append('if v is not None:')
+          body.append('  {0}.append(v)'.format(tvar))
+        body.append(_assign(name, 'IN_GRAPH'))
+        body.append('{0}.append(len({1}))'.format(ovar, tvar))
+        continue
+      elif kind is Slice:
+        body.append('v = get({0})'.format(fid))
+        body.append(_assign(name, 'None if v is None else slice(v[0], v[0] + v[1])'))
+        continue
+      elif kind in (Pointer, Pointers):
+        target = 'T_{0}'.format(fid)
+        prologue.append('{0} = getattr(doc, {1!r})'.format(target, str(rtfield.points_to.defn.name)))
+        self.needs_stores = True
+      elif kind in (SelfPointer, SelfPointers):
+        target = 'store'
+      elif _resolves_in_bulk(field):
+        # The wire values are collected, and then resolved together once the loop is done.
+        fvar, rvar, cvar = 'F_{0}'.format(fid), 'R_{0}'.format(fid), 'C_{0}'.format(fid)
+        namespace[fvar] = field
+        namespace[rvar] = rtfield
+        prologue.append('{0} = []'.format(cvar))
+        body.append('{0}.append(get({1}))'.format(cvar, fid))
+        epilogue.append('for obj, v in zip(objs, {0}.from_wire_many({1}, {2}, store, doc)):'.format(fvar, cvar, rvar))
+        epilogue.append('  ' + _assign(name, 'v'))
+        self.needs_stores = True
+        continue
+      else:
+        # Fields with their own from_wire implementation are delegated to.
+        fvar, rvar = 'F_{0}'.format(fid), 'R_{0}'.format(fid)
+        namespace[fvar] = field
+        namespace[rvar] = rtfield
+        self.needs_stores = True
+        body.append('if {0} in instance:'.format(fid))
+        body.append('  ' + _assign(name, '{0}.from_wire(instance[{1}], {2}, store, doc)'.format(fvar, fid, rvar)))
+        body.append('else:')
+        body.append('  ' + _assign(name, '{0}.default()'.format(fvar)))
+        continue
+
+      body.append('v = get({0})'.format(fid))
+      if kind in (Pointer, SelfPointer):
+        body.append(_assign(name, 'None if v is None else {0}[v]'.format(target)))
+      else:
+        body.append(_assign(name, '[] if v is None else ([{0}[i] for i in v] or None)'.format(target)))
+
+    if deferred:
+      self.text = frozenset(deferred)
+      body.insert(0, 'deferred = {}')
+      body.append('obj._dr_deferred = deferred or None')
+    else:
+      body.append('obj._dr_deferred = None')
+    if lazy:
+      namespace['LAZY'] = tuple(lazy)
+      body.append('lazy = {k: instance[k] for k in LAZY if k in instance}')
+      body.append('obj._dr_lazy = lazy or None')
+    else:
+      body.append('obj._dr_lazy = None')
+    if issubclass(self.klass, Ann):
+      body.append('obj._dr_index = None')
+    if graph_names:
+      # The objects indexed are kept, so that the Writer can tell whether the indices still hold.
+      epilogue.append('nodes = tuple(store)')
+      epilogue.append('store._graphs = graphs = {}')
+      for name, ovar, tvar, target in graph_names:
+        epilogue.append('graph = graphs[{0!r}] = CSRGraph({1}, {2}, len({3}))'.format(str(name), ovar, tvar, target))
+        epilogue.append('graph._read_over = (nodes, {0})'.format('nodes' if target == 'store' else 'tuple({0})'.format(target)))
+
+    lines = ['def decode(objs, instances, store, doc):']
+    lines.extend('  ' + line for line in prologue)
+    lines.append('  for obj, instance in zip(objs, instances):')
+    lines.append('    get = instance.get')
+    lines.extend('    ' + line for line in body)
+    lines.extend('  ' + line for line in epilogue)
+    return '\n'.join(lines) + '\n', namespace
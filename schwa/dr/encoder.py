@@ -0,0 +1,145 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+"""
+Specialised per-class instance encoders used by the Writer.
+
+An encoder is generated once per distinct runtime layout of an annotation class, as for the
+decoders used by the Reader. The fields of the core types are encoded inline with fixed field
+ids, and the stores their pointers point into are bound once per call. Any other field is
+encoded through its own should_write and to_wire methods.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+import six
+
+from .codegen import is_identifier
+from .exceptions import WriterException
+from .fields_core import Field, Pointer, Pointers, SelfPointer, SelfPointers, Slice
+from .graph import IN_GRAPH
+
+__all__ = ['InstanceEncoder', 'build_instance']
+
+_TO_WIRE_ERROR = 'An exception occurred while writing field "{0}" of "{1}": {2}'
+
+
+def build_instance(obj, store, doc, rtschema):
+  """Returns the wire instance of obj, a field at a time through each field's to_wire method."""
+  instance = {}
+  if obj._dr_lazy is not None:
+    instance.update(obj._dr_lazy)
+  for f in rtschema.fields:
+    if f.is_lazy():
+      continue
+    field = f.defn.defn
+    val = getattr(obj, f.defn.name)
+    if val is IN_GRAPH:
+      continue  # Written from the store's graph by the Writer.
+    if field.should_write(val):
+      try:
+        wire_val = field.to_wire(val, f, store, doc)
+      except Exception as e:
+        raise WriterException(_TO_WIRE_ERROR.format(f.defn.name, rtschema.defn.name, e))
+      instance[f.field_id] = wire_val
+  return instance
+
+
+class _Unencodable(Exception):
+  """
+  Raised by an encoder when a slice cannot be encoded, or a pointer refers to an object which is
+  not at its index in the store.
+  """
+  pass
+
+
+def _read(name):
+  if is_identifier(name):
+    return 'v = obj.{0}'.format(name)
+  return 'v = getattr(obj, {0!r})'.format(str(name))
+
+
+class InstanceEncoder(object):
+  """
+  Encodes the objects of one RTAnn layout into their wire instances.
+  """
+  __slots__ = ('encode', 'source')
+
+  def __init__(self, rtschema):
+    """
+    @param rtschema the RTAnn to encode the instances of
+    """
+    self.source, namespace = self._generate(rtschema)
+    six.exec_(compile(self.source, '<encoder {0}>'.format(rtschema.serial), 'exec'), namespace)
+    self.encode = namespace['encode']
+
+  def _generate(self, rtschema):
+    # Objects with slices which are not slices, or with pointers to objects which are not in the
+    # store pointed into, are encoded again through build_instance, so that the WriterException
+    # raised names the field at fault. Only those values are checked; any other exception
+    # propagates as it is.
+    namespace = {'getattr': getattr, 'zip': six.moves.zip, 'build_instance': build_instance, 'RT': rtschema, 'IN_GRAPH': IN_GRAPH, 'Unencodable': _Unencodable, 'LOOKUP_ERRORS': (AttributeError, IndexError, TypeError), 'WriterException': WriterException}
+    prologue = []
+    body = []
+    for rtfield in rtschema.fields:
+      if rtfield.is_lazy():
+        continue
+      fid = rtfield.field_id
+      field = rtfield.defn.defn
+      kind = type(field)
+      body.append(_read(rtfield.defn.name))
+      if kind is Field:
+        body.append('if v is not None:')
+        body.append('  instance[{0}] = v'.format(fid))
+      elif kind is Slice:
+        body.append('if v is not None:')
+        body.append('  try:')
+        body.append('    instance[{0}] = (v.start, v.stop - v.start)'.format(fid))
+        body.append('  except LOOKUP_ERRORS:')
+        body.append('    raise Unencodable()')
+      elif kind in (Pointer, Pointers, SelfPointer, SelfPointers):
+        if kind in (Pointer, Pointers):
+          target = 'T_{0}'.format(fid)
+          prologue.append('{0} = getattr(doc, {1!r}, None)'.format(target, str(rtfield.points_to.defn.name)))
+        else:
+          target = 'store'
+        if field.is_collection:
+          body.append('if v:')  # IN_GRAPH is false.
+          body.append('  try:')
+          body.append('    indices = [o._dr_index for o in v]')
+          body.append('    for i, o in zip(indices, v):')
+          body.append('      if {0}[i] is not o:'.format(target))
+          body.append('        raise Unencodable()')
+          body.append('  except LOOKUP_ERRORS:')
+          body.append('    raise Unencodable()')
+          body.append('  instance[{0}] = indices'.format(fid))
+        else:
+          body.append('if v is not None and v is not IN_GRAPH:')
+          body.append('  try:')
+          body.append('    i = v._dr_index')
+          body.append('    if {0}[i] is not v:'.format(target))
+          body.append('      raise Unencodable()')
+          body.append('  except LOOKUP_ERRORS:')
+          body.append('    raise Unencodable()')
+          body.append('  instance[{0}] = i'.format(fid))
+      else:
+        fvar, rvar = 'F_{0}'.format(fid), 'R_{0}'.format(fid)
+        namespace[fvar] = field
+        namespace[rvar] = rtfield
+        body.append('if {0}.should_write(v):'.format(fvar))
+        body.append('  try:')
+        body.append('    instance[{0}] = {1}.to_wire(v, {2}, store, doc)'.format(fid, fvar, rvar))
+        body.append('  except Exception as e:')
+        body.append('    raise WriterException({0!r}.format(e))'.format(str(_TO_WIRE_ERROR.format(rtfield.defn.name, rtschema.defn.name, '{0}'))))
+
+    lines = ['def encode(objs, store, doc):']
+    lines.extend('  ' + line for line in prologue)
+    lines.append('  instances = []')
+    lines.append('  append = instances.append')
+    lines.append('  for obj in objs:')
+    lines.append('    try:')
+    lines.append('      lazy = obj._dr_lazy')
+    lines.append('      instance = {} if lazy is None else dict(lazy)')
+    lines.extend('      ' + line for line in body)
+    lines.append('    except Unencodable:')
+    lines.append('      instance = build_instance(obj, store, doc, RT)')
+    lines.append('    append(instance)')
+    lines.append('  return instances')
+    return '\n'.join(lines) + '\n', namespace
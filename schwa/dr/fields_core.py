@@ -32,6 +32,15 @@ def _from_wire_pointers(vals, store):
   return [store[i] for i in vals]
 
 
+def _from_wire_pointer_column(vals, store):
+  return [None if val is None else store[val] for val in vals]
+
+
+def _from_wire_pointers_column(vals, store):
+  # Absent values take the default of [], whereas empty lists on the wire are read as None.
+  return [[] if val is None else ([store[i] for i in val] or None) for val in vals]
+
+
 def _to_wire_pointers(objs, store):
   indices = []
   for obj in objs:
@@ -135,6 +144,13 @@ class Pointer(BaseField):
   def from_wire(self, val, rtfield, cur_store, doc):
     return _from_wire_pointer(val, getattr(doc, rtfield.points_to.defn.name))
 
+  def from_wire_many(self, vals, rtfield, cur_store, doc):
+    """
+    Bulk deserialization hook, returning the Python values for a column of wire values of this
+    field from one store, where None is an absent value. The store pointed into is looked up once.
+    """
+    return _from_wire_pointer_column(vals, getattr(doc, rtfield.points_to.defn.name))
+
   def to_wire(self, obj, rtfield, cur_store, doc):
     return _to_wire_pointer(obj, getattr(doc, rtfield.points_to.defn.name))
 
@@ -150,6 +166,9 @@ class Pointers(Pointer):
   def from_wire(self, vals, rtfield, cur_store, doc):
     return _from_wire_pointers(vals, getattr(doc, rtfield.points_to.defn.name))
 
+  def from_wire_many(self, vals, rtfield, cur_store, doc):
+    return _from_wire_pointers_column(vals, getattr(doc, rtfield.points_to.defn.name))
+
   def should_write(self, val):
     return val
 
@@ -173,6 +192,9 @@ class SelfPointer(BaseField):
   def from_wire(self, val, rtfield, cur_store, doc):
     return _from_wire_pointer(val, cur_store)
 
+  def from_wire_many(self, vals, rtfield, cur_store, doc):
+    return _from_wire_pointer_column(vals, cur_store)
+
   def to_wire(self, obj, rtfield, cur_store, doc):
     return _to_wire_pointer(obj, cur_store)
 
@@ -188,6 +210,9 @@ class SelfPointers(SelfPointer):
   def from_wire(self, vals, rtfield, cur_store, doc):
     return _from_wire_pointers(vals, cur_store)
 
+  def from_wire_many(self, vals, rtfield, cur_store, doc):
+    return _from_wire_pointers_column(vals, cur_store)
+
   def should_write(self, val):
     return val
 
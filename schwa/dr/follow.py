@@ -0,0 +1,83 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+"""
+Reading of streams which are still being appended to, such as a file written by another process.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+import threading
+
+from .framing import DEFAULT_CHUNK_SIZE, FrameBuffer
+
+__all__ = ['Follower']
+
+
+class Follower(object):
+  """
+  Reads the serialised documents of a stream as they are appended to it. When the end of the
+  stream is reached, istream is polled for more bytes, at intervals which start at poll_interval
+  and double up to max_poll_interval while nothing arrives. Only complete documents are returned,
+  so a document which is still being written is never decoded in part; offset is always at the
+  boundary just past the last document returned. A later reader can resume from there by seeking
+  the file object it is given to offset, as Reader has no offset-based seek of its own.
+  """
+  __slots__ = ('_istream', '_frames', '_stopped', '_chunk_size', 'poll_interval', 'max_poll_interval', 'idle_timeout', 'offset', 'polls', 'poll_time')
+
+  def __init__(self, istream, poll_interval=0.1, max_poll_interval=2.0, idle_timeout=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    @param istream A file-like object to read from, whose read method returns no bytes when it has none yet
+    @param poll_interval The number of seconds to wait before first polling istream again
+    @param max_poll_interval The largest number of seconds to wait between polls
+    @param idle_timeout The number of seconds without any new bytes after which the stream is taken to have ended, or None to follow it until stop is called
+    @param chunk_size The number of bytes to read from istream at a time
+    """
+    self._istream = istream
+    self._frames = FrameBuffer()
+    self._stopped = threading.Event()
+    self._chunk_size = chunk_size
+    self.poll_interval = poll_interval
+    self.max_poll_interval = max_poll_interval
+    self.idle_timeout = idle_timeout
+    try:
+      self.offset = istream.tell()  # The offset in istream just past the last document returned.
+    except (AttributeError, EnvironmentError):
+      self.offset = 0
+    self.polls = 0  # The number of times istream was polled after running out of bytes.
+    self.poll_time = 0.0  # The total time in seconds spent waiting between polls.
+
+  def next_frame(self):
+    """
+    Returns the bytes of the next document, waiting for one to be appended if need be, or None
+    once the stream has been stopped or has been idle for idle_timeout seconds.
+    """
+    interval = self.poll_interval
+    idle = 0.0
+    while True:
+      frame = self._frames.pop()
+      if frame is not None:
+        self.offset += len(frame)
+        return frame
+      if self._stopped.is_set():
+        return None
+      chunk = self._istream.read(self._chunk_size)
+      if chunk:
+        self._frames.feed(chunk)
+        interval = self.poll_interval
+        idle = 0.0
+        continue
+      if self.idle_timeout is not None:
+        if idle >= self.idle_timeout:
+          return None
+        interval = min(interval, self.idle_timeout - idle)
+      self._stopped.wait(interval)
+      self.polls += 1
+      self.poll_time += interval
+      idle += interval
+      interval = min(interval * 2, self.max_poll_interval)
+
+  def stop(self):
+    """Ends the stream once the documents already read have been returned. Can be called from any thread."""
+    self._stopped.set()
+
+  @property
+  def stopped(self):
+    return self._stopped.is_set()
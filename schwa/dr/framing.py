@@ -0,0 +1,421 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+"""
+Locates document boundaries in serialised docrep streams without decoding the documents.
+
+A document on the wire is
+  <doc> ::= <wire_version> <klasses> <stores> <doc_instance> <instances_groups>
+where the document instance and each of the per-store instance groups are prefixed by their
+length in bytes. Only the (small) headers need to be walked; the bodies are hopped over using
+the length prefixes.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+import io
+import mmap
+import struct
+
+import msgpack
+from six.moves import xrange
+
+from .exceptions import ReaderException
+
+__all__ = ['BufferUnpacker', 'DeferredText', 'FrameBuffer', 'RawValue', 'TextCache', 'frame_end', 'iter_frame_offsets', 'iter_frames', 'iter_instances', 'map_file', 'object_end', 'read_raw', 'unpack_instances']
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+# msgpack.Unpacker limits the length of arrays, maps and strings by its max_buffer_size, which by
+# default is far too small for the stores of large documents.
+MAX_BUFFER_SIZE = 2 ** 31 - 1
+
+_U8 = struct.Struct(str('>B'))
+_U16 = struct.Struct(str('>H'))
+_U32 = struct.Struct(str('>I'))
+_U64 = struct.Struct(str('>Q'))
+
+# Lead bytes of fixed size objects : their total size in bytes.
+_FIXED = {0xc0: 1, 0xc2: 1, 0xc3: 1, 0xca: 5, 0xcb: 9, 0xcc: 2, 0xcd: 3, 0xce: 5, 0xcf: 9, 0xd0: 2, 0xd1: 3, 0xd2: 5, 0xd3: 9, 0xd4: 3, 0xd5: 4, 0xd6: 6, 0xd7: 10, 0xd8: 18}
+# Lead bytes of str, bin and ext objects : (length struct, bytes before the payload).
+_SIZED = {0xc4: (_U8, 2), 0xc5: (_U16, 3), 0xc6: (_U32, 5), 0xc7: (_U8, 3), 0xc8: (_U16, 4), 0xc9: (_U32, 6), 0xd9: (_U8, 2), 0xda: (_U16, 3), 0xdb: (_U32, 5)}
+# Lead bytes of arrays and maps : (length struct, header size, objects per element).
+_CONTAINERS = {0xdc: (_U16, 3, 1), 0xdd: (_U32, 5, 1), 0xde: (_U16, 3, 2), 0xdf: (_U32, 5, 2)}
+# Lead bytes of unsigned integers : (struct, header size).
+_UINTS = {0xcc: (_U8, 1), 0xcd: (_U16, 1), 0xce: (_U32, 1), 0xcf: (_U64, 1)}
+
+
+def object_end(buf, pos, end=None):
+  """
+  Returns the offset just past the msgpack object which starts at pos in buf, or None if buf
+  ends before the object does.
+  """
+  if end is None:
+    end = len(buf)
+  remaining = 1
+  while remaining:
+    if pos >= end:
+      return None
+    b = _U8.unpack_from(buf, pos)[0]
+    remaining -= 1
+    if b <= 0x7f or b >= 0xe0:
+      pos += 1
+    elif b <= 0x8f:
+      remaining += 2 * (b & 0x0f)
+      pos += 1
+    elif b <= 0x9f:
+      remaining += b & 0x0f
+      pos += 1
+    elif b <= 0xbf:
+      pos += 1 + (b & 0x1f)
+    elif b in _FIXED:
+      pos += _FIXED[b]
+    elif b in _SIZED:
+      length, header = _SIZED[b]
+      if pos + header > end:
+        return None
+      pos += header + length.unpack_from(buf, pos + 1)[0]
+    elif b in _CONTAINERS:
+      length, header, per = _CONTAINERS[b]
+      if pos + header > end:
+        return None
+      remaining += per * length.unpack_from(buf, pos + 1)[0]
+      pos += header
+    else:
+      raise ReaderException('Invalid msgpack lead byte 0x{0:02x} at offset {1}'.format(b, pos))
+  return pos if pos <= end else None
+
+
+def _read_uint(buf, pos, end):
+  # Returns (value, offset past the value), or None if buf ends first.
+  if pos >= end:
+    return None
+  b = _U8.unpack_from(buf, pos)[0]
+  if b <= 0x7f:
+    return b, pos + 1
+  if b not in _UINTS:
+    raise ReaderException('Expected an unsigned integer at offset {0}, found lead byte 0x{1:02x}'.format(pos, b))
+  value, header = _UINTS[b]
+  if pos + header + value.size > end:
+    return None
+  return value.unpack_from(buf, pos + header)[0], pos + header + value.size
+
+
+def _read_array_length(buf, pos, end):
+  # Returns (length, offset past the array header), or None if buf ends first.
+  if pos >= end:
+    return None
+  b = _U8.unpack_from(buf, pos)[0]
+  if 0x90 <= b <= 0x9f:
+    return b & 0x0f, pos + 1
+  if b not in (0xdc, 0xdd):
+    raise ReaderException('Expected an array at offset {0}, found lead byte 0x{1:02x}'.format(pos, b))
+  length, header, _ = _CONTAINERS[b]
+  if pos + header > end:
+    return None
+  return length.unpack_from(buf, pos + 1)[0], pos + header
+
+
+def frame_end(buf, pos=0, end=None):
+  """
+  Returns the offset just past the serialised document which starts at pos in buf, or None if
+  buf ends before the document does. The document's instances are never decoded.
+  """
+  if end is None:
+    end = len(buf)
+  # <wire_version> <klasses>
+  for i in range(2):
+    pos = object_end(buf, pos, end)
+    if pos is None:
+      return None
+  # <stores>
+  read = _read_array_length(buf, pos, end)
+  if read is None:
+    return None
+  nstores, pos = read
+  for i in range(nstores):
+    pos = object_end(buf, pos, end)
+    if pos is None:
+      return None
+  # <doc_instance> and each <instances_group>, all of which are ( <instances_nbytes>, <instances> ).
+  for i in range(nstores + 1):
+    read = _read_uint(buf, pos, end)
+    if read is None:
+      return None
+    nbytes, pos = read
+    pos += nbytes
+  return pos if pos <= end else None
+
+
+def iter_frame_offsets(buf, pos=0, end=None):
+  """
+  Yields the (start, end) byte offsets of each of the documents in buf. buf can be any object
+  supporting the buffer protocol, such as bytes or an mmap.
+  """
+  if end is None:
+    end = len(buf)
+  while pos < end:
+    frame = frame_end(buf, pos, end)
+    if frame is None:
+      raise ReaderException('Truncated document at offset {0}'.format(pos))
+    yield pos, frame
+    pos = frame
+
+
+class FrameBuffer(object):
+  """
+  Accumulates arbitrarily sized chunks of a serialised docrep stream, splitting off the bytes of
+  each document once all of them have arrived.
+  """
+  __slots__ = ('_buf', '_pos')
+
+  def __init__(self):
+    self._buf = bytearray()
+    self._pos = 0
+
+  def __len__(self):
+    """Returns the number of buffered bytes which have not been returned by pop."""
+    return len(self._buf) - self._pos
+
+  def feed(self, chunk):
+    del self._buf[:self._pos]
+    self._pos = 0
+    self._buf.extend(chunk)
+
+  def pop(self):
+    """Returns the bytes of the next complete document, or None if it has not fully arrived."""
+    if self._pos == len(self._buf):
+      return None
+    end = frame_end(self._buf, self._pos)
+    if end is None:
+      return None
+    frame = bytes(self._buf[self._pos:end])
+    self._pos = end
+    return frame
+
+  def check_eof(self):
+    """Raises a ReaderException if the stream ended part way through a document."""
+    if self._pos < len(self._buf):
+      raise ReaderException('Truncated document at the end of the stream ({0} trailing bytes)'.format(len(self)))
+
+
+def iter_frames(istream, chunk_size=DEFAULT_CHUNK_SIZE):
+  """
+  Yields the serialised bytes of each of the documents read from the file-like object istream.
+  Only complete documents are ever yielded.
+  """
+  frames = FrameBuffer()
+  while True:
+    frame = frames.pop()
+    if frame is not None:
+      yield frame
+      continue
+    chunk = istream.read(chunk_size)
+    if not chunk:
+      frames.check_eof()
+      return
+    frames.feed(chunk)
+
+
+def map_file(istream):
+  """
+  Returns a read-only mmap of the file underlying the file-like object istream, or None if it
+  does not have one which can be mapped.
+  """
+  try:
+    fileno = istream.fileno()
+  except (AttributeError, EnvironmentError, io.UnsupportedOperation):
+    return None
+  try:
+    return mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+  except (ValueError, EnvironmentError):
+    # Empty files and non-regular files such as pipes cannot be mapped.
+    return None
+
+
+class RawValue(object):
+  """
+  The still serialised msgpack bytes of a value, kept so that it can be written back out verbatim.
+  """
+  __slots__ = ('data', )
+
+  def __init__(self, data):
+    self.data = data
+
+  def __eq__(self, other):
+    return isinstance(other, RawValue) and bytes(self.data) == bytes(other.data)
+
+  def __ne__(self, other):
+    return not self == other
+
+  def __hash__(self):
+    return hash(bytes(self.data))
+
+  def __repr__(self):
+    return 'RawValue({0!r})'.format(bytes(self.data))
+
+  def unpack(self, **kwargs):
+    """Returns the deserialised value."""
+    return msgpack.unpackb(self.data, **kwargs)
+
+
+class TextCache(object):
+  """
+  Decodes serialised msgpack str values, sharing the decoded string between repeated values. Once
+  max_size distinct values have been decoded the cache is emptied, bounding its memory use.
+  """
+  __slots__ = ('_texts', '_max_size', '_kwargs')
+
+  def __init__(self, max_size=1 << 16, **kwargs):
+    """
+    @param max_size the maximum number of decoded strings to keep
+    @param kwargs keyword arguments passed through to msgpack.unpackb
+    """
+    self._texts = {}  # { serialised bytes : decoded string }
+    self._max_size = max_size
+    self._kwargs = kwargs
+
+  def __len__(self):
+    return len(self._texts)
+
+  def decode(self, data):
+    text = self._texts.get(data)
+    if text is None:
+      if len(self._texts) >= self._max_size:
+        self._texts.clear()
+      text = self._texts[data] = msgpack.unpackb(data, **self._kwargs)
+    return text
+
+
+class DeferredText(RawValue):
+  """
+  The serialised bytes of a msgpack str value whose decoding has been deferred until it is read.
+  """
+  __slots__ = ('_cache', )
+
+  def __init__(self, data, cache):
+    super(DeferredText, self).__init__(data)
+    self._cache = cache
+
+  def __repr__(self):
+    return 'DeferredText({0!r})'.format(bytes(self.data))
+
+  def decode(self):
+    """Returns the decoded string, shared with any equal value read through the same cache."""
+    return self._cache.decode(self.data)
+
+
+def _is_str(buf, pos):
+  b = _U8.unpack_from(buf, pos)[0]
+  return 0xa0 <= b <= 0xbf or 0xd9 <= b <= 0xdb
+
+
+def _unpack_instance(unpacker, data, raw_keys, text_keys, text_cache):
+  instance = {}
+  for j in xrange(unpacker.read_map_header()):
+    key = unpacker.unpack()
+    if key in raw_keys:
+      start = unpacker.tell()
+      unpacker.skip()
+      instance[key] = RawValue(data[start:unpacker.tell()])
+    elif key in text_keys and _is_str(data, unpacker.tell()):
+      start = unpacker.tell()
+      unpacker.skip()
+      instance[key] = DeferredText(bytes(data[start:unpacker.tell()]), text_cache)
+    else:
+      instance[key] = unpacker.unpack()
+  return instance
+
+
+def unpack_instances(data, raw_keys, many=True, text_keys=frozenset(), text_cache=None, **kwargs):
+  """
+  Unpacks a serialised <instances> array, or a single <instance> map if many is False, keeping
+  the values of the field ids in raw_keys as RawValue spans of data. str values of the field ids
+  in text_keys are kept as DeferredText values which decode through text_cache. Any other
+  keyword arguments are passed through to msgpack.Unpacker.
+  """
+  if many:
+    return list(iter_instances(data, raw_keys, text_keys, text_cache, **kwargs)[1])
+  unpacker = msgpack.Unpacker(max_buffer_size=MAX_BUFFER_SIZE, **kwargs)
+  unpacker.feed(data)
+  return _unpack_instance(unpacker, data, raw_keys, text_keys, text_cache)
+
+
+def iter_instances(data, raw_keys=frozenset(), text_keys=frozenset(), text_cache=None, **kwargs):
+  """
+  Returns the number of instances in a serialised <instances> array, and an iterator which
+  unpacks them one at a time as unpack_instances does, so that the decoded array is never held in
+  memory as a whole.
+  """
+  unpacker = msgpack.Unpacker(max_buffer_size=MAX_BUFFER_SIZE, **kwargs)
+  unpacker.feed(data)
+  ninstances = unpacker.read_array_header()
+  if raw_keys or text_keys:
+    instances = (_unpack_instance(unpacker, data, raw_keys, text_keys, text_cache) for i in xrange(ninstances))
+  else:
+    unpack = unpacker.unpack
+    instances = (unpack() for i in xrange(ninstances))
+  return ninstances, instances
+
+
+def read_raw(unpacker):
+  """
+  Returns the bytes of the next msgpack object of unpacker without unpacking it. The pure Python
+  msgpack.Unpacker keeps the object in its buffer; any other unpacker has the object repacked.
+  """
+  if isinstance(unpacker, BufferUnpacker):
+    return unpacker.read_raw()
+  if not hasattr(unpacker, '_buffer'):
+    return msgpack.packb(unpacker.unpack(), use_bin_type=True)
+  start = unpacker.tell()
+  unpacker.skip()
+  # Only the bytes before the start of the object can have been dropped from the buffer.
+  end = unpacker._buff_i
+  return bytes(unpacker._buffer[end - (unpacker.tell() - start):end])
+
+
+class BufferUnpacker(object):
+  """
+  Unpacks consecutive msgpack objects from a buffer, such as a memoryview of an mmap, supporting
+  the subset of the msgpack.Unpacker interface used by the Reader. read_bytes returns views into
+  the buffer rather than copies of it.
+  """
+  __slots__ = ('_buf', '_pos', '_end', '_kwargs')
+
+  def __init__(self, buf, **kwargs):
+    """
+    @param buf the buffer to unpack from, which should support slicing without copying
+    @param kwargs keyword arguments passed through to msgpack.unpackb
+    """
+    self._buf = buf
+    self._pos = 0
+    self._end = len(buf)
+    self._kwargs = kwargs
+
+  def _object_end(self):
+    end = object_end(self._buf, self._pos, self._end)
+    if end is None:
+      raise msgpack.OutOfData()
+    return end
+
+  def unpack(self):
+    end = self._object_end()
+    value = msgpack.unpackb(self._buf[self._pos:end], **self._kwargs)
+    self._pos = end
+    return value
+
+  def skip(self):
+    self._pos = self._object_end()
+
+  def read_raw(self):
+    """Returns the bytes of the next msgpack object without unpacking it."""
+    end = self._object_end()
+    raw = bytes(self._buf[self._pos:end])
+    self._pos = end
+    return raw
+
+  def read_bytes(self, n):
+    if self._pos + n > self._end:
+      raise msgpack.OutOfData()
+    view = self._buf[self._pos:self._pos + n]
+    self._pos += n
+    return view
+
+  def tell(self):
+    return self._pos
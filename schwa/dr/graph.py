@@ -0,0 +1,246 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+"""
+Compressed sparse row (CSR) views over the pointer fields of a store.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+import array
+import operator
+
+from six.moves import xrange
+
+__all__ = ['CSRGraph', 'IN_GRAPH']
+
+TYPECODE = str('l')
+
+
+class _InGraph(object):
+  """The type of IN_GRAPH."""
+  __slots__ = ()
+
+  def __repr__(self):
+    return 'IN_GRAPH'
+
+  def __bool__(self):
+    return False
+
+  __nonzero__ = __bool__
+
+  def __reduce__(self):
+    return 'IN_GRAPH'
+
+
+# The value of a pointer field on the objects of a store whose values of it the Reader read into a
+# CSRGraph instead. Assigning any other value, including None, replaces the edges read.
+IN_GRAPH = _InGraph()
+
+
+class CSRGraph(object):
+  """
+  The edges of a pointer field over the objects of a store, as two flat arrays: the targets of
+  node i are targets[offsets[i]:offsets[i + 1]], as indices into the store pointed into. Both are
+  array.array objects, so they can be wrapped without copying by numpy.frombuffer for vectorised
+  work. Nodes are store indices throughout. The traversals, which follow edges from target to
+  target, need the edges to point into the nodes' own store, and raise ValueError for a graph
+  into another store of a different size.
+  """
+  __slots__ = ('offsets', 'targets', 'ntargets', '_read_over')
+
+  def __init__(self, offsets, targets, ntargets=None):
+    """
+    @param offsets an array of len(nodes) + 1 offsets into targets, starting at 0
+    @param targets an array of the target indices of every edge, grouped by source node
+    @param ntargets the number of objects in the store pointed into, which defaults to the number of nodes
+    """
+    self.offsets = offsets
+    self.targets = targets
+    self.ntargets = len(offsets) - 1 if ntargets is None else ntargets
+    self._read_over = None  # ( nodes, targets ) tuples of the objects of the stores a read graph indexes into.
+
+  def __len__(self):
+    return len(self.offsets) - 1
+
+  def __repr__(self):
+    return 'CSRGraph(nodes={0}, edges={1})'.format(len(self), len(self.targets))
+
+  def __eq__(self, other):
+    return isinstance(other, CSRGraph) and self.offsets == other.offsets and self.targets == other.targets and self.ntargets == other.ntargets
+
+  def __ne__(self, other):
+    return not self == other
+
+  __hash__ = None
+
+  @classmethod
+  def from_lists(klass, lists, ntargets=None):
+    """
+    Returns the graph whose i'th node has the targets in lists[i], where None is no targets.
+    @param ntargets the number of objects in the store pointed into, which defaults to len(lists)
+    """
+    offsets = array.array(TYPECODE, [0])
+    targets = array.array(TYPECODE)
+    for values in lists:
+      if values:
+        targets.extend(values)
+      offsets.append(len(targets))
+    return klass(offsets, targets, ntargets)
+
+  @classmethod
+  def from_store(klass, store, name, target_store=None):
+    """
+    Returns the graph of the pointer field name over the decoded objects of store.
+    @param target_store the store the field points into, which defaults to store itself
+    """
+    if target_store is None:
+      target_store = store
+    index = {id(obj): i for i, obj in enumerate(target_store)}
+    lists = []
+    for obj in store:
+      value = getattr(obj, name)
+      if value is None:
+        lists.append(None)
+      elif isinstance(value, list):
+        lists.append([index[id(target)] for target in value])
+      else:
+        lists.append((index[id(value)], ))
+    return klass.from_lists(lists, len(target_store))
+
+  def _indexes(self, nodes, targets):
+    # Returns whether the graph was read over exactly these objects, so that its indices are still theirs.
+    if self._read_over is None:
+      return False
+    for objs, read in zip((nodes, targets), self._read_over):
+      if len(objs) != len(read) or not all(map(operator.is_, objs, read)):
+        return False
+    return True
+
+  def _check_square(self):
+    if self.ntargets != len(self):
+      raise ValueError('The graph has {0} nodes but points into a store of {1}, so its edges cannot be followed from node to node'.format(len(self), self.ntargets))
+
+  def degree(self, node):
+    """Returns the number of edges out of node."""
+    return self.offsets[node + 1] - self.offsets[node]
+
+  def neighbours(self, node):
+    """Returns an array of the targets of the edges out of node."""
+    return self.targets[self.offsets[node]:self.offsets[node + 1]]
+
+  def transpose(self):
+    """
+    Returns the graph with every edge reversed, such as the parents of each node of a tree. Its
+    nodes are the objects of the store pointed into.
+    """
+    n = self.ntargets
+    counts = [0] * (n + 1)
+    for target in self.targets:
+      counts[target + 1] += 1
+    for i in xrange(n):
+      counts[i + 1] += counts[i]
+    offsets = array.array(TYPECODE, counts)
+    targets = array.array(TYPECODE, [0] * len(self.targets))
+    offs, tgts = self.offsets, self.targets
+    for source in xrange(len(self)):
+      for e in xrange(offs[source], offs[source + 1]):
+        target = tgts[e]
+        targets[counts[target]] = source
+        counts[target] += 1
+    return CSRGraph(offsets, targets, len(self))
+
+  def roots(self):
+    """Returns a list of the nodes with no edges into them, in store order."""
+    self._check_square()
+    has_parent = bytearray(len(self))
+    for target in self.targets:
+      has_parent[target] = 1
+    return [i for i, flag in enumerate(has_parent) if not flag]
+
+  def preorder(self, starts=None):
+    """
+    Returns arrays of the nodes, and of their depths, in depth-first pre-order from each of starts,
+    which defaults to the roots, visiting children in order. Nodes reachable along several paths are
+    visited once per path.
+    """
+    self._check_square()
+    if starts is None:
+      starts = self.roots()
+    offs, tgts = self.offsets, self.targets
+    node_depths = [0] * len(self)
+    nodes = array.array(TYPECODE)
+    stack = list(reversed(starts))
+    while stack:
+      node = stack.pop()
+      nodes.append(node)
+      a, b = offs[node], offs[node + 1]
+      if a != b:
+        depth = node_depths[node] + 1
+        children = tgts[a:b]
+        for child in children:
+          node_depths[child] = depth
+        children.reverse()
+        stack.extend(children)
+    depths = array.array(TYPECODE, [node_depths[node] for node in nodes])
+    return nodes, depths
+
+  def depths(self, starts=None):
+    """
+    Returns an array of the smallest number of edges from any of starts, which defaults to the
+    roots, to each node, or -1 for nodes which cannot be reached.
+    """
+    self._check_square()
+    if starts is None:
+      starts = self.roots()
+    offs, tgts = self.offsets, self.targets
+    depths = array.array(TYPECODE, [-1] * len(self))
+    frontier = []
+    for start in starts:
+      if depths[start] == -1:
+        depths[start] = 0
+        frontier.append(start)
+    depth = 0
+    while frontier:
+      depth += 1
+      following = []
+      for node in frontier:
+        for target in tgts[offs[node]:offs[node + 1]]:
+          if depths[target] == -1:
+            depths[target] = depth
+            following.append(target)
+      frontier = following
+    return depths
+
+  def topological_order(self):
+    """
+    Returns an array of the nodes ordered so that every edge goes from an earlier node to a later
+    one. Raises ValueError if the graph has a cycle.
+    """
+    self._check_square()
+    offs, tgts = self.offsets, self.targets
+    indegree = [0] * len(self)
+    for target in tgts:
+      indegree[target] += 1
+    order = array.array(TYPECODE, [i for i, d in enumerate(indegree) if d == 0])
+    i = 0
+    while i < len(order):
+      node = order[i]
+      i += 1
+      for target in tgts[offs[node]:offs[node + 1]]:
+        indegree[target] -= 1
+        if indegree[target] == 0:
+          order.append(target)
+    if len(order) != len(self):
+      raise ValueError('The graph has a cycle')
+    return order
+
+  def heights(self):
+    """
+    Returns an array of the largest number of edges from each node down to a node without any.
+    Raises ValueError if the graph has a cycle.
+    """
+    offs, tgts = self.offsets, self.targets
+    heights = array.array(TYPECODE, [0] * len(self))
+    for node in reversed(self.topological_order()):
+      a, b = offs[node], offs[node + 1]
+      if a != b:
+        heights[node] = max([heights[target] for target in tgts[a:b]]) + 1
+    return heights
@@ -0,0 +1,235 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+"""
+Random access to the documents of a seekable docrep file through a document offset index.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+import array
+import os
+import struct
+import sys
+import zlib
+
+import six
+from six.moves import xrange
+
+from .exceptions import ReaderException
+from .framing import DEFAULT_CHUNK_SIZE, iter_frame_offsets, iter_frames, map_file
+from .reader import Reader
+
+__all__ = ['DocumentIndex', 'IndexedReader']
+
+try:
+  array.array(str('Q'))
+  _OFFSET_TYPECODE = str('Q')
+except ValueError:
+  _OFFSET_TYPECODE = str('L')
+
+CHECKSUM_NBYTES = 4096  # The number of bytes at each end of the source file which are checksummed.
+
+
+def _source_mtime(istream):
+  try:
+    return os.fstat(istream.fileno()).st_mtime
+  except (AttributeError, EnvironmentError, ValueError):  # Not backed by a file.
+    return 0.0
+
+
+def _describe_source(istream):
+  """Returns the size, modification time and checksum of the seekable istream, leaving its position unchanged."""
+  pos = istream.tell()
+  istream.seek(0, os.SEEK_END)
+  size = istream.tell()
+  istream.seek(0)
+  checksum = zlib.crc32(istream.read(CHECKSUM_NBYTES))
+  if size > CHECKSUM_NBYTES:
+    istream.seek(max(CHECKSUM_NBYTES, size - CHECKSUM_NBYTES))
+    checksum = zlib.crc32(istream.read(CHECKSUM_NBYTES), checksum)
+  istream.seek(pos)
+  return size, _source_mtime(istream), checksum & 0xffffffff
+
+
+class DocumentIndex(object):
+  """
+  Maps document numbers to the byte offset at which each document starts in a docrep file.
+  Offsets are held in a compact array of 64-bit integers, and are saved as little-endian 64-bit
+  integers whatever the platform.
+  """
+  __slots__ = ('offsets', 'source_size', 'source_mtime', 'source_checksum')
+
+  MAGIC = b'DRINDEX1'
+  HEADER = struct.Struct(str('<8sQdIQ'))  # magic, source_size, source_mtime, source_checksum, number of documents
+  OFFSET = struct.Struct(str('<Q'))
+
+  def __init__(self, offsets=None, source_size=0, source_mtime=0.0, source_checksum=0):
+    self.offsets = array.array(_OFFSET_TYPECODE, offsets or ())
+    self.source_size = source_size
+    self.source_mtime = source_mtime  # 0.0 if the source was not a file.
+    self.source_checksum = source_checksum  # The CRC32 of the first and last CHECKSUM_NBYTES bytes of the source.
+
+  def __len__(self):
+    return len(self.offsets)
+
+  def __getitem__(self, i):
+    return self.offsets[i]
+
+  def describes(self, istream):
+    """Returns whether this index was built for the seekable file-like object istream as it is now."""
+    return (self.source_size, self.source_mtime, self.source_checksum) == _describe_source(istream)
+
+  @classmethod
+  def build(klass, istream, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Builds the index of the seekable file-like object istream from its start. Document bodies are
+    skipped over using their length prefixes; if the file can be memory mapped, their bytes are
+    never read at all. The position of istream is left unchanged.
+    """
+    size, mtime, checksum = _describe_source(istream)
+    index = klass(source_size=size, source_mtime=mtime, source_checksum=checksum)
+    mapped = map_file(istream)
+    if mapped is not None:
+      try:
+        for start, end in iter_frame_offsets(mapped):
+          index.offsets.append(start)
+      finally:
+        mapped.close()
+    else:
+      pos = istream.tell()
+      istream.seek(0)
+      offset = 0
+      for frame in iter_frames(istream, chunk_size):
+        index.offsets.append(offset)
+        offset += len(frame)
+      istream.seek(pos)
+    return index
+
+  @classmethod
+  def load(klass, path):
+    """Loads an index previously written by save."""
+    with open(path, 'rb') as f:
+      header = f.read(klass.HEADER.size)
+      if len(header) != klass.HEADER.size:
+        raise ReaderException('{0!r} is not a docrep index file'.format(path))
+      magic, source_size, source_mtime, source_checksum, ndocs = klass.HEADER.unpack(header)
+      if magic != klass.MAGIC:
+        raise ReaderException('{0!r} is not a docrep index file'.format(path))
+      index = klass(source_size=source_size, source_mtime=source_mtime, source_checksum=source_checksum)
+      data = f.read(ndocs * klass.OFFSET.size)
+    if len(data) != ndocs * klass.OFFSET.size:
+      raise ReaderException('Truncated docrep index file {0!r}'.format(path))
+    if index.offsets.itemsize == klass.OFFSET.size:
+      if six.PY3:
+        index.offsets.frombytes(data)
+      else:
+        index.offsets.fromstring(data)
+      if sys.byteorder == 'big':
+        index.offsets.byteswap()
+    else:
+      index.offsets.extend(struct.unpack(str('<{0}Q'.format(ndocs)), data))
+    return index
+
+  def save(self, path):
+    """Writes the index to path."""
+    offsets = self.offsets
+    if offsets.itemsize != self.OFFSET.size:
+      data = struct.pack(str('<{0}Q'.format(len(offsets))), *offsets)
+    else:
+      if sys.byteorder == 'big':
+        offsets = array.array(_OFFSET_TYPECODE, offsets)
+        offsets.byteswap()
+      data = offsets.tobytes() if six.PY3 else offsets.tostring()
+    with open(path, 'wb') as f:
+      f.write(self.HEADER.pack(self.MAGIC, self.source_size, self.source_mtime, self.source_checksum, len(offsets)))
+      f.write(data)
+
+
+class IndexedReader(Reader):
+  """
+  A Reader over a seekable docrep file which supports len(), indexing, slicing and seek. Iteration
+  continues from the current position.
+  """
+  __slots__ = ('_istream', '_index', '_position')
+
+  def __init__(self, istream, doc_schema_or_doc=None, automagic=False, encoding='utf-8', index=None):
+    """
+    @param istream A seekable file-like object to read from
+    @param doc_schema_or_doc A DocSchema instance or a Doc subclass.
+    @param automagic Whether or not to instantiate unknown classes at runtime. False by default.
+    @param index A DocumentIndex instance, or the path of an index file to load. If the index file does not exist, or was built for a file of a different size, modification time or checksum, it is (re)built and saved. If None, the index is built in memory.
+    """
+    super(IndexedReader, self).__init__(istream, doc_schema_or_doc, automagic=automagic, encoding=encoding, decompress=False)
+    self._istream = istream
+    if index is None:
+      index = DocumentIndex.build(istream)
+    elif isinstance(index, (six.binary_type, six.text_type)):
+      path = index
+      index = None
+      if os.path.exists(path):
+        index = DocumentIndex.load(path)
+        if not index.describes(istream):
+          index = None
+      if index is None:
+        index = DocumentIndex.build(istream)
+        index.save(path)
+    self._index = index
+    self._position = 0
+    self.seek(0)
+
+  @property
+  def index(self):
+    """Returns the DocumentIndex used by this reader."""
+    return self._index
+
+  def __len__(self):
+    return len(self._index)
+
+  def __getitem__(self, key):
+    if isinstance(key, slice):
+      return [self._read_at(i) for i in xrange(*key.indices(len(self)))]
+    if key < 0:
+      key += len(self)
+    if not 0 <= key < len(self):
+      raise IndexError('document index out of range')
+    return self._read_at(key)
+
+  def _read_at(self, i):
+    if i != self._position:
+      self.seek(i)
+    return self.next()
+
+  def seek(self, i):
+    """Positions the reader so that the next document read is document number i."""
+    if not 0 <= i <= len(self):
+      raise IndexError('document index out of range')
+    if i == len(self):
+      self._istream.seek(0, os.SEEK_END)
+    else:
+      self._istream.seek(self._index[i])
+    self._set_unpacker(self._new_unpacker(self._istream))
+    self._position = i
+
+  def tell(self):
+    """Returns the number of the next document to be read."""
+    return self._position
+
+  def skip(self, n=1):
+    n = min(n, len(self) - self._position)
+    self.seek(self._position + n)
+    return n
+
+  def count(self):
+    n = len(self) - self._position
+    self.seek(len(self))
+    return n
+
+  def read(self):
+    doc = super(IndexedReader, self).read()
+    if doc is not None:
+      self._position += 1
+    return doc
+
+  def stream(self):
+    stream = super(IndexedReader, self).stream()
+    if stream is not None:
+      self._position += 1
+    return stream
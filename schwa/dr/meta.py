@@ -142,7 +142,7 @@ class MetaBase(type):
 
 @six.add_metaclass(MetaBase)
 class Base(object):
-  __slots__ = ('_dr_lazy', )
+  __slots__ = ('_dr_lazy', '_dr_deferred')
 
   def __init__(self, **kwargs):
     for name, field in six.iteritems(self._dr_fields):
@@ -150,10 +150,22 @@ class Base(object):
     for name, store in six.iteritems(self._dr_stores):
       setattr(self, name, store.default())
     self._dr_lazy = None
+    self._dr_deferred = None
 
     for k, v in six.iteritems(kwargs):
       setattr(self, k, v)
 
+  def __getattr__(self, name):
+    # Only called for attributes which are not set, as fields whose text the Reader deferred
+    # decoding of are until they are first read.
+    if not name.startswith('_dr_'):
+      deferred = getattr(self, '_dr_deferred', None)
+      if deferred and name in deferred:
+        value = deferred.pop(name).decode()
+        setattr(self, name, value)
+        return value
+    raise AttributeError('{0!r} object has no attribute {1!r}'.format(type(self).__name__, name))
+
   @classmethod
   def from_wire(klass, **kwargs):
     for k, v in six.iteritems(kwargs):
@@ -0,0 +1,164 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+"""
+Decoding of a single docrep stream across a pool of worker processes.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+import collections
+import io
+import multiprocessing
+
+import six
+
+from .compression import open_decompressed
+from .framing import DEFAULT_CHUNK_SIZE, iter_frame_offsets, iter_frames, map_file
+from .reader import Reader
+
+__all__ = ['ParallelReader']
+
+
+class _BatchReader(Reader):
+  """A Reader which decodes successive, independent batches of serialised documents."""
+  __slots__ = ()
+
+  def decode(self, data):
+    self._set_unpacker(self._new_unpacker(io.BytesIO(data)))
+    return list(self)
+
+
+_worker = {}  # Per-process state of the pool workers.
+
+
+def _init_worker(doc_schema_or_doc, encoding, fn):
+  _worker['reader'] = _BatchReader(io.BytesIO(), doc_schema_or_doc, encoding=encoding)
+  _worker['fn'] = fn
+  _worker['files'] = {}
+
+
+def _decode_batch(task):
+  if isinstance(task, tuple):
+    path, start, end = task
+    f = _worker['files'].get(path)
+    if f is None:
+      f = _worker['files'][path] = open(path, 'rb')
+    f.seek(start)
+    data = f.read(end - start)
+  else:
+    data = task
+  docs = _worker['reader'].decode(data)
+  fn = _worker['fn']
+  if fn is not None:
+    return [fn(doc) for doc in docs]
+  return docs
+
+
+def _iter_stream_tasks(istream, path, batch_bytes):
+  # Yields what each worker needs to read a batch of about batch_bytes from istream: a
+  # (path, start, end) byte range of the file at path, or the serialised bytes. Compressed input
+  # cannot be read from byte ranges, so it is decompressed here instead.
+  stream = open_decompressed(istream)
+  if stream is not istream:
+    path = None
+  istream = stream
+  mapped = map_file(istream) if path is not None else None
+  if mapped is not None:
+    try:
+      start = None
+      for begin, end in iter_frame_offsets(mapped):
+        if start is None:
+          start = begin
+        if end - start >= batch_bytes:
+          yield (path, start, end)
+          start = None
+      if start is not None:
+        yield (path, start, end)
+    finally:
+      mapped.close()
+    return
+
+  batch = []
+  nbytes = 0
+  for frame in iter_frames(istream):
+    batch.append(frame)
+    nbytes += len(frame)
+    if nbytes >= batch_bytes:
+      yield b''.join(batch)
+      batch = []
+      nbytes = 0
+  if batch:
+    yield b''.join(batch)
+
+
+class ParallelReader(object):
+  """
+  Decodes the documents of one docrep stream in a pool of worker processes, yielding them in
+  their original order. Document boundaries are found from the length prefixes without decoding
+  anything, and consecutive documents are sent to the workers in batches. At most ``window``
+  batches are in flight at any time, which bounds memory use.
+
+  Documents are returned from the workers by pickling, so the document classes must be importable
+  by the workers and automagic reading is not supported. If ``fn`` is provided, it is applied to
+  each document in the worker and its results are yielded instead, avoiding the cost of sending
+  the documents back.
+  """
+
+  def __init__(self, source, doc_schema_or_doc, processes=None, window=None, batch_bytes=DEFAULT_CHUNK_SIZE, fn=None, encoding='utf-8'):
+    """
+    @param source The path of a docrep file, or a file-like object to read from. Workers read byte ranges from files themselves; otherwise the serialised documents are sent to them.
+    @param doc_schema_or_doc A DocSchema instance or a Doc subclass.
+    @param processes The number of worker processes. Defaults to the number of CPUs.
+    @param window The maximum number of batches being decoded at any time. Defaults to twice the number of processes.
+    @param batch_bytes The approximate number of serialised bytes to send to a worker at a time.
+    @param fn An optional function applied to each document in the worker processes.
+    @param encoding The encoding used to decode strings.
+    """
+    if doc_schema_or_doc is None:
+      raise ValueError('ParallelReader requires doc_schema_or_doc as automagic reading is not supported')
+    if processes is None:
+      processes = multiprocessing.cpu_count()
+    self._source = source
+    self._window = window or 2 * processes
+    self._batch_bytes = batch_bytes
+    self._pool = multiprocessing.Pool(processes, _init_worker, (doc_schema_or_doc, encoding, fn))
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
+
+  def close(self):
+    """Terminates the worker processes."""
+    if self._pool is not None:
+      self._pool.terminate()
+      self._pool.join()
+      self._pool = None
+
+  def _iter_tasks(self):
+    # Yields what each worker needs to read a batch: a (path, start, end) byte range of a file or the serialised bytes.
+    if isinstance(self._source, (six.binary_type, six.text_type)):
+      with open(self._source, 'rb') as f:
+        for task in _iter_stream_tasks(f, self._source, self._batch_bytes):
+          yield task
+    else:
+      name = getattr(self._source, 'name', None)
+      if not isinstance(name, (six.binary_type, six.text_type)) or self._source.tell() != 0:
+        name = None
+      for task in _iter_stream_tasks(self._source, name, self._batch_bytes):
+        yield task
+
+  def __iter__(self):
+    if self._pool is None:
+      raise ValueError('ParallelReader has been closed')
+    pending = collections.deque()
+    try:
+      for task in self._iter_tasks():
+        if len(pending) >= self._window:
+          for doc in pending.popleft().get():
+            yield doc
+        pending.append(self._pool.apply_async(_decode_batch, (task, )))
+      while pending:
+        for doc in pending.popleft().get():
+          yield doc
+    finally:
+      self.close()
@@ -0,0 +1,101 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+"""
+Decoding of docrep documents from in-memory payloads, such as the messages of a queue.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+import collections
+import threading
+
+import msgpack
+
+from .exceptions import ReaderException
+from .framing import BufferUnpacker
+from .reader import Reader
+
+__all__ = ['PayloadDecoder', 'decode_many', 'loads']
+
+
+class PayloadDecoder(Reader):
+  """
+  Decodes the documents in successive, independent payloads of serialised bytes. The decoded
+  schema, the runtime classes of each distinct header, and the compiled instance decoders are kept
+  across payloads, so decoding many small payloads costs little more than reading them as one
+  stream. Payloads are read in place without being copied. Unless copy is True, the serialised
+  bytes kept for lazy stores, lazy fields and deferred text are views into them: the payloads
+  should not be modified afterwards, and each is kept alive for as long as any document decoded
+  from it still holds such a view.
+  """
+  __slots__ = ('_copy', )
+
+  def __init__(self, doc_schema_or_doc=None, automagic=False, encoding='utf-8', stores=None, fields=None, where=None, text=None, copy=False):
+    """
+    @param copy Whether or not to copy the serialised bytes kept on the documents out of the payload, so that the payload is neither aliased nor kept alive by them. False by default.
+    The remaining parameters are as for Reader.
+    """
+    super(PayloadDecoder, self).__init__(None, doc_schema_or_doc, automagic=automagic, encoding=encoding, stores=stores, fields=fields, where=where, text=text)
+    self._mapped = True
+    self._copy = copy
+
+  def _kept_bytes(self, data):
+    return bytes(data) if self._copy else data
+
+  def decode(self, data):
+    """
+    Returns a list of the documents in data.
+    @param data A bytes, bytearray or memoryview object of serialised documents
+    """
+    self._set_unpacker(BufferUnpacker(memoryview(data), use_list=True, encoding=self._encoding))
+    try:
+      return list(self)
+    except msgpack.OutOfData:
+      raise ReaderException('Truncated document at the end of the payload')
+
+  def loads(self, data):
+    """
+    Returns the only document in data.
+    @param data A bytes, bytearray or memoryview object of one serialised document
+    """
+    docs = self.decode(data)
+    if len(docs) != 1:
+      raise ReaderException('Expected one document but found {0}'.format(len(docs)))
+    return docs[0]
+
+
+MAX_LOADS_DECODERS = 8  # The number of PayloadDecoders kept per thread by loads.
+
+_local = threading.local()  # Per-thread PayloadDecoders reused by loads.
+
+
+def loads(data, doc_schema_or_doc=None, automagic=False, encoding='utf-8', copy=False):
+  """
+  Returns the only document in the serialised bytes data, which may be a memoryview. A decoder is
+  kept per thread for each of the MAX_LOADS_DECODERS combinations of arguments used most recently,
+  so repeated calls reuse the decoded schema and header state of previous ones.
+  @param data A bytes, bytearray or memoryview object of one serialised document
+  The remaining parameters are as for PayloadDecoder.
+  """
+  decoders = getattr(_local, 'decoders', None)
+  if decoders is None:
+    decoders = _local.decoders = collections.OrderedDict()  # { arguments : PayloadDecoder }, least recently used first
+  key = (doc_schema_or_doc, automagic, encoding, copy)
+  decoder = decoders.pop(key, None)
+  if decoder is None:
+    decoder = PayloadDecoder(doc_schema_or_doc, automagic=automagic, encoding=encoding, copy=copy)
+    while len(decoders) >= MAX_LOADS_DECODERS:
+      decoders.popitem(last=False)
+  decoders[key] = decoder
+  return decoder.loads(data)
+
+
+def decode_many(payloads, doc_schema_or_doc=None, automagic=False, encoding='utf-8', stores=None, fields=None, where=None, text=None, copy=False):
+  """
+  Yields the documents in each of an iterable of payloads of serialised bytes in turn, decoding
+  them all with one PayloadDecoder.
+  @param payloads An iterable of bytes, bytearray or memoryview objects
+  The remaining parameters are as for PayloadDecoder.
+  """
+  decoder = PayloadDecoder(doc_schema_or_doc, automagic=automagic, encoding=encoding, stores=stores, fields=fields, where=where, text=text, copy=copy)
+  for data in payloads:
+    for doc in decoder.decode(data):
+      yield doc
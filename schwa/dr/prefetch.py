@@ -0,0 +1,96 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+"""
+Reading ahead of the decoder on a background thread.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+import threading
+import time
+
+from six.moves import queue
+
+from .framing import DEFAULT_CHUNK_SIZE, iter_frames
+
+__all__ = ['Prefetcher']
+
+_END = object()  # Marks the end of the stream on the queue.
+
+
+class _Failure(object):
+  __slots__ = ('exception', )
+
+  def __init__(self, exception):
+    self.exception = exception
+
+
+def _put(frames, closed, item):
+  # Blocks while the queue is full, giving up once the consumer has gone away.
+  while not closed.is_set():
+    try:
+      frames.put(item, timeout=0.1)
+      return True
+    except queue.Full:
+      pass
+  return False
+
+
+def _prefetch(istream, chunk_size, frames, closed):
+  # The thread only holds the queue and the event, so that an abandoned Prefetcher can be collected.
+  try:
+    for frame in iter_frames(istream, chunk_size):
+      if not _put(frames, closed, frame):
+        return
+    _put(frames, closed, _END)
+  except Exception as e:
+    _put(frames, closed, _Failure(e))
+
+
+class Prefetcher(object):
+  """
+  Reads the serialised documents of a stream on a background thread into a bounded queue, so that
+  reading from istream overlaps with decoding. Records how often, and for how long, the consumer
+  had to wait for the next document to be read.
+  """
+  __slots__ = ('_frames', '_closed', '_done', '_thread', 'stalls', 'stall_time')
+
+  def __init__(self, istream, depth=16, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    @param istream A file-like object to read from
+    @param depth The maximum number of documents to read ahead
+    @param chunk_size The number of bytes to read from istream at a time
+    """
+    self._frames = queue.Queue(depth)
+    self._closed = threading.Event()
+    self._done = False
+    self.stalls = 0  # The number of times next_frame had to wait.
+    self.stall_time = 0.0  # The total time in seconds spent waiting in next_frame.
+    self._thread = threading.Thread(target=_prefetch, args=(istream, chunk_size, self._frames, self._closed))
+    self._thread.daemon = True
+    self._thread.start()
+
+  def __del__(self):
+    self._closed.set()
+
+  def next_frame(self):
+    """Returns the bytes of the next document, or None at the end of the stream."""
+    if self._done:
+      return None
+    try:
+      item = self._frames.get_nowait()
+    except queue.Empty:
+      start = time.time()
+      item = self._frames.get()
+      self.stall_time += time.time() - start
+      self.stalls += 1
+    if item is _END:
+      self._done = True
+      return None
+    if isinstance(item, _Failure):
+      self._done = True
+      raise item.exception
+    return item
+
+  def close(self):
+    """Stops reading ahead."""
+    self._closed.set()
+    self._done = True
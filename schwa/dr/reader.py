@@ -3,43 +3,105 @@
 from __future__ import absolute_import, print_function, unicode_literals
 import inspect
 import io
+import itertools
+import os
+import threading
 
 import msgpack
 import six
 from six.moves import xrange
 
+from .compression import DecompressedStream, open_decompressed
+from .cache import HeaderCache
+from .containers import StoreList
 from .constants import FieldType
+from .decoder import InstanceDecoder
 from .exceptions import ReaderException
+from .follow import Follower
 from .fields_core import Field, Pointer, Pointers, SelfPointer, SelfPointers, Slice, Store
-from .meta import Doc
-from .rtklasses import get_or_create_klass
+from .framing import MAX_BUFFER_SIZE, BufferUnpacker, TextCache, iter_instances, map_file, read_raw, unpack_instances
+from .meta import Ann, Doc
+from .prefetch import Prefetcher
+from .rtklasses import forget_klasses, get_or_create_klass
 from .runtime import RTManager, AutomagicRTManager
 from .schema import AnnSchema, DocSchema, FieldSchema, StoreSchema
+from .stats import ReaderStats, clock
 
-__all__ = ['Reader']
+__all__ = ['AutomagicCache', 'DocStream', 'HeaderCache', 'Reader']
+
+
+class AutomagicCache(HeaderCache):
+  """
+  A HeaderCache of the runtime class graphs built by automagic reading. Identical headers are
+  read with the same runtime-created classes; when a graph is evicted, its classes are
+  unregistered so that they can be garbage collected once no documents refer to them.
+  """
+  __slots__ = ()
+
+  def _evicted(self, key, rt):
+    forget_klasses(rtklass.defn.defn for rtklass in rt.klasses)
+
+
+# The class graphs of all automagic readers. Its max_entries, 64 by default, is a process-wide
+# setting: it bounds the number of distinct headers whose classes are kept registered at once.
+AUTOMAGIC_CACHE = AutomagicCache()
 
 
 class RTReader(object):
-  __slots__ = ('_doc_schema', '_wire_version')
+  __slots__ = ('_doc_schema', '_wire_version', '_cache', '_encoding')
   Manager = RTManager
 
   WIRE_VERSION = 3  # Version of the wire protocol the reader knows how to process.
 
-  def __init__(self, schema):
+  def __init__(self, schema, cache=None, encoding=None):
     self._doc_schema = schema
+    self._cache = cache
+    self._encoding = encoding
 
   def __call__(self, unpacker):
     try:
       self._wire_version = unpacker.unpack()
     except msgpack.OutOfData:
       return None
-    # Validate wire protocol version.
-    if self._wire_version not in (self.WIRE_VERSION, 2):
-      raise ReaderException('Invalid wire format version. Stream has version {0} but I can read {1}. Ensure the input is not plain text.'.format(self._wire_version, self.WIRE_VERSION))
+    self.check_wire_version(self._wire_version)
+
+    if self._cache is None:
+      klasses = unpacker.unpack()
+      stores = unpacker.unpack()
+      rt = self._build(klasses, stores)
+      rt.nelem = [store[2] for store in stores]
+      rt.lazy = [None] * len(rt.nelem)
+      return rt
+    # The <klasses> of a cached header are never unpacked.
+    klasses = read_raw(unpacker)
+    stores = unpacker.unpack()
+    return self._shared(klasses, stores).derive([store[2] for store in stores])
+
+  def _fingerprint(self, klasses, stores):
+    # The store sizes are the only part of the header which changes between otherwise identical documents.
+    return (self._wire_version, klasses, tuple((store[0], store[1]) for store in stores))
+
+  def _unpack_klasses(self, klasses):
+    return msgpack.unpackb(klasses, use_list=True, encoding=self._encoding)
+
+  def _shared(self, klasses, stores):
+    key = (self._doc_schema, ) + self._fingerprint(klasses, stores)
+    rt = self._cache.get(key)
+    if rt is None:
+      rt = self._build(self._unpack_klasses(klasses), stores)
+      rt.shared = True
+      self._cache.put(key, rt)
+    return rt
+
+  @classmethod
+  def check_wire_version(klass, wire_version):
+    if wire_version not in (klass.WIRE_VERSION, 2):
+      raise ReaderException('Invalid wire format version. Stream has version {0} but I can read {1}. Ensure the input is not plain text.'.format(wire_version, klass.WIRE_VERSION))
 
+  def _build(self, klasses, stores):
     rt = self.Manager()
-    self._read_klasses(rt, unpacker.unpack())
-    self._read_stores(rt, unpacker.unpack())
+    self._read_klasses(rt, klasses)
+    self._read_stores(rt, stores)
     self._backfill_pointer_fields(rt)
     return rt
 
@@ -124,7 +186,7 @@ class RTReader(object):
   def _read_stores(self, rt, read):
     # read <stores> ::= [ <store> ]
     #       <store> ::= ( <store_name>, <klass_id>, <store_nelem> )
-    for s, (store_name, klass_id, nelem) in enumerate(read):
+    for s, (store_name, klass_id, _) in enumerate(read):
       if self._wire_version == 2:
         store_name = store_name.decode('utf-8')
       # Sanity check on the value of the klass_id.
@@ -139,10 +201,7 @@ class RTReader(object):
           break
 
       # Construct and keep track of RTStore.
-      if defn is None:
-        rtstore = rt.Store(s, store_name, rt.klasses[klass_id], nelem=nelem)
-      else:
-        rtstore = rt.Store(s, store_name, rt.klasses[klass_id], nelem=nelem, defn=defn)
+      rtstore = rt.Store(s, store_name, rt.klasses[klass_id], defn=defn, manager=rt)
       rt.doc.stores.append(rtstore)
 
       # Ensure that the stream store and the static store agree on the klass they're storing.
@@ -176,30 +235,55 @@ class RTReader(object):
 
 
 class AutomagicRTReader(RTReader):
+  __slots__ = ('_known', )
   Manager = AutomagicRTManager
-  _automagic_count = 0
 
-  def __call__(self, unpacker):
-    rt = super(AutomagicRTReader, self).__call__(unpacker)
-    if rt is not None:
-      self._do_automagic(rt)
-      self._automagic_count += 1
+  _module_ids = itertools.count()  # Each distinct header has its classes created in a new module.
+  _lock = threading.Lock()
+
+  def __init__(self, schema=None, cache=AUTOMAGIC_CACHE, encoding=None):
+    """
+    @param schema the DocSchema whose annotation classes are read into when the stream has them, or None to create every class
+    """
+    super(AutomagicRTReader, self).__init__(None, cache, encoding)
+    self._known = schema
+
+  def _shared(self, klasses, stores):
+    # Readers with different known classes build different graphs from the same header.
+    key = (self._known, ) + self._fingerprint(klasses, stores)
+    with self._lock:
+      rt = self._cache.get(key)
+      if rt is None:
+        module_id = next(self._module_ids)
+        self._doc_schema = get_or_create_klass(module_id, 'Doc', is_doc=True).schema()
+        if self._known is not None:
+          for ann_schema in self._known.klasses():
+            self._doc_schema.add_klass(ann_schema)
+          for store_schema in self._known.stores():
+            self._doc_schema.add_store(store_schema.name, store_schema)
+        rt = self._build(self._unpack_klasses(klasses), stores)
+        self._do_automagic(rt, module_id)
+        rt.shared = True
+        self._cache.put(key, rt)
     return rt
 
-  def _do_automagic(self, rt):
+  def _do_automagic(self, rt, module_id):
     automagic_rtklasses = []
     # Instantiate a class for all of the lazy classes.
     for rtklass in rt.klasses:
       if rtklass.is_lazy():
-        self._automagic_klass(rtklass)
+        self._automagic_klass(rtklass, module_id)
         automagic_rtklasses.append(rtklass)
       elif rtklass.defn is self._doc_schema:  # Keep track of the automagic document class as it also needs to be backfilled.
         automagic_rtklasses.append(rtklass)
-    # Instantiate all of the lazy stores and fields.
+    # Instantiate all of the lazy stores, and the lazy fields of the automagic classes. The unknown
+    # fields of known classes are left lazy, as the classes themselves are not changed.
     for rtklass in rt.klasses:
       for rtstore in rtklass.stores:
         if rtstore.is_lazy():
           self._automagic_store(rtstore, rt.doc)
+      if rtklass not in automagic_rtklasses:
+        continue
       for rtfield in rtklass.fields:
         if rtfield.is_lazy():
           self._automagic_field(rtfield, rtklass, rt)
@@ -208,12 +292,12 @@ class AutomagicRTReader(RTReader):
     for rtklass in automagic_rtklasses:
       klass = rtklass.defn.defn
       for rtstore in sorted(rtklass.stores, key=lambda rtstore: rtstore.serial):
-        klass._dr_stores[rtstore.serial] = rtstore.defn.defn
+        klass._dr_stores[rtstore.defn.name] = rtstore.defn.defn
       for rtfield in sorted(rtklass.fields, key=lambda rtfield: rtfield.serial):
         klass._dr_fields[rtfield.serial] = rtfield.defn.defn
 
-  def _automagic_klass(self, rtklass):
-    klass = get_or_create_klass(self._automagic_count, rtklass.serial)
+  def _automagic_klass(self, rtklass, module_id):
+    klass = get_or_create_klass(module_id, rtklass.serial)
     ann_schema = AnnSchema.from_klass(klass)
     rtklass.defn = ann_schema
     self._doc_schema.add_klass(ann_schema)
@@ -252,17 +336,51 @@ class AutomagicRTReader(RTReader):
 
 
 class Reader(object):
-  __slots__ = ('_doc_schema', '_unpacker', '_read_headers', '_automagic')
+  __slots__ = ('_doc_schema', '_unpacker', '_read_headers', '_automagic', '_options', '_encoding', '_mapped', '_stores', '_fields', '_where', '_frames', '_stats', '_text', '_texts', '_graphs', '_stream')
+
+  STREAM_NBYTES = 1 << 20  # Stores serialised in more bytes than this are decoded as they are unpacked.
 
-  def __init__(self, istream, doc_schema_or_doc=None, automagic=False, encoding='utf-8'):
+  def __init__(self, istream, doc_schema_or_doc=None, automagic=False, encoding='utf-8', use_mmap=False, stores=None, fields=None, where=None, prefetch=0, decompress=True, stats=False, text=None, graphs=None, follow=False, poll_interval=0.1, idle_timeout=None):
     """
     @param istream A file-like object to read from
     @param doc_schema_or_doc A DocSchema instance or a Doc subclass. If a Doc subclass is provided, the .schema() method is called to create the DocSchema instance.
-    @param automagic Whether or not to instantiate unknown classes at runtime. False by default.
+    @param automagic Whether or not to instantiate unknown classes at runtime. The classes of doc_schema_or_doc, if given, are read into when the stream has them. The class graphs built are shared by all automagic readers, in the size bounded reader.AUTOMAGIC_CACHE. False by default.
+    @param use_mmap Whether or not to read istream, which must be a regular file, through a memory map. The serialised bytes of lazy stores and lazy fields are then kept as views into the mapping rather than as copies. False by default.
+    @param stores The names of the stores to read, or None to read all of them. Any other store is left empty on the document and treated like a lazy store, so its serialised instances are still written back out by a Writer.
+    @param fields A dictionary mapping Ann or Doc subclasses to the names of their fields to decode. Any other field of those classes is left with its default value, and its unpacked wire value is kept so that it is still written back out by a Writer. Classes which are not in the dictionary have all of their fields decoded. Every value on the stream is still unpacked: this saves only the from_wire calls, pointer resolution and attribute assignments of the fields left out, whereas stores avoids unpacking whole stores.
+    @param where A predicate called with each document once only its document-level fields have been read. Documents for which it returns False are skipped over without their stores being decoded.
+    @param prefetch The number of documents to read ahead of decoding on a background thread, or 0 to read istream only as each document is decoded. Time spent waiting on the background thread is recorded on the prefetcher property. 0 by default.
+    @param decompress Whether or not to detect gzip, bz2 or xz compressed input by its magic bytes and decompress it while reading. Non-seekable input, such as a pipe or socket, is only checked once it is first read from. use_mmap has no effect on compressed input. When used with prefetch, decompression happens on the background thread. True by default.
+    @param stats Whether or not to collect a ReaderStats of per-phase timings and counters, available on the stats property. A ReaderStats instance can also be given, so that several readers add to the same counters. False by default.
+    @param text A dictionary mapping Ann or Doc subclasses to the names of their Field fields whose string values are only decoded when they are first read, or True for all of the Field fields of every class. Equal strings decoded by one reader are shared. None by default.
+    @param graphs A dictionary mapping Ann subclasses to the names of their pointer fields to read into a CSRGraph for each store, available through StoreList.graph, instead of into lists of objects on each object. Those fields are set to dr.graph.IN_GRAPH on the objects, which is false, and are written back out from the graph until they are assigned, including to None. Writing raises a WriterException if the store, or the store pointed into, has had objects added, removed or reordered while any object is still IN_GRAPH. None by default.
+    @param follow Whether or not to keep reading istream as it is appended to, rather than stopping at its end. Reading then waits for each document to be written in full, and stops only once the follower property's stop method is called or idle_timeout is reached. To resume later from the follower's offset, seek istream to it before passing it to a new Reader. Compressed input is not detected, and use_mmap and prefetch cannot be used. False by default.
+    @param poll_interval The number of seconds to wait before polling a followed istream for more bytes. The wait doubles while none arrive, up to Follower.max_poll_interval. 0.1 by default.
+    @param idle_timeout The number of seconds without any new bytes after which a followed istream is taken to have ended, or None to follow it until stopped. None by default.
     """
     if six.PY2 and isinstance(encoding, six.text_type):
       encoding = encoding.encode('utf-8')
-    self._unpacker = msgpack.Unpacker(istream, use_list=True, encoding=encoding)
+    self._encoding = encoding
+    if decompress and istream is not None and not follow:
+      istream = open_decompressed(istream)
+      if isinstance(istream, DecompressedStream):
+        use_mmap = False
+    self._mapped = use_mmap
+    self._frames = None  # The Prefetcher or Follower which complete documents are fed from.
+    if follow:
+      if use_mmap or prefetch:
+        raise ValueError('follow cannot be used with use_mmap or prefetch')
+      self._frames = Follower(istream, poll_interval, idle_timeout=idle_timeout)
+      self._unpacker = self._new_unpacker(None)
+    elif prefetch:
+      if use_mmap:
+        raise ValueError('prefetch cannot be used with use_mmap')
+      self._frames = Prefetcher(istream, prefetch)
+      self._unpacker = self._new_unpacker(None)
+    elif use_mmap:
+      self._unpacker = self._map_unpacker(istream)
+    else:
+      self._unpacker = self._new_unpacker(istream)
     self._automagic = automagic
     if doc_schema_or_doc is None:
       if not automagic:
@@ -274,24 +392,150 @@ class Reader(object):
       self._doc_schema = doc_schema_or_doc.schema()
     else:
       raise TypeError('Invalid value for doc_schema_or_doc. Must be either a DocSchema instance or a Doc subclass')
+    if stores is not None:
+      stores = frozenset(stores)
+      if self._doc_schema is not None:
+        unknown = stores.difference(s.name for s in self._doc_schema.stores())
+        if unknown:
+          raise ValueError('Unknown stores {0} for {1!r}'.format(', '.join(sorted(unknown)), self._doc_schema.name))
+    self._stores = stores
+    self._fields = {klass: self._field_names(klass, names) for klass, names in six.iteritems(fields or {})}  # { klass : frozenset(field names) }
+    self._where = where
+    if text is not None and text is not True:
+      text = {klass: self._field_names(klass, names, Field) for klass, names in six.iteritems(text)}
+    self._text = text
+    self._texts = TextCache(use_list=True, encoding=encoding) if text else None
+    self._graphs = {}  # { klass : frozenset(field names) }
+    for klass, names in six.iteritems(graphs or {}):
+      names = self._field_names(klass, names)
+      if not issubclass(klass, Ann) or not all(isinstance(klass._dr_fields[name], (Pointer, SelfPointer)) for name in names):
+        raise ValueError('Only the pointer fields of Ann subclasses can be read as graphs')
+      self._graphs[klass] = names
+    if stats is True:
+      stats = ReaderStats()
+    self._stats = stats or None
     if automagic:
-      self._read_headers = AutomagicRTReader(self._doc_schema)
+      self._read_headers = AutomagicRTReader(self._doc_schema, encoding=encoding)
     else:
-      self._read_headers = RTReader(self._doc_schema)
+      self._read_headers = RTReader(self._doc_schema, HeaderCache(), encoding)
+    # The decoders are kept on the class graphs read, keyed by the options which change what they decode.
+    self._options = (stores, frozenset(six.iteritems(self._fields)), text if text is None or text is True else frozenset(six.iteritems(text)), frozenset(six.iteritems(self._graphs)))
+    self._stream = None  # The DocStream of the document being streamed, if any.
 
   @property
   def doc_schema(self):
     """Returns the DocSchema instance used/created during the reading process."""
     return self._doc_schema
 
+  @property
+  def prefetcher(self):
+    """Returns the Prefetcher reading ahead of decoding, or None if prefetch was not enabled."""
+    return self._frames if isinstance(self._frames, Prefetcher) else None
+
+  @property
+  def follower(self):
+    """Returns the Follower waiting on istream for more documents, or None if follow was not enabled."""
+    return self._frames if isinstance(self._frames, Follower) else None
+
+  @property
+  def stats(self):
+    """Returns the ReaderStats being collected, or None if stats was not enabled."""
+    return self._stats
+
+  @staticmethod
+  def _field_names(klass, names, kind=None):
+    names = frozenset(names)
+    unknown = names.difference(klass._dr_fields)
+    if unknown:
+      raise ValueError('Unknown fields {0} for {1!r}'.format(', '.join(sorted(unknown)), klass.__name__))
+    if kind is not None:
+      wrong = [name for name in names if type(klass._dr_fields[name]) is not kind]
+      if wrong:
+        raise ValueError('Fields {0} of {1!r} are not {2} fields'.format(', '.join(sorted(wrong)), klass.__name__, kind.__name__))
+    return names
+
+  def _set_unpacker(self, unpacker):
+    # Any document part way through being streamed belongs to the previous unpacker, so it is
+    # abandoned rather than skipped over.
+    if self._stream is not None:
+      self._stream._detach()
+      self._stream = None
+    self._unpacker = unpacker
+
+  def _new_unpacker(self, istream):
+    return msgpack.Unpacker(istream, use_list=True, encoding=self._encoding, max_buffer_size=MAX_BUFFER_SIZE)
+
+  def _map_unpacker(self, istream):
+    mapped = map_file(istream)
+    if mapped is None:
+      try:
+        empty = os.fstat(istream.fileno()).st_size == 0
+      except (AttributeError, EnvironmentError, io.UnsupportedOperation):
+        empty = False
+      if not empty:
+        raise ValueError('use_mmap requires istream to be a regular file')
+      buf = b''
+    else:
+      buf = memoryview(mapped)[istream.tell():]
+    return BufferUnpacker(buf, use_list=True, encoding=self._encoding)
+
+  def _read_bytes(self, nbytes):
+    data = self._unpacker.read_bytes(nbytes)
+    if len(data) != nbytes:
+      raise msgpack.OutOfData()
+    # The pure Python Unpacker of msgpack < 1.0 does not mark the bytes returned by read_bytes as
+    # consumed, so a subsequent OutOfData would rewind the stream to before them.
+    consume = getattr(self._unpacker, '_consume', None)
+    if consume is not None:
+      consume()
+    return data
+
+  def _kept_bytes(self, data):
+    # Returns the serialised bytes to keep on a document, for a lazy store or for the RawValue and
+    # DeferredText values of its instances.
+    return data
+
+  def _unpack_instance(self, nbytes, decoder):
+    # Reads an <instance> map which is nbytes long. The values of lazy fields, those unknown to the
+    # registered class, are kept as RawValue spans so that they are never decoded only to be encoded
+    # again by the Writer. The values of fields left out by stores or fields are unpacked along with
+    # the rest, as splitting them out a value at a time costs more than unpacking them does.
+    lazy, text = decoder.lazy, decoder.text
+    if not lazy and not text and not self._mapped:
+      return self._unpacker.unpack()
+    data = self._read_bytes(nbytes)
+    if lazy or text:
+      data = self._kept_bytes(data)
+      return unpack_instances(data, lazy, many=False, text_keys=text, text_cache=self._texts, use_list=True, encoding=self._encoding)
+    return msgpack.unpackb(data, use_list=True, encoding=self._encoding)
+
+  def _stream_instances(self, nbytes, decoder):
+    # Reads an <instances> array which is nbytes long, returning its length and an iterable of its
+    # instances. Arrays of more than STREAM_NBYTES are unpacked one <instance> at a time as they are
+    # decoded, so that the whole array is never held in memory at once.
+    lazy, text = decoder.lazy, decoder.text
+    if not lazy and not text and not self._mapped:
+      if nbytes <= self.STREAM_NBYTES:
+        instances = self._unpacker.unpack()
+        return len(instances), instances
+      unpack = self._unpacker.unpack
+      ninstances = self._unpacker.read_array_header()
+      return ninstances, (unpack() for i in xrange(ninstances))
+    data = self._read_bytes(nbytes)
+    if lazy or text:
+      data = self._kept_bytes(data)
+    if nbytes <= self.STREAM_NBYTES:
+      if lazy or text:
+        instances = unpack_instances(data, lazy, text_keys=text, text_cache=self._texts, use_list=True, encoding=self._encoding)
+      else:
+        instances = msgpack.unpackb(data, use_list=True, encoding=self._encoding)
+      return len(instances), instances
+    return iter_instances(data, lazy, text_keys=text, text_cache=self._texts, use_list=True, encoding=self._encoding)
+
   def __iter__(self):
     return self
 
   def __next__(self):
-    if self._automagic:
-      doc_klass = get_or_create_klass(self._read_headers._automagic_count, 'Doc', is_doc=True)
-      self._doc_schema = doc_klass.schema()
-      self._read_headers._doc_schema = self.doc_schema
     doc = self.read()
     if doc is None:
       raise StopIteration()
@@ -302,66 +546,340 @@ class Reader(object):
     return self.__next__()
 
   def read(self):
-    rt = self._read_headers(self._unpacker)
-    if rt is None:
-      return
-    return self._instantiate(rt)
+    if self._stream is not None:
+      self._stream.close()
+    stats = self._stats
+    while True:
+      if self._frames is not None and not self._feed_frame():
+        return
+      if stats is None:
+        rt = self._read_headers(self._unpacker)
+      else:
+        start = clock()
+        rt = self._read_headers(self._unpacker)
+        stats.lap('headers', start)
+      if rt is None:
+        return
+      doc = self._instantiate(rt)
+      if doc is not None:
+        if stats is not None:
+          stats.docs += 1
+        return doc
+
+  def stream(self):
+    """
+    Reads the next document a store at a time, for documents too large to hold all of their
+    objects in memory at once. Returns a DocStream, or None at the end of the stream. The
+    document-level fields are read straight away, and documents rejected by where are skipped.
+    Reading on from this reader skips over whatever remains of the document.
+    """
+    if self._stream is not None:
+      self._stream.close()
+    stats = self._stats
+    while True:
+      if self._frames is not None and not self._feed_frame():
+        return None
+      if stats is None:
+        rt = self._read_headers(self._unpacker)
+      else:
+        start = clock()
+        rt = self._read_headers(self._unpacker)
+        stats.lap('headers', start)
+      if rt is None:
+        return None
+      doc = rt.doc.defn.defn(**rt.doc.build_kwargs())
+      self._read_doc_instance(rt, doc, streaming=True)
+      if self._where is not None and not self._accept(doc):
+        self._skip_instances(rt)
+        continue
+      if stats is not None:
+        stats.docs += 1
+      self._stream = DocStream(self, rt, doc)
+      return self._stream
+
+  def skip(self, n=1):
+    """
+    Skips over the next n documents without decoding them, hopping from header to header using
+    the length prefixes of the document bodies. Returns the number of documents skipped, which is
+    less than n only if the end of the stream was reached.
+    """
+    for i in xrange(n):
+      if not self._skip_doc():
+        return i
+    return n
+
+  def count(self):
+    """Skips over all of the remaining documents in the stream, returning how many there were."""
+    n = 0
+    while self._skip_doc():
+      n += 1
+    return n
+
+  def _skip_doc(self):
+    # <doc> ::= <wire_version> <klasses> <stores> <doc_instance> <instances_groups>
+    if self._stream is not None:
+      self._stream.close()
+    if self._frames is not None and not self._feed_frame():
+      return False
+    stats = self._stats
+    if stats is not None:
+      start = clock()
+    unpacker = self._unpacker
+    try:
+      wire_version = unpacker.unpack()
+    except msgpack.OutOfData:
+      return False
+    RTReader.check_wire_version(wire_version)
+    try:
+      unpacker.skip()
+      nstores = len(unpacker.unpack())
+      # The <doc_instance> and each <instances_group> are ( <instances_nbytes>, <instances> ).
+      for i in xrange(nstores + 1):
+        self._read_bytes(unpacker.unpack())
+    except msgpack.OutOfData:
+      raise ReaderException('Truncated document at the end of the stream')
+    if stats is not None:
+      stats.skipped += 1
+      stats.lap('skip', start)
+    return True
+
+  def _feed_frame(self):
+    frame = self._frames.next_frame()
+    if frame is None:
+      return False
+    self._unpacker.feed(frame)
+    return True
 
   def _instantiate(self, rt):
     # Create the Doc instance and RTManager.
-    doc = self._doc_schema.defn(**rt.doc.build_kwargs())
-    self._create_stores(rt, doc)
-
-    # Read instances.
-    self._read_doc_instance(rt, doc)
+    doc = rt.doc.defn.defn(**rt.doc.build_kwargs())
+
+    # Read instances. If the predicate can be evaluated before the stores exist, they are only
+    # allocated for documents which pass it.
+    if self._where is not None and not self._decoder(rt, rt.doc).needs_stores:
+      self._read_doc_instance(rt, doc)
+      if not self._accept(doc):
+        self._skip_instances(rt)
+        return None
+      self._create_stores(rt, doc)
+    else:
+      self._create_stores(rt, doc)
+      self._read_doc_instance(rt, doc)
+      if self._where is not None and not self._accept(doc):
+        self._skip_instances(rt)
+        return None
     self._read_instances(rt, doc)
     doc._dr_rt = rt
     return doc
 
+  def _accept(self, doc):
+    stats = self._stats
+    if stats is None:
+      return self._where(doc)
+    start = clock()
+    accepted = self._where(doc)
+    stats.lap('where', start)
+    if not accepted:
+      stats.rejected += 1
+    return accepted
+
+  def _decoder(self, rt, rtschema, streaming=False):
+    key = (self._options, rtschema.klass_id, streaming)
+    decoder = rt.decoders.get(key)
+    if decoder is None:
+      klass = rtschema.defn.defn
+      if self._text is True:
+        text = [name for name, field in six.iteritems(klass._dr_fields) if type(field) is Field]
+      else:
+        text = (self._text or {}).get(klass)
+      fields, graphs = self._fields.get(klass), self._graphs.get(klass)
+      if streaming:
+        # Streamed objects belong to no store, so their pointers are kept as wire values.
+        fields = frozenset(name for name, field in six.iteritems(klass._dr_fields) if not isinstance(field, (Pointer, SelfPointer)) and (fields is None or name in fields))
+        graphs = None
+      decoder = rt.decoders[key] = InstanceDecoder(rtschema, self._stores, fields, text, graphs)
+    return decoder
+
+  def _is_skipped(self, rtstore):
+    # Lazy stores, and stores not asked for, are kept as serialised bytes.
+    return rtstore.is_lazy() or (self._stores is not None and rtstore.defn.name not in self._stores)
+
   def _create_stores(self, rt, doc):
+    # Allocate every object up front so that pointers can refer to objects in any store.
+    stats = self._stats
+    if stats is not None:
+      start = clock()
     for rtstore in rt.doc.stores:
-      if rtstore.is_lazy():
+      if self._is_skipped(rtstore):
         continue
-      attr = rtstore.defn.name
-      store = getattr(doc, attr)
-      for i in xrange(rtstore.nelem):
-        store.create(**rtstore.klass.build_kwargs())
+      store = getattr(doc, rtstore.defn.name)
+      nelem = rt.nelem[rtstore.store_id]
+      self._decoder(rt, rtstore.klass).allocate(store, nelem)
+      if stats is not None:
+        stats.objects[rtstore.klass.defn.name] += nelem
+    if stats is not None:
+      stats.lap('create_stores', start)
 
   def _read_packed(self):
     tmp = io.BytesIO()
     self._unpacker.skip(tmp.write)
     return tmp.getvalue()
 
-  def _process_instance(self, rtschema, doc, instance, obj, store):
-    # <instance> ::= { <field_id> : <obj_val> }
-    for key, val in six.iteritems(instance):
-      rtfield = rtschema.fields[key]
-      if rtfield.is_lazy():
-        if obj._dr_lazy is None:
-          obj._dr_lazy = {}
-        obj._dr_lazy[key] = val
-      else:
-        field = rtfield.defn.defn
-        val = field.from_wire(val, rtfield, store, doc)
-        setattr(obj, rtfield.defn.name, val)
-
-  def _read_doc_instance(self, rt, doc):
+  def _read_doc_instance(self, rt, doc, streaming=False):
     # read the document instance <doc_instance> ::= <instances_nbytes> <instance>
-    self._unpacker.unpack()  # nbytes
-    instance = self._unpacker.unpack()
-    self._process_instance(rt.doc, doc, instance, doc, None)
+    stats = self._stats
+    if stats is not None:
+      start = clock()
+    nbytes = self._unpacker.unpack()
+    decoder = self._decoder(rt, rt.doc, streaming)
+    instance = self._unpack_instance(nbytes, decoder)
+    decoder.decode((doc, ), (instance, ), None, doc)
+    if stats is not None:
+      stats.doc_bytes += nbytes
+      stats.objects[rt.doc.defn.name] += 1
+      stats.lap('doc_instance', start)
+
+  def _skip_instances(self, rt):
+    # Hops over the <instances_groups> of a rejected document.
+    stats = self._stats
+    if stats is not None:
+      start = clock()
+    for rtstore in rt.doc.stores:
+      self._read_bytes(self._unpacker.unpack())
+    if stats is not None:
+      stats.lap('skip', start)
 
   def _read_instances(self, rt, doc):
     # <instances_groups> ::= <instances_group>*
+    stats = self._stats
+    if stats is not None:
+      start = clock()
     for rtstore in rt.doc.stores:
       # <instances_group>  ::= <instances_nbytes> <instances>
       nbytes = self._unpacker.unpack()
 
-      if rtstore.is_lazy():
-        rtstore.lazy = self._unpacker.read_bytes(nbytes)
+      if self._is_skipped(rtstore):
+        rt.lazy[rtstore.store_id] = self._kept_bytes(self._read_bytes(nbytes))
+        if stats is not None:
+          stats.store_bytes[rtstore.serial] += nbytes
+          stats.lazy_bytes += nbytes
+          start = stats.lap('lazy', start)
       else:
-        rtschema = rtstore.klass
         store = getattr(doc, rtstore.defn.name)
-        for i, instance in enumerate(self._unpacker.unpack()):
-          obj = store[i]
-          self._process_instance(rtschema, doc, instance, obj, store)
+        decoder = self._decoder(rt, rtstore.klass)
+        ninstances, instances = self._stream_instances(nbytes, decoder)
+        if ninstances != len(store):
+          raise ReaderException('Store {0!r} has {1} elements but {2} instances were read'.format(rtstore.serial, len(store), ninstances))
+        if stats is not None:
+          # Instances streamed from large stores are unpacked as they are decoded, so that time is
+          # counted as decoding rather than holding the whole store in memory to time it apart.
+          stats.store_bytes[rtstore.serial] += nbytes
+          start = stats.lap('unpack', start)
+        decoder.decode(store, instances, store, doc)
+        if stats is not None:
+          start = stats.lap('decode', start)
+
+
+class DocStream(object):
+  """
+  A document being read a store at a time, as returned by Reader.stream. Only the document-level
+  fields of doc are read up front, and its stores are left empty. Iterating yields a (store name,
+  objects) pair for each store being read, in stream order, where objects is an iterator which
+  unpacks and decodes each object only as it is reached. The objects belong to no store, so their
+  pointer fields are left unset, and the wire values of those fields, the indices of the objects
+  pointed to, are kept in their _dr_lazy. Moving on to the next store hops over the bytes of
+  whatever remains of the current one without unpacking them.
+  """
+  __slots__ = ('doc', '_reader', '_rt', '_rtstores', '_end')
+
+  CHUNK_SIZE = 1024  # The number of objects decoded at a time.
+
+  def __init__(self, reader, rt, doc):
+    self.doc = doc
+    self._reader = reader
+    self._rt = rt
+    self._rtstores = iter(rt.doc.stores)
+    self._end = None  # The offset in the stream of the end of the current store, if any.
+
+  def __iter__(self):
+    return self
+
+  def __next__(self):
+    self._skip_store()
+    reader = self._reader
+    stats = reader._stats
+    for rtstore in self._rtstores:
+      if stats is not None:
+        start = clock()
+      nbytes = reader._unpacker.unpack()
+      if stats is not None:
+        stats.store_bytes[rtstore.serial] += nbytes
+      if reader._is_skipped(rtstore):
+        reader._read_bytes(nbytes)
+        if stats is not None:
+          stats.lap('skip', start)
+        continue
+      self._end = end = reader._unpacker.tell() + nbytes
+      return rtstore.defn.name, self._objects(rtstore, nbytes, end)
+    if reader._stream is self:
+      reader._stream = None
+    raise StopIteration()
+
+  def next(self):
+    return self.__next__()
+
+  def close(self):
+    """Skips over the remainder of the document."""
+    for name, objects in self:
+      pass
+
+  def _detach(self):
+    # Ends the stream without reading any more of it, once the reader has moved elsewhere.
+    self._rtstores = iter(())
+    self._end = None
+
+  def _skip_store(self):
+    if self._end is None:
+      return
+    reader = self._reader
+    stats = reader._stats
+    if stats is not None:
+      start = clock()
+    nbytes = self._end - reader._unpacker.tell()
+    if nbytes:
+      reader._read_bytes(nbytes)
+    self._end = None
+    if stats is not None:
+      stats.lap('skip', start)
+
+  def _objects(self, rtstore, nbytes, end):
+    # The instances are only read once the objects are first asked for, and the reader's stats are
+    # updated a chunk at a time, so time spent by the caller between objects is not counted.
+    if self._end != end:
+      return  # The store was skipped over before it was started.
+    reader = self._reader
+    stats = reader._stats
+    if stats is not None:
+      start = clock()
+    decoder = reader._decoder(self._rt, rtstore.klass, streaming=True)
+    ninstances, instances = reader._stream_instances(nbytes, decoder)
+    instances = iter(instances)
+    schema_name = rtstore.klass.defn.name
+    while self._end == end:
+      chunk = list(itertools.islice(instances, self.CHUNK_SIZE))
+      if stats is not None:
+        start = stats.lap('unpack', start)
+      if not chunk:
+        return
+      objs = StoreList(decoder.klass)
+      decoder.allocate(objs, len(chunk))
+      decoder.decode(objs, chunk, objs, self.doc)
+      if stats is not None:
+        stats.objects[schema_name] += len(chunk)
+        stats.lap('decode', start)
+      for obj in objs:
+        if self._end != end:
+          return  # The store has been skipped over.
+        yield obj
+      if stats is not None:
+        start = clock()
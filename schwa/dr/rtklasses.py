@@ -4,7 +4,7 @@ from __future__ import absolute_import, print_function, unicode_literals
 
 from .meta import Ann, Doc, MetaBase, safe_klass_or_field_name
 
-__all__ = ['get_or_create_klass']
+__all__ = ['forget_klasses', 'get_or_create_klass']
 
 
 def get_or_create_klass(module_id, klass_name, is_doc=False, attrs=None):
@@ -33,3 +33,18 @@ def get_or_create_klass(module_id, klass_name, is_doc=False, attrs=None):
 
   get_or_create_klass.klasses[key] = klass
   return klass
+
+
+def forget_klasses(klasses):
+  """
+  Removes classes created by get_or_create_klass from its registry and from the registry of
+  class names, so that they are no longer kept alive. Any other classes are left untouched.
+  @param klasses an iterable of classes
+  """
+  klasses = set(klasses)
+  created = getattr(get_or_create_klass, 'klasses', {})
+  for key, klass in list(created.items()):
+    if klass in klasses:
+      del created[key]
+      if MetaBase._registered.get(klass._dr_name) is klass:
+        del MetaBase._registered[klass._dr_name]
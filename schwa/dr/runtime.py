@@ -1,6 +1,7 @@
 # vim: set et nosi ai ts=2 sts=2 sw=2:
 # coding: utf-8
 from __future__ import absolute_import, print_function, unicode_literals
+import weakref
 
 __all__ = ['RTField', 'RTStore', 'RTAnn', 'RTManager', 'build_rt', 'merge_rt']
 
@@ -32,15 +33,38 @@ class RTField(object):
 
 
 class RTStore(object):
-  __slots__ = ('klass', 'serial', 'store_id', 'defn', 'lazy', 'nelem')
+  __slots__ = ('klass', 'serial', 'store_id', 'defn', '_rt')
 
-  def __init__(self, store_id, serial, klass, defn=None, lazy=None, nelem=None):
+  def __init__(self, store_id, serial, klass, defn=None, manager=None):
     self.klass = klass  # RTAnn
     self.serial = serial
     self.store_id = store_id
-    self.nelem = nelem
     self.defn = defn  # StoreSchema
-    self.lazy = lazy
+    self._rt = None if manager is None else weakref.ref(manager)  # The RTManager of the store's document.
+
+  def __getstate__(self):
+    return (self.klass, self.serial, self.store_id, self.defn, None if self._rt is None else self._rt())
+
+  def __setstate__(self, state):
+    self.klass, self.serial, self.store_id, self.defn, manager = state
+    self._rt = None if manager is None else weakref.ref(manager)
+
+  def _value(self, values):
+    rt = None if self._rt is None else self._rt()
+    if rt is None:
+      return None
+    values = getattr(rt, values)
+    return values[self.store_id] if self.store_id < len(values) else None
+
+  @property
+  def nelem(self):
+    """The number of elements in the store, as read from the stream, or None."""
+    return self._value('nelem')
+
+  @property
+  def lazy(self):
+    """The serialised instances of the store if it was not read, or None."""
+    return self._value('lazy')
 
   def __repr__(self):
     return str(self)
@@ -78,6 +102,17 @@ class RTAnn(object):
   def is_lazy(self):
     return self.defn is None
 
+  def _bind(self, manager):
+    # Returns a copy of this document RTAnn for the one document whose RTManager is manager. The
+    # fields are shared, but each of its stores reports that document's nelem and lazy.
+    rtdoc = self.__class__.__new__(self.__class__)
+    rtdoc.serial = self.serial
+    rtdoc.klass_id = self.klass_id
+    rtdoc.fields = self.fields
+    rtdoc.stores = [RTStore(s.store_id, s.serial, s.klass, s.defn, manager) for s in self.stores]
+    rtdoc.defn = self.defn
+    return rtdoc
+
 
 class AutomagicRTAnn(RTAnn):
   __slots__ = ('_init_kwargs',)
@@ -86,6 +121,11 @@ class AutomagicRTAnn(RTAnn):
     super(AutomagicRTAnn, self).__init__(*args, **kwargs)
     self._init_kwargs = {}
 
+  def _bind(self, manager):
+    rtdoc = super(AutomagicRTAnn, self)._bind(manager)
+    rtdoc._init_kwargs = self._init_kwargs
+    return rtdoc
+
   def build_kwargs(self):
     return {k: v() for k, v in self._init_kwargs.items()}
 
@@ -94,7 +134,15 @@ class AutomagicRTAnn(RTAnn):
 
 
 class RTManager(object):
-  __slots__ = ('doc', 'klasses')
+  """
+  The runtime view of a document's classes, fields and stores. The class graph (``klasses``, and
+  the fields of ``doc``) can be shared between all of the documents read with an identical header,
+  in which case ``shared`` is True and the graph must not be modified. ``nelem`` and ``lazy``
+  always belong to a single document, as do the RTStores of ``doc``, which report them.
+  ``decoders`` holds the decoders the Reader compiles for the class graph, so that they are freed
+  along with it.
+  """
+  __slots__ = ('doc', 'klasses', 'nelem', 'lazy', 'shared', 'decoders', '__weakref__')
   Field = RTField
   Ann = RTAnn
   Store = RTStore
@@ -102,12 +150,63 @@ class RTManager(object):
   def __init__(self):
     self.doc = None  # RTAnn
     self.klasses = []  # [ RTAnn ]
+    self.nelem = []  # [ int ], indexed by store_id, as read from the stream
+    self.lazy = []  # [ bytes ], indexed by store_id, the serialised instances of lazy stores
+    self.shared = False
+    self.decoders = {}  # { (reader options, klass_id, streaming) : InstanceDecoder }
+
+  def __getstate__(self):
+    # Compiled decoders cannot be pickled, and are rebuilt as needed.
+    return (self.doc, self.klasses, self.nelem, self.lazy, self.shared)
+
+  def __setstate__(self, state):
+    self.doc, self.klasses, self.nelem, self.lazy, self.shared = state
+    self.decoders = {}
 
   def copy_to_schema(self):
     for klass in self.klasses:
       klass.copy_to_schema()
     return self.doc.defn
 
+  def derive(self, nelem):
+    """
+    Returns a new RTManager for one document which shares this manager's class graph.
+    @param nelem the per-store number of elements of the document
+    """
+    rt = self.__class__()
+    rt.doc = self.doc._bind(rt)
+    rt.klasses = self.klasses
+    rt.nelem = nelem
+    rt.lazy = [None] * len(nelem)
+    rt.shared = True
+    rt.decoders = self.decoders
+    return rt
+
+  def copy(self):
+    """Returns a deep copy of this manager whose class graph can be modified."""
+    rt = self.__class__()
+    klasses = {}  # { klass_id : RTAnn }
+    stores = {}  # { store_id : RTStore }
+    for klass in self.klasses:
+      new = klasses[klass.klass_id] = klass.__class__(klass.klass_id, klass.serial, klass.defn)
+      if isinstance(klass, AutomagicRTAnn):
+        new._init_kwargs = dict(klass._init_kwargs)
+      rt.klasses.append(new)
+    rt.doc = klasses[self.doc.klass_id]
+    for store in self.doc.stores:
+      klass = None if store.klass is None else klasses[store.klass.klass_id]
+      new = stores[store.store_id] = RTStore(store.store_id, store.serial, klass, store.defn, rt)
+      rt.doc.stores.append(new)
+    for klass in self.klasses:
+      for field in klass.fields:
+        points_to = field.points_to
+        if isinstance(points_to, RTStore):
+          points_to = stores[points_to.store_id]
+        klasses[klass.klass_id].fields.append(RTField(field.field_id, field.serial, points_to, field.is_slice, field.is_self_pointer, field.is_collection, defn=field.defn))
+    rt.nelem = list(self.nelem)
+    rt.lazy = list(self.lazy)
+    return rt
+
 
 class AutomagicRTManager(RTManager):
   __slots__ = ()
@@ -128,6 +227,47 @@ def _find_max_and_known(collection, id_attr):
   return max_id, known
 
 
+def _same_defn(existing, schema):
+  if existing is schema:
+    return True
+  return existing is not None and existing.name == schema.name and existing.serial == schema.serial and existing.defn is schema.defn
+
+
+def _is_merged(rt, doc_schema):
+  """Returns whether merging doc_schema into rt would leave rt unchanged."""
+  def fields_merged(rtschema, ann_schema):
+    rtfields = {}
+    for rtfield in rtschema.fields:
+      if not rtfield.is_lazy():
+        rtfields[rtfield.defn.name] = rtfield
+    for field_schema in ann_schema.fields():
+      rtfield = rtfields.get(field_schema.name)
+      if rtfield is None or not _same_defn(rtfield.defn, field_schema):
+        return False
+    return True
+
+  rtstores = {}
+  for rtstore in rt.doc.stores:
+    if not rtstore.is_lazy():
+      rtstores[rtstore.defn.name] = rtstore
+  for store_schema in doc_schema.stores():
+    rtstore = rtstores.get(store_schema.name)
+    if rtstore is None or not _same_defn(rtstore.defn, store_schema):
+      return False
+  if not fields_merged(rt.doc, doc_schema):
+    return False
+
+  rtklasses = {}
+  for rtklass in rt.klasses:
+    if not rtklass.is_lazy():
+      rtklasses[rtklass.defn.name] = rtklass
+  for ann_schema in doc_schema.klasses():
+    rtklass = rtklasses.get(ann_schema.name)
+    if rtklass is None or not _same_defn(rtklass.defn, ann_schema) or not fields_merged(rtklass, ann_schema):
+      return False
+  return True
+
+
 def _merge_rtschema_fields(rtschema, ann_schema, rtstore_map):
   # Discover max known field_id.
   field_id, known_fields = _find_max_and_known(rtschema.fields, 'field_id')
@@ -154,8 +294,14 @@ def merge_rt(rt, doc_schema):
   Merges an existing RTManager instance with the provided DocSchema instance
   @param rt the existing RTManager instance
   @param doc_schema a DocSchema object from which to merge with the given RTManager instance
-  @return the merged RTManager object
+  @return the merged RTManager object, which is a copy of rt if rt is shared and needed changing
   """
+  # Shared class graphs are copied before they are modified.
+  if rt.shared:
+    if _is_merged(rt, doc_schema):
+      return rt
+    rt = rt.copy()
+
   # Discover known klasses and stores.
   klass_id, known_klasses = _find_max_and_known(rt.klasses, 'klass_id')
   store_id, known_stores = _find_max_and_known(rt.doc.stores, 'store_id')
@@ -165,8 +311,10 @@ def merge_rt(rt, doc_schema):
   for store_schema in doc_schema.stores():
     rtstore = known_stores.get(store_schema.name)
     if rtstore is None:
-      rtstore = RTStore(store_id, store_schema.serial, None, store_schema)
+      rtstore = RTStore(store_id, store_schema.serial, None, store_schema, rt)
       rt.doc.stores.append(rtstore)
+      rt.nelem.append(None)
+      rt.lazy.append(None)
       known_stores[store_schema.name] = rtstore
       store_id += 1
     else:
@@ -0,0 +1,82 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+"""
+Performance counters for the Reader.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+import collections
+from timeit import default_timer as clock
+
+import six
+
+__all__ = ['ReaderStats']
+
+
+class ReaderStats(object):
+  """
+  Counters and per-phase wall times collected by a Reader which was created with stats enabled.
+  They are updated as each document is read, so they can be inspected at any point in the stream.
+
+  The phases are:
+    headers: reading the <klasses> and <stores> headers and finding or building their runtime classes
+    doc_instance: reading and decoding the document-level fields
+    where: evaluating the where predicate
+    create_stores: allocating the objects of the stores
+    unpack: reading the instances of the stores from the stream
+    decode: setting the fields of the objects of the stores, including resolving pointers, and unpacking the instances of stores large enough to be unpacked as they are decoded
+    lazy: reading the serialised bytes of lazy and unread stores
+    skip: hopping over the documents skipped by skip, count or the where predicate, and the stores passed over by Reader.stream
+  """
+  __slots__ = ('docs', 'rejected', 'skipped', 'times', 'doc_bytes', 'store_bytes', 'objects', 'lazy_bytes')
+
+  PHASES = ('headers', 'doc_instance', 'where', 'create_stores', 'unpack', 'decode', 'lazy', 'skip')
+
+  def __init__(self):
+    self.docs = 0  # The number of documents returned.
+    self.rejected = 0  # The number of documents rejected by the where predicate.
+    self.skipped = 0  # The number of documents hopped over by skip or count.
+    self.times = collections.OrderedDict((phase, 0.0) for phase in self.PHASES)  # { phase : seconds }
+    self.doc_bytes = 0  # The number of serialised bytes of document-level fields.
+    self.store_bytes = collections.defaultdict(int)  # { store name : serialised bytes }
+    self.objects = collections.defaultdict(int)  # { schema name : number of objects created }
+    self.lazy_bytes = 0  # The number of serialised bytes kept undecoded to be written back out.
+
+  def __repr__(self):
+    return 'ReaderStats(docs={0}, rejected={1}, skipped={2}, time={3:.3f}s)'.format(self.docs, self.rejected, self.skipped, self.total_time)
+
+  @property
+  def total_time(self):
+    """Returns the total number of seconds spent across all of the phases."""
+    return sum(six.itervalues(self.times))
+
+  def lap(self, phase, start):
+    """Adds the time since start to phase, returning the current time."""
+    now = clock()
+    self.times[phase] += now - start
+    return now
+
+  def as_dict(self):
+    """Returns a snapshot of the counters as plain dictionaries, such as for logging as JSON."""
+    return {
+        'docs': self.docs,
+        'rejected': self.rejected,
+        'skipped': self.skipped,
+        'times': dict(self.times),
+        'doc_bytes': self.doc_bytes,
+        'store_bytes': dict(self.store_bytes),
+        'objects': dict(self.objects),
+        'lazy_bytes': self.lazy_bytes,
+    }
+
+  def format(self):
+    """Returns a human-readable, multi-line summary of the counters."""
+    total = self.total_time or 1.0
+    lines = ['{0} docs read, {1} rejected, {2} skipped'.format(self.docs, self.rejected, self.skipped)]
+    for phase, seconds in six.iteritems(self.times):
+      lines.append('  {0:<14}{1:10.3f}s {2:6.1%}'.format(phase, seconds, seconds / total))
+    lines.append('{0} bytes of document fields, {1} lazy bytes'.format(self.doc_bytes, self.lazy_bytes))
+    for name, nbytes in sorted(six.iteritems(self.store_bytes)):
+      lines.append('  {0:<24}{1:12d} bytes'.format(name, nbytes))
+    for name, n in sorted(six.iteritems(self.objects)):
+      lines.append('  {0:<24}{1:12d} objects'.format(name, n))
+    return '\n'.join(lines)
@@ -4,9 +4,14 @@ from __future__ import absolute_import, print_function, unicode_literals
 import inspect
 
 import msgpack
+import six
 
+from .cache import HeaderCache, layout_key
 from .constants import FieldType
+from .encoder import InstanceEncoder, build_instance
 from .exceptions import WriterException
+from .framing import RawValue
+from .graph import IN_GRAPH
 from .runtime import build_rt, merge_rt
 from .meta import Doc
 from .schema import DocSchema
@@ -14,8 +19,32 @@ from .schema import DocSchema
 __all__ = ['Writer']
 
 
+class _Header(object):
+  """
+  The shared class graph which documents with one runtime layout are written with, and the packed
+  bytes of its header. Only the number of elements in each store is packed per document.
+  """
+  __slots__ = ('source', 'rt', 'klasses', 'stores_header', 'stores')
+
+  def __init__(self, source, rt, klasses, stores_header, stores):
+    self.source = source  # The class graph of the documents written with this header, or None for new documents.
+    self.rt = rt  # RTManager
+    self.klasses = klasses  # The packed <wire_version> and <klasses>.
+    self.stores_header = stores_header  # The packed array header of <stores>.
+    self.stores = stores  # [ ( packed prefix of <store>, store_id, store attribute name or None ) ]
+
+  def derive(self, rt):
+    """Returns a new RTManager sharing this header's class graph for the document whose runtime is rt."""
+    n = len(self.rt.doc.stores)
+    if rt is None:
+      return self.rt.derive([None] * n)
+    derived = self.rt.derive(rt.nelem + [None] * (n - len(rt.nelem)))
+    derived.lazy = rt.lazy + [None] * (n - len(rt.lazy))
+    return derived
+
+
 class Writer(object):
-  __slots__ = ('_ostream', '_packer', '_doc_schema')
+  __slots__ = ('_ostream', '_packer', '_doc_schema', '_headers', '_encoders')
 
   WIRE_VERSION = 3  # Version of the wire protocol the reader knows how to process.
 
@@ -34,6 +63,8 @@ class Writer(object):
     else:
       raise TypeError('Invalid value for doc_schema_or_doc. Must be either a DocSchema instance or a Doc subclass')
     self._packer = msgpack.Packer(use_bin_type=True)
+    self._headers = HeaderCache()  # { id of source class graph : _Header }
+    self._encoders = {}  # { layout key : InstanceEncoder }
 
   @property
   def doc_schema(self):
@@ -48,26 +79,70 @@ class Writer(object):
     if not isinstance(doc, Doc):
       raise ValueError('You can only stream instances of Doc')
 
-    # Get or construct the RTManager for the document.
-    if doc._dr_rt is None:
-      rt = doc._dr_rt = build_rt(self._doc_schema)
+    # Get or construct the RTManager for the document. Documents which were built from scratch, or
+    # read with a shared class graph, are written with a shared class graph whose header is cached.
+    rt = doc._dr_rt
+    if rt is None or rt.shared:
+      header = self._header(rt)
+      rt = doc._dr_rt = header.derive(rt)
     else:
-      rt = doc._dr_rt = merge_rt(doc._dr_rt, self._doc_schema)
+      header = None
+      rt = doc._dr_rt = merge_rt(rt, self._doc_schema)
 
     # Update the _dr_index values.
     self._index_stores(doc, rt)
 
-    # Write wire version.
-    self._pack(Writer.WIRE_VERSION)
-
-    # Write headers.
-    self._pack(self._build_klasses(doc, rt))
-    self._pack(self._build_stores(doc, rt))
+    # Write wire version and headers.
+    if header is None:
+      self._pack(Writer.WIRE_VERSION)
+      self._pack(self._build_klasses(doc, rt))
+      self._pack(self._build_stores(doc, rt))
+    else:
+      self._ostream.write(header.klasses)
+      self._write_stores(doc, rt, header)
 
     # Write instances.
     self._write_doc_instance(doc, rt)
     self._write_instances(doc, rt)
 
+  def _header(self, source_rt):
+    # Headers are cached by the identity of the class graph the documents were read with. Each
+    # _Header holds a reference to its source graph, so that the id cannot be reused by another
+    # graph while the entry is cached; evicting the entry releases the graph.
+    source = None if source_rt is None else source_rt.klasses
+    header = self._headers.get(id(source))
+    if header is not None and header.source is source:
+      return header
+    if source_rt is None:
+      rt = build_rt(self._doc_schema)
+    else:
+      rt = merge_rt(source_rt, self._doc_schema)
+    # merge_rt can return the document's own manager, so only its class graph is kept, and not the
+    # serialised bytes of its lazy stores.
+    rt = rt.derive([None] * len(rt.doc.stores))
+    pack = self._packer.pack
+    klasses = pack(Writer.WIRE_VERSION) + pack(self._build_klasses(None, rt))
+    stores = []
+    for s in rt.doc.stores:
+      # <store> ::= ( <store_name>, <type_id>, <store_nelem> )
+      store_name = s.serial if s.is_lazy() else s.defn.serial
+      prefix = self._packer.pack_array_header(3) + pack(store_name) + pack(s.klass.klass_id)
+      stores.append((prefix, s.store_id, None if s.is_lazy() else s.defn.name))
+    header = _Header(source, rt, klasses, self._packer.pack_array_header(len(stores)), stores)
+    self._headers.put(id(source), header)
+    return header
+
+  def _write_stores(self, doc, rt, header):
+    pack = self._packer.pack
+    parts = [header.stores_header]
+    for prefix, store_id, name in header.stores:
+      parts.append(prefix)
+      if name is None or rt.lazy[store_id] is not None:
+        parts.append(pack(rt.nelem[store_id]))
+      else:
+        parts.append(pack(len(getattr(doc, name))))
+    self._ostream.write(b''.join(parts))
+
   def _pack(self, value):
     packed = self._packer.pack(value)
     self._ostream.write(packed)
@@ -79,11 +154,25 @@ class Writer(object):
   def _pack_prefixed(self, value):
      self._write_prefixed(self._packer.pack(value))
 
+  def _pack_instance(self, instance):
+    # Lazy fields read as RawValue spans are spliced back in verbatim.
+    pack = self._packer.pack
+    parts = [self._packer.pack_map_header(len(instance))]
+    for key, val in six.iteritems(instance):
+      parts.append(pack(key))
+      parts.append(val.data if isinstance(val, RawValue) else pack(val))
+    return b''.join(parts)
+
   def _index_stores(self, doc, rt):
     """Set _dr_index on each of the objects in the stores."""
     for s in rt.doc.stores:
-      if not s.is_lazy():
-        store = getattr(doc, s.defn.name)
+      if s.is_lazy():
+        continue
+      store = getattr(doc, s.defn.name)
+      if rt.lazy[s.store_id] is not None:
+        if store:
+          raise WriterException('Store {0!r} was not read so it cannot be modified'.format(s.defn.name))
+      else:
         for i, obj in enumerate(store):
           if obj is None:
             raise WriterException('Index {0} on store {1} is None'.format(i, s.defn))
@@ -116,7 +205,7 @@ class Writer(object):
           field[FieldType.IS_COLLECTION] = None
 
       # Work out the serial name for the class.
-      if klass is rt.doc:
+      if klass.klass_id == rt.doc.klass_id:
         klass_name = '__meta__'
       elif klass.is_lazy():
         klass_name = klass.serial
@@ -137,38 +226,69 @@ class Writer(object):
       # <store> ::= ( <store_name>, <type_id>, <store_nelem> )
       store_name = s.serial if s.is_lazy() else s.defn.serial
       klass_id = s.klass.klass_id
-      nelem = s.nelem if s.is_lazy() else len(getattr(doc, s.defn.name))
+      if s.is_lazy() or rt.lazy[s.store_id] is not None:
+        nelem = rt.nelem[s.store_id]
+      else:
+        nelem = len(getattr(doc, s.defn.name))
       store = (store_name, klass_id, nelem)
       stores.append(store)
 
     return stores
 
   def _build_instance(self, obj, store, doc, rtschema):
-    instance = {}
-    if obj._dr_lazy is not None:
-      instance.update(obj._dr_lazy)
+    return build_instance(obj, store, doc, rtschema)
+
+  def _encoder(self, rtschema):
+    key = layout_key(rtschema)
+    encoder = self._encoders.get(key)
+    if encoder is None:
+      encoder = self._encoders[key] = InstanceEncoder(rtschema)
+    return encoder
+
+  def _encode(self, objs, store, doc, rtschema):
+    return self._encoder(rtschema).encode(objs, store, doc)
+
+  @staticmethod
+  def _add_graph_edges(store, rtschema, instances, doc):
+    # Pointer fields read into a CSRGraph are left as IN_GRAPH on the objects, so their edges are
+    # written from the graph instead, as long as its indices still refer to the same objects.
     for f in rtschema.fields:
-      if f.is_lazy():
+      if f.is_lazy() or f.defn.name not in store._graphs:
         continue
-      field = f.defn.defn
-      val = getattr(obj, f.defn.name)
-      if field.should_write(val):
-        try:
-          wire_val = field.to_wire(val, f, store, doc)
-        except Exception as e:
-          raise WriterException('An exception occurred while writing field "{0}" of "{1}": {2}'.format(f.defn.name, rtschema.defn.name, e))
-        instance[f.field_id] = wire_val
-    return instance
+      name = f.defn.name
+      unread = [i for i, obj in enumerate(store) if getattr(obj, name) is IN_GRAPH]
+      if not unread:
+        continue
+      graph = store._graphs[name]
+      target = store if f.is_self_pointer else getattr(doc, f.points_to.defn.name)
+      if not graph._indexes(store, target):
+        raise WriterException('Field "{0}" of "{1}" was read into a graph, but its store, or the store it points into, has changed since. Assign the field on every object before writing.'.format(name, rtschema.defn.name))
+      is_collection = f.defn.defn.is_collection
+      for i in unread:
+        edges = graph.neighbours(i)
+        if edges:
+          instances[i][f.field_id] = edges.tolist() if is_collection else edges[0]
 
   def _write_doc_instance(self, doc, rt):
-    self._pack_prefixed(self._build_instance(doc, None, doc, rt.doc))
+    instance = self._encode((doc, ), None, doc, rt.doc)[0]
+    if any(f.is_lazy() for f in rt.doc.fields):
+      self._write_prefixed(self._pack_instance(instance))
+    else:
+      self._pack_prefixed(instance)
 
   def _write_instances(self, doc, rt):
     for rtstore in rt.doc.stores:
-      if rtstore.is_lazy():
-        self._write_prefixed(rtstore.lazy)
+      if rt.lazy[rtstore.store_id] is not None:
+        self._write_prefixed(rt.lazy[rtstore.store_id])
       else:
         rtschema = rtstore.klass
         store = getattr(doc, rtstore.defn.name)
-        instances = [self._build_instance(obj, store, doc, rtschema) for obj in store]
-        self._pack_prefixed(instances)
+        instances = self._encode(store, store, doc, rtschema)
+        if getattr(store, '_graphs', None):
+          self._add_graph_edges(store, rtschema, instances, doc)
+        if any(f.is_lazy() for f in rtschema.fields):
+          parts = [self._packer.pack_array_header(len(instances))]
+          parts.extend(self._pack_instance(instance) for instance in instances)
+          self._write_prefixed(b''.join(parts))
+        else:
+          self._pack_prefixed(instances)
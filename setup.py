@@ -93,8 +93,13 @@ setup(
         'schwa.dr.contrib.tokenizers',
     ],
     ext_modules=[tokenizer_ext()],
+    entry_points={
+        'console_scripts': [
+            'dr-count = schwa.dr.count:main',
+        ],
+    },
     install_requires=[
-        'msgpack-python >= 0.3',
+        'msgpack-python >= 0.5',
         'python-dateutil',
         'six',
     ],
@@ -0,0 +1,103 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+from __future__ import absolute_import, print_function, unicode_literals
+import unittest
+
+from schwa import dr
+from schwa.dr.exceptions import ReaderException
+
+from testutils import create_docs, write_docs
+
+try:
+  import asyncio
+except ImportError:
+  asyncio = None
+
+
+class X(dr.Ann):
+  name = dr.Field()
+
+  class Meta:
+    name = 'test_async_reader.X'
+
+
+class Doc(dr.Doc):
+  docid = dr.Field()
+  xs = dr.Store(X)
+
+  class Meta:
+    name = 'test_async_reader.Doc'
+
+
+def serialise(ndocs):
+  return write_docs(create_docs(Doc, range(ndocs), lambda docid: docid, lambda j: 'x' * (j * 10)), Doc)
+
+
+class ChunkSource(object):
+  """An asynchronous byte source which returns at most size bytes per read."""
+
+  def __init__(self, loop, data, size):
+    self.loop = loop
+    self.data = data
+    self.size = size
+    self.pos = 0
+
+  def read(self, n):
+    chunk = self.data[self.pos:self.pos + min(n, self.size)]
+    self.pos += len(chunk)
+    future = self.loop.create_future()
+    future.set_result(chunk)
+    return future
+
+
+@unittest.skipIf(not hasattr(dr, 'AsyncReader'), 'AsyncReader requires Python >= 3.5')
+class AsyncReaderTest(unittest.TestCase):
+  def setUp(self):
+    self.loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(self.loop)
+
+  def tearDown(self):
+    asyncio.set_event_loop(None)
+    self.loop.close()
+
+  def read_all(self, reader):
+    docs = []
+    while True:
+      doc = self.loop.run_until_complete(reader.read())
+      if doc is None:
+        return docs
+      docs.append(doc)
+
+  def test_chunks(self):
+    for size in (1, 7, 1000):
+      reader = dr.AsyncReader(ChunkSource(self.loop, serialise(6), size), Doc)
+      docs = self.read_all(reader)
+      self.assertEqual([doc.docid for doc in docs], list(range(6)))
+      self.assertEqual(docs[5].xs[4].name, 'x' * 40)
+
+  def test_stream_reader(self):
+    stream = asyncio.StreamReader(loop=self.loop)
+    stream.feed_data(serialise(4))
+    stream.feed_eof()
+    reader = dr.AsyncReader(stream, Doc, chunk_size=16)
+    self.assertEqual([doc.docid for doc in self.read_all(reader)], list(range(4)))
+    with self.assertRaises(StopAsyncIteration):
+      self.loop.run_until_complete(reader.__anext__())
+
+  def test_concurrent(self):
+    readers = [dr.AsyncReader(ChunkSource(self.loop, serialise(5), 3), Doc) for i in range(3)]
+    for i in range(5):
+      docs = self.loop.run_until_complete(asyncio.gather(*[reader.read() for reader in readers]))
+      self.assertEqual([doc.docid for doc in docs], [i, i, i])
+      self.assertEqual([len(doc.xs) for doc in docs], [i, i, i])
+
+  def test_where(self):
+    reader = dr.AsyncReader(ChunkSource(self.loop, serialise(6), 5), Doc, where=lambda doc: doc.docid % 2)
+    docs = self.read_all(reader)
+    self.assertEqual([doc.docid for doc in docs], [1, 3, 5])
+    self.assertEqual(len(docs[2].xs), 5)
+
+  def test_truncated(self):
+    reader = dr.AsyncReader(ChunkSource(self.loop, serialise(2)[:-1], 8), Doc)
+    with self.assertRaises(ReaderException):
+      self.read_all(reader)
@@ -0,0 +1,126 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+from __future__ import absolute_import, print_function, unicode_literals
+import gc
+import unittest
+import weakref
+
+from schwa import dr
+from schwa.dr.meta import MetaBase
+from schwa.dr.reader import AutomagicCache
+from schwa.dr.rtklasses import get_or_create_klass
+import six
+
+
+class Token(dr.Ann):
+  norm = dr.Field()
+
+  class Meta:
+    name = 'test_automagic_cache.Token'
+    serial = 'Token'
+
+
+class Doc(dr.Doc):
+  tokens = dr.Store(Token)
+
+  class Meta:
+    name = 'test_automagic_cache.Doc'
+    serial = 'Doc'
+
+
+class TaggedToken(dr.Ann):
+  norm = dr.Field()
+  pos = dr.Field()
+
+  class Meta:
+    name = 'test_automagic_cache.TaggedToken'
+    serial = 'Token'
+
+
+class TaggedDoc(dr.Doc):
+  docid = dr.Field()
+  tokens = dr.Store(TaggedToken)
+
+  class Meta:
+    name = 'test_automagic_cache.TaggedDoc'
+    serial = 'Doc'
+
+
+def write(out, klass, ntokens):
+  doc = klass()
+  for i in range(ntokens):
+    doc.tokens.create(norm='t{0}'.format(i))
+  dr.Writer(out, klass).write(doc)
+
+
+def create_stream(*klasses):
+  out = six.BytesIO()
+  for i, klass in enumerate(klasses):
+    write(out, klass, i + 1)
+  out.seek(0)
+  return out
+
+
+def is_registered(klass):
+  return MetaBase._registered.get(klass._dr_name) is klass and klass in get_or_create_klass.klasses.values()
+
+
+class AutomagicCacheTest(unittest.TestCase):
+  def test_identical_headers_share_classes(self):
+    docs = list(dr.Reader(create_stream(Doc, Doc, Doc), automagic=True))
+    self.assertEqual([len(doc.tokens) for doc in docs], [1, 2, 3])
+    self.assertIs(type(docs[0]), type(docs[2]))
+    self.assertIs(type(docs[0].tokens[0]), type(docs[2].tokens[0]))
+    self.assertIs(docs[0]._dr_rt.klasses, docs[2]._dr_rt.klasses)
+
+    # A second reader reuses the classes created by the first.
+    doc = dr.Reader(create_stream(Doc), automagic=True).next()
+    self.assertIs(type(doc), type(docs[0]))
+
+  def test_distinct_headers(self):
+    docs = list(dr.Reader(create_stream(Doc, TaggedDoc, Doc), automagic=True))
+    self.assertIsNot(type(docs[0]), type(docs[1]))
+    self.assertIs(type(docs[0]), type(docs[2]))
+    self.assertEqual(tuple(type(docs[0].tokens[0])._dr_fields), ('norm', ))
+    self.assertEqual(tuple(type(docs[1].tokens[0])._dr_fields), ('norm', 'pos'))
+    self.assertEqual(tuple(type(docs[1])._dr_fields), ('docid', ))
+
+  def test_known_classes(self):
+    # The same header read with and without known classes is read into different classes.
+    doc = dr.Reader(create_stream(TaggedDoc), automagic=True).next()
+    known = dr.Reader(create_stream(TaggedDoc), TaggedDoc, automagic=True).next()
+    self.assertIsNot(known._dr_rt.klasses, doc._dr_rt.klasses)
+    self.assertIs(type(known.tokens[0]), TaggedToken)
+    self.assertIsNot(type(doc.tokens[0]), TaggedToken)
+    self.assertEqual(known.tokens[0].norm, 't0')
+    self.assertIs(MetaBase._registered[TaggedToken._dr_name], TaggedToken)
+
+    # Known classes are only read into when the stream has them.
+    doc = dr.Reader(create_stream(Doc), TaggedDoc, automagic=True).next()
+    self.assertIs(type(doc.tokens[0]), TaggedToken)
+    self.assertIsNone(doc.tokens[0].pos)
+
+  def test_eviction(self):
+    reader = dr.Reader(create_stream(Doc, TaggedDoc), automagic=True)
+    reader._read_headers._cache = AutomagicCache(max_entries=1)
+    doc = reader.next()
+    klasses = (type(doc), type(doc.tokens[0]))
+    self.assertTrue(all(is_registered(klass) for klass in klasses))
+    tagged = reader.next()
+    self.assertFalse(any(is_registered(klass) for klass in klasses))
+    self.assertTrue(is_registered(type(tagged)))
+    self.assertEqual(len(reader._read_headers._cache), 1)
+
+    # Nothing else keeps the evicted classes alive, including the decoders compiled for them.
+    refs = [weakref.ref(klass) for klass in klasses]
+    del doc, klasses
+    gc.collect()
+    self.assertEqual([ref() for ref in refs], [None, None])
+
+  def test_round_trip(self):
+    orig = create_stream(Doc, TaggedDoc, Doc)
+    reader = dr.Reader(orig, automagic=True)
+    out = six.BytesIO()
+    for doc in reader:
+      dr.Writer(out, reader.doc_schema).write(doc)
+    self.assertEqual(out.getvalue(), orig.getvalue())
@@ -0,0 +1,131 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+from __future__ import absolute_import, print_function, unicode_literals
+import bz2
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+from schwa import dr
+from schwa.dr.compression import DecompressedStream, detect_compression, lzma, open_decompressed
+from schwa.dr.exceptions import ReaderException
+import six
+
+from testutils import create_docs, write_docs
+
+
+class X(dr.Ann):
+  name = dr.Field()
+
+  class Meta:
+    name = 'test_compressed_reader.X'
+
+
+class Doc(dr.Doc):
+  docid = dr.Field()
+  xs = dr.Store(X)
+
+  class Meta:
+    name = 'test_compressed_reader.Doc'
+
+
+def serialise(ndocs, start=0):
+  return write_docs(create_docs(Doc, range(start, start + ndocs), lambda docid: docid % 3, lambda j: 'x' * (j * 50)), Doc)
+
+
+def gzip_compress(data):
+  stream = six.BytesIO()
+  with gzip.GzipFile(fileobj=stream, mode='wb') as f:
+    f.write(data)
+  return stream.getvalue()
+
+
+class Unseekable(object):
+  def __init__(self, data):
+    self._stream = six.BytesIO(data)
+    self.nreads = 0
+
+  def read(self, n=-1):
+    self.nreads += 1
+    return self._stream.read(n)
+
+
+class CompressedReaderTest(unittest.TestCase):
+  def setUp(self):
+    self.data = serialise(20)
+    self.compressed = {
+        'gzip': gzip_compress(self.data),
+        'bz2': bz2.compress(self.data),
+    }
+    if lzma is not None:
+      self.compressed['xz'] = lzma.compress(self.data)
+
+  def assertDocs(self, reader, ndocs=20):
+    self.assertEqual([doc.docid for doc in reader], list(range(ndocs)))
+
+  def test_detect(self):
+    for name, data in six.iteritems(self.compressed):
+      self.assertEqual(detect_compression(data), name)
+    self.assertIsNone(detect_compression(self.data))
+    self.assertIsNone(detect_compression(b''))
+
+  def test_read(self):
+    for name, data in six.iteritems(self.compressed):
+      self.assertDocs(dr.Reader(six.BytesIO(data), Doc))
+      self.assertDocs(dr.Reader(Unseekable(data), Doc))
+      self.assertDocs(dr.Reader(six.BytesIO(data), Doc, prefetch=2))
+
+  def test_small_buffer(self):
+    for name, data in six.iteritems(self.compressed):
+      stream = DecompressedStream(six.BytesIO(data), name, buffer_size=3)
+      self.assertEqual(stream.read(5), self.data[:5])
+      self.assertEqual(stream.read(), self.data[5:])
+      self.assertEqual(stream.read(1), b'')
+
+  def test_uncompressed(self):
+    stream = six.BytesIO(self.data)
+    self.assertIs(open_decompressed(stream), stream)
+    self.assertEqual(stream.tell(), 0)
+    self.assertEqual(open_decompressed(Unseekable(self.data)).read(), self.data)
+    self.assertDocs(dr.Reader(Unseekable(self.data), Doc))
+    self.assertEqual(list(dr.Reader(six.BytesIO(b''), Doc)), [])
+    self.assertEqual(list(dr.Reader(Unseekable(b''), Doc)), [])
+
+  def test_detected_on_first_read(self):
+    # A pipe or socket with nothing written to it yet must not block the constructor.
+    for data in [self.data] + list(self.compressed.values()):
+      stream = Unseekable(data)
+      reader = dr.Reader(stream, Doc)
+      self.assertEqual(stream.nreads, 0)
+      self.assertDocs(reader)
+
+  def test_concatenated(self):
+    more = serialise(5, start=20)
+    data = gzip_compress(self.data) + gzip_compress(more)
+    self.assertDocs(dr.Reader(six.BytesIO(data), Doc), 25)
+    data = bz2.compress(self.data) + bz2.compress(more)
+    self.assertDocs(dr.Reader(six.BytesIO(data), Doc), 25)
+
+  def test_truncated(self):
+    for name, data in six.iteritems(self.compressed):
+      reader = dr.Reader(six.BytesIO(data[:len(data) // 2]), Doc)
+      self.assertRaises(ReaderException, list, reader)
+
+  def test_disabled(self):
+    reader = dr.Reader(six.BytesIO(self.compressed['gzip']), Doc, decompress=False)
+    self.assertRaises(ReaderException, reader.read)
+
+  def test_files(self):
+    tmp = tempfile.mkdtemp()
+    try:
+      path = os.path.join(tmp, 'docs.dr.gz')
+      with open(path, 'wb') as f:
+        f.write(self.compressed['gzip'])
+      with open(path, 'rb') as f:
+        self.assertDocs(dr.Reader(f, Doc, use_mmap=True))
+      with dr.ParallelReader(path, Doc, processes=2, batch_bytes=100) as reader:
+        self.assertEqual([doc.docid for doc in reader], list(range(20)))
+    finally:
+      shutil.rmtree(tmp)
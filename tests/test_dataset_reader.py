@@ -0,0 +1,109 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+from __future__ import absolute_import, print_function, unicode_literals
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+from schwa import dr
+from schwa.dr.dataset import INTERLEAVED
+
+from testutils import create_docs, write_docs
+
+
+class X(dr.Ann):
+  name = dr.Field()
+
+  class Meta:
+    name = 'test_dataset_reader.X'
+
+
+class Doc(dr.Doc):
+  docid = dr.Field()
+  xs = dr.Store(X)
+
+  class Meta:
+    name = 'test_dataset_reader.Doc'
+
+
+SIZES = [3, 1, 4]  # The number of documents in each shard.
+
+
+def serialise(shard, ndocs):
+  return write_docs(create_docs(Doc, range(100 * shard, 100 * shard + ndocs), lambda docid: docid % 100), Doc)
+
+
+def get_docid(doc):
+  return doc.docid
+
+
+class DatasetReaderTest(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.paths = []
+    for shard, ndocs in enumerate(SIZES):
+      path = os.path.join(self.tmpdir, 'shard-{0}.dr'.format(shard))
+      data = serialise(shard, ndocs)
+      if shard == 1:
+        with gzip.open(path, 'wb') as f:
+          f.write(data)
+      else:
+        with open(path, 'wb') as f:
+          f.write(data)
+      self.paths.append(path)
+    self.pattern = os.path.join(self.tmpdir, 'shard-*.dr')
+    self.sequential = [0, 1, 2, 100, 200, 201, 202, 203]
+    self.interleaved = [0, 100, 1, 2, 200, 201, 202, 203]
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def test_sequential(self):
+    finished = []
+    reader = dr.DatasetReader(self.pattern, Doc, progress=finished.append)
+    docs = list(reader)
+    self.assertEqual([doc.docid for doc in docs], self.sequential)
+    self.assertEqual([len(doc.xs) for doc in docs], [0, 1, 2, 0, 0, 1, 2, 3])
+    self.assertEqual([shard.path for shard in finished], self.paths)
+    self.assertEqual([shard.docs for shard in reader.shards], SIZES)
+    self.assertTrue(all(shard.done for shard in reader.shards))
+    # Every shard has the same header, which is only decoded once.
+    self.assertEqual(reader._reader._read_headers._cache.misses, 1)
+
+  def test_progress(self):
+    reader = dr.DatasetReader(list(reversed(self.paths)), Doc)
+    docs = iter(reader)
+    self.assertEqual(next(docs).docid, 200)
+    self.assertEqual([(shard.started, shard.docs, shard.done) for shard in reader.shards], [(True, 1, False), (False, 0, False), (False, 0, False)])
+    self.assertEqual([doc.docid for doc in docs], [201, 202, 203, 100, 0, 1, 2])
+
+  def test_interleaved(self):
+    finished = []
+    reader = dr.DatasetReader(self.pattern, Doc, order=INTERLEAVED, cycle_length=2, progress=finished.append)
+    self.assertEqual([doc.docid for doc in reader], self.interleaved)
+    self.assertEqual([shard.index for shard in finished], [1, 0, 2])
+    reader = dr.DatasetReader(self.pattern, Doc, order=INTERLEAVED, fn=get_docid)
+    self.assertEqual(sorted(reader), sorted(self.sequential))
+
+  def test_automagic(self):
+    docs = list(dr.DatasetReader(self.paths, automagic=True))
+    self.assertEqual([doc.docid for doc in docs], self.sequential)
+    self.assertEqual([x.name for x in docs[2].xs], ['x0', 'x1'])
+
+  def test_processes(self):
+    with dr.DatasetReader(self.pattern, Doc, processes=2, batch_bytes=1, fn=get_docid) as reader:
+      self.assertEqual(list(reader), self.sequential)
+      self.assertEqual([shard.docs for shard in reader.shards], SIZES)
+    finished = []
+    with dr.DatasetReader(self.pattern, Doc, processes=2, order=INTERLEAVED, cycle_length=2, batch_bytes=1, progress=finished.append) as reader:
+      docs = list(reader)
+    self.assertEqual([doc.docid for doc in docs], self.interleaved)
+    self.assertEqual([len(doc.xs) for doc in docs], [0, 0, 1, 2, 0, 1, 2, 3])
+    self.assertEqual([shard.index for shard in finished], [1, 0, 2])
+
+  def test_invalid(self):
+    self.assertRaises(ValueError, dr.DatasetReader, os.path.join(self.tmpdir, '*.missing'), Doc)
+    self.assertRaises(ValueError, dr.DatasetReader, self.pattern, Doc, order='random')
+    self.assertRaises(ValueError, dr.DatasetReader, self.pattern, processes=2, automagic=True)
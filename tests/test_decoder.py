@@ -0,0 +1,226 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+from __future__ import absolute_import, print_function, unicode_literals
+import datetime
+import unittest
+
+from schwa import dr
+from schwa.dr.exceptions import ReaderException
+from schwa.dr.framing import RawValue
+import six
+
+from testutils import write_read
+
+
+class Token(dr.Ann):
+  span = dr.Slice()
+  raw = dr.Field()
+  when = dr.DateTime()
+  head = dr.SelfPointer()
+  deps = dr.SelfPointers()
+
+  class Meta:
+    name = 'test_decoder.Token'
+
+
+class Chunk(dr.Ann):
+  tokens = dr.Pointers(Token)
+  first = dr.Pointer(Token)
+  label = dr.Field()
+
+  class Meta:
+    name = 'test_decoder.Chunk'
+
+
+class Counted(dr.Ann):
+  value = dr.Field()
+
+  def __init__(self, **kwargs):
+    super(Counted, self).__init__(**kwargs)
+    self.extra = 'initialised'
+
+  class Meta:
+    name = 'test_decoder.Counted'
+
+
+class Doc(dr.Doc):
+  chunks = dr.Store(Chunk)
+  tokens = dr.Store(Token)
+  counted = dr.Store(Counted)
+  best = dr.Pointer(Chunk)
+
+  class Meta:
+    name = 'test_decoder.Doc'
+
+
+class SmallToken(dr.Ann):
+  raw = dr.Field()
+
+  class Meta:
+    name = 'test_decoder.SmallToken'
+    serial = 'Token'
+
+
+class SmallDoc(dr.Doc):
+  tokens = dr.Store(SmallToken)
+
+  class Meta:
+    name = 'test_decoder.SmallDoc'
+    serial = 'Doc'
+
+
+class Head(dr.SelfPointer):
+  pass
+
+
+class Members(dr.Pointers):
+  pass
+
+
+class Upper(dr.Pointer):
+  def from_wire(self, val, rtfield, cur_store, doc):
+    return 'upper' if val is not None else None
+
+
+class Arc(dr.Ann):
+  head = Head()
+  members = Members(Token)
+  upper = Upper(Token)
+
+  class Meta:
+    name = 'test_decoder.Arc'
+
+
+class ArcDoc(dr.Doc):
+  tokens = dr.Store(Token)
+  arcs = dr.Store(Arc)
+
+  class Meta:
+    name = 'test_decoder.ArcDoc'
+
+
+def create_doc():
+  doc = Doc()
+  when = datetime.datetime(2014, 3, 12, 10, 30)
+  t0 = doc.tokens.create(span=slice(0, 3), raw='The', when=when)
+  t1 = doc.tokens.create(span=slice(4, 7), raw='cat', head=t0)
+  t0.deps = [t1]
+  doc.chunks.create(tokens=[t0, t1], first=t0, label='NP')
+  doc.chunks.create(label='empty')
+  doc.counted.create(value=3)
+  doc.best = doc.chunks[0]
+  return doc, when
+
+
+class DecoderTest(unittest.TestCase):
+  def test_round_trip(self):
+    orig, when = create_doc()
+    doc = write_read(orig, Doc)
+
+    self.assertEqual(len(doc.tokens), 2)
+    t0, t1 = doc.tokens
+    self.assertEqual(t0.span, slice(0, 3))
+    self.assertEqual(t0.raw, 'The')
+    self.assertEqual(t0.when, when)
+    self.assertIsNone(t0.head)
+    self.assertEqual(t0.deps, [t1])
+    self.assertIsNone(t0._dr_lazy)
+    self.assertIsNone(t0._dr_index)
+    self.assertIs(t1.head, t0)
+    self.assertEqual(t1.deps, [])
+    self.assertIsNone(t1.when)
+
+    c0, c1 = doc.chunks
+    self.assertEqual(c0.tokens, [t0, t1])
+    self.assertIs(c0.first, t0)
+    self.assertEqual(c0.label, 'NP')
+    self.assertEqual(c1.tokens, [])
+    self.assertIsNone(c1.first)
+    self.assertIs(doc.best, c0)
+
+  def test_default_lists_are_not_shared(self):
+    orig = Doc()
+    orig.chunks.create()
+    orig.chunks.create()
+    doc = write_read(orig, Doc)
+    doc.chunks[0].tokens.append(None)
+    self.assertEqual(doc.chunks[1].tokens, [])
+
+  def test_custom_init_is_run(self):
+    orig, _ = create_doc()
+    doc = write_read(orig, Doc)
+    self.assertEqual(doc.counted[0].value, 3)
+    self.assertEqual(doc.counted[0].extra, 'initialised')
+
+  def test_lazy_fields(self):
+    orig, _ = create_doc()
+    doc = write_read(orig, Doc, SmallDoc)
+    self.assertEqual([t.raw for t in doc.tokens], ['The', 'cat'])
+    self.assertIsNotNone(doc.tokens[0]._dr_lazy)
+    self.assertIsNotNone(doc.tokens[1]._dr_lazy)
+    for value in doc.tokens[0]._dr_lazy.values():
+      self.assertIsInstance(value, RawValue)
+    self.assertIn([0, 3], [value.unpack() for value in doc.tokens[0]._dr_lazy.values()])
+
+    doc = write_read(doc, SmallDoc, Doc)
+    self.assertEqual(doc.tokens[0].span, slice(0, 3))
+    self.assertIs(doc.tokens[1].head, doc.tokens[0])
+
+  def test_projected_fields_are_unpacked(self):
+    # Only the fields unknown to the class are kept as RawValue spans.
+    orig, _ = create_doc()
+    stream = six.BytesIO()
+    dr.Writer(stream, Doc).write(orig)
+    stream.seek(0)
+    doc = dr.Reader(stream, SmallDoc, fields={SmallToken: []}).next()
+    values = list(doc.tokens[0]._dr_lazy.values())
+    self.assertIn('The', values)
+    self.assertTrue(any(isinstance(value, RawValue) for value in values))
+    self.assertFalse(any(isinstance(value, RawValue) and value.unpack() == 'The' for value in values))
+
+  def test_decoders_are_reused(self):
+    stream = six.BytesIO()
+    writer = dr.Writer(stream, Doc)
+    for i in range(3):
+      writer.write(create_doc()[0])
+    stream.seek(0)
+    reader = dr.Reader(stream, Doc)
+    docs = list(reader)
+    self.assertEqual(len(docs), 3)
+    self.assertTrue(all(doc._dr_rt.decoders is docs[0]._dr_rt.decoders for doc in docs))
+    self.assertEqual(len(docs[0]._dr_rt.decoders), 4)
+
+  def test_instance_count_mismatch(self):
+    stream = six.BytesIO()
+    dr.Writer(stream, SmallDoc).write(SmallDoc())
+    data = stream.getvalue()
+    # Claim one element in the store while the instances array is empty.
+    self.assertEqual(data.count(b'\x93\xa6tokens\x01\x00'), 1)
+    data = data.replace(b'\x93\xa6tokens\x01\x00', b'\x93\xa6tokens\x01\x01')
+    with self.assertRaises(ReaderException):
+      dr.Reader(six.BytesIO(data), SmallDoc).read()
+
+  def test_pointer_subclasses(self):
+    orig = ArcDoc()
+    t0 = orig.tokens.create(raw='a')
+    t1 = orig.tokens.create(raw='b')
+    a0 = orig.arcs.create(members=[t1, t0], upper=t0)
+    orig.arcs.create(head=a0)
+    orig.arcs.create(head=a0, members=[t1])
+
+    reader = dr.Reader(six.BytesIO(), ArcDoc)
+    doc = write_read(orig, ArcDoc)
+    a0, a1, a2 = doc.arcs
+    self.assertIsNone(a0.head)
+    self.assertIs(a1.head, a0)
+    self.assertIs(a2.head, a0)
+    self.assertEqual(a0.members, doc.tokens[::-1])
+    self.assertEqual(a1.members, [])
+    self.assertEqual(a2.members, [doc.tokens[1]])
+    self.assertEqual([a.upper for a in doc.arcs], ['upper', None, None])
+
+    # Resolved a column at a time, unless from_wire is overridden.
+    rtschema = [k for k in doc._dr_rt.klasses if k.serial == 'Arc'][0]
+    source = reader._decoder(doc._dr_rt, rtschema).source
+    self.assertEqual(source.count('from_wire_many'), 2)
+    self.assertEqual(source.count('.from_wire('), 1)
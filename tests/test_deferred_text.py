@@ -0,0 +1,130 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+from __future__ import absolute_import, print_function, unicode_literals
+import os
+import shutil
+import tempfile
+import unittest
+
+from schwa import dr
+from schwa.dr.framing import DeferredText
+import six
+
+from testutils import write_docs
+
+
+class Token(dr.Ann):
+  raw = dr.Field()
+  norm = dr.Field()
+  span = dr.Slice()
+
+  class Meta:
+    name = 'test_deferred_text.Token'
+
+
+class SlotToken(dr.Ann):
+  __slots__ = ()
+  raw = dr.Field()
+
+  class Meta:
+    name = 'test_deferred_text.SlotToken'
+
+
+class InitToken(dr.Ann):
+  raw = dr.Field()
+
+  def __init__(self, **kwargs):
+    super(InitToken, self).__init__(**kwargs)
+    self.extra = True
+
+  class Meta:
+    name = 'test_deferred_text.InitToken'
+
+
+class Doc(dr.Doc):
+  title = dr.Field()
+  tokens = dr.Store(Token)
+  slot_tokens = dr.Store(SlotToken)
+  init_tokens = dr.Store(InitToken)
+
+  class Meta:
+    name = 'test_deferred_text.Doc'
+
+
+RAWS = ['The', 'cat', b'\xff\x00', None, 'the', 'The', 'caf\xe9', 7]
+
+
+def serialise():
+  doc = Doc(title='A title')
+  for i, raw in enumerate(RAWS):
+    doc.tokens.create(raw=raw, norm=raw.lower() if isinstance(raw, six.text_type) else None, span=slice(i, i + 1))
+    doc.slot_tokens.create(raw=raw)
+    doc.init_tokens.create(raw=raw)
+  return write_docs([doc], Doc)
+
+
+class DeferredTextTest(unittest.TestCase):
+  def setUp(self):
+    self.data = serialise()
+
+  def read(self, text, **kwargs):
+    return dr.Reader(six.BytesIO(self.data), Doc, text=text, **kwargs).next()
+
+  def test_deferred(self):
+    doc = self.read({Token: ['raw'], SlotToken: ['raw'], InitToken: ['raw'], Doc: ['title']})
+    self.assertIsInstance(doc._dr_deferred['title'], DeferredText)
+    self.assertEqual(doc.title, 'A title')
+    self.assertFalse(doc._dr_deferred)
+    for store in (doc.tokens, doc.slot_tokens, doc.init_tokens):
+      self.assertIn('raw', store[0]._dr_deferred)
+      self.assertEqual([t.raw for t in store], RAWS)
+      self.assertFalse(any(t._dr_deferred for t in store))
+    self.assertEqual([t.span for t in doc.tokens][:2], [slice(0, 1), slice(1, 2)])
+    self.assertTrue(doc.init_tokens[0].extra)
+    # Only str values are deferred.
+    self.assertIsNone(doc.tokens[3]._dr_deferred)
+    self.assertIsInstance(doc.tokens[2].raw, six.binary_type)
+
+  def test_all(self):
+    doc = self.read(True)
+    self.assertIn('norm', doc.tokens[0]._dr_deferred)
+    self.assertEqual([t.norm for t in doc.tokens][:2], ['the', 'cat'])
+    self.assertEqual(doc.title, 'A title')
+
+  def test_shared(self):
+    doc = self.read(True)
+    self.assertIs(doc.tokens[0].raw, doc.tokens[5].raw)
+    self.assertIs(doc.tokens[0].raw, doc.slot_tokens[0].raw)
+    self.assertIs(doc.tokens[4].raw, doc.tokens[0].norm)
+
+  def test_assigned(self):
+    doc = self.read(True)
+    doc.tokens[0].raw = 'A'
+    self.assertEqual(doc.tokens[0].raw, 'A')
+    with self.assertRaises(AttributeError):
+      doc.tokens[0].missing
+
+  def test_write(self):
+    doc = self.read(True)
+    doc.tokens[1].raw = 'dog'
+    out = six.BytesIO()
+    dr.Writer(out, Doc).write(doc)
+    doc = dr.Reader(six.BytesIO(out.getvalue()), Doc).next()
+    self.assertEqual([t.raw for t in doc.tokens], ['The', 'dog'] + RAWS[2:])
+    self.assertEqual([t.raw for t in doc.slot_tokens], RAWS)
+
+  def test_mmap(self):
+    tmpdir = tempfile.mkdtemp()
+    try:
+      path = os.path.join(tmpdir, 'docs.dr')
+      with open(path, 'wb') as f:
+        f.write(self.data)
+      with open(path, 'rb') as f:
+        doc = dr.Reader(f, Doc, use_mmap=True, text=True).next()
+      self.assertEqual([t.raw for t in doc.tokens], RAWS)
+    finally:
+      shutil.rmtree(tmpdir)
+
+  def test_invalid(self):
+    self.assertRaises(ValueError, dr.Reader, six.BytesIO(self.data), Doc, text={Token: ['span']})
+    self.assertRaises(ValueError, dr.Reader, six.BytesIO(self.data), Doc, text={Token: ['missing']})
@@ -0,0 +1,74 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+from __future__ import absolute_import, print_function, unicode_literals
+import datetime
+import unittest
+
+from schwa import dr
+import six
+
+
+class Token(dr.Ann):
+  norm = dr.Field()
+  raw = dr.Field()
+  span = dr.Slice()
+  head = dr.SelfPointer()
+  created = dr.DateTime()
+
+  class Meta:
+    name = 'test_field_projection.Token'
+
+
+class Doc(dr.Doc):
+  docid = dr.Field()
+  title = dr.Field()
+  tokens = dr.Store(Token)
+
+  class Meta:
+    name = 'test_field_projection.Doc'
+
+
+NOW = datetime.datetime(2014, 5, 6, 7, 8, 9)
+
+
+def create_stream():
+  stream = six.BytesIO()
+  writer = dr.Writer(stream, Doc)
+  doc = Doc(docid='d0', title='A title')
+  for i in range(3):
+    doc.tokens.create(norm='n{0}'.format(i), raw='R{0}'.format(i), span=slice(i, i + 1), created=NOW)
+  doc.tokens[0].head = doc.tokens[2]
+  writer.write(doc)
+  stream.seek(0)
+  return stream
+
+
+class FieldProjectionTest(unittest.TestCase):
+  def test_projection(self):
+    reader = dr.Reader(create_stream(), Doc, fields={Token: ['norm', 'span'], Doc: ['docid']})
+    doc = reader.next()
+    self.assertEqual(doc.docid, 'd0')
+    self.assertIsNone(doc.title)
+    self.assertEqual([t.norm for t in doc.tokens], ['n0', 'n1', 'n2'])
+    self.assertEqual(doc.tokens[1].span, slice(1, 2))
+    for t in doc.tokens:
+      self.assertIsNone(t.raw)
+      self.assertIsNone(t.head)
+      self.assertIsNone(t.created)
+
+  def test_round_trip(self):
+    doc = dr.Reader(create_stream(), Doc, fields={Token: ['norm'], Doc: []}).next()
+    doc.tokens[1].raw = 'changed'
+    out = six.BytesIO()
+    dr.Writer(out, Doc).write(doc)
+    out.seek(0)
+    doc = dr.Reader(out, Doc).next()
+    self.assertEqual(doc.title, 'A title')
+    self.assertEqual([t.raw for t in doc.tokens], ['R0', 'changed', 'R2'])
+    self.assertIs(doc.tokens[0].head, doc.tokens[2])
+    self.assertEqual(doc.tokens[2].created, NOW)
+    self.assertEqual(doc.tokens[2].span, slice(2, 3))
+
+  def test_unknown_field(self):
+    with self.assertRaises(ValueError):
+      dr.Reader(create_stream(), Doc, fields={Token: ['nrom']})
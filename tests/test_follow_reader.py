@@ -0,0 +1,114 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+from __future__ import absolute_import, print_function, unicode_literals
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from schwa import dr
+from schwa.dr.follow import Follower
+import six
+
+from testutils import create_docs, write_docs
+
+
+class X(dr.Ann):
+  name = dr.Field()
+
+  class Meta:
+    name = 'test_follow_reader.X'
+
+
+class Doc(dr.Doc):
+  docid = dr.Field()
+  xs = dr.Store(X)
+
+  class Meta:
+    name = 'test_follow_reader.Doc'
+
+
+def serialise(docid):
+  return write_docs(create_docs(Doc, [docid], lambda docid: docid), Doc)
+
+
+class FollowReaderTest(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.path = os.path.join(self.tmpdir, 'docs.dr')
+    self.out = open(self.path, 'wb')
+    self.istream = open(self.path, 'rb')
+
+  def tearDown(self):
+    self.out.close()
+    self.istream.close()
+    shutil.rmtree(self.tmpdir)
+
+  def append(self, data):
+    self.out.write(data)
+    self.out.flush()
+
+  def test_idle_timeout(self):
+    self.append(serialise(1) + serialise(2))
+    reader = dr.Reader(self.istream, Doc, follow=True, poll_interval=0.01, idle_timeout=0.05)
+    self.assertEqual([doc.docid for doc in reader], [1, 2])
+    self.assertEqual(reader.follower.offset, os.path.getsize(self.path))
+    self.assertGreater(reader.follower.polls, 1)
+    self.assertAlmostEqual(reader.follower.poll_time, 0.05)
+    self.append(serialise(3))
+    self.assertEqual(reader.read().docid, 3)
+
+  def test_partial(self):
+    data = serialise(1) + serialise(2)
+    self.append(data[:-3])
+    reader = dr.Reader(self.istream, Doc, follow=True, poll_interval=0.01, idle_timeout=0.03)
+    self.assertEqual(reader.read().docid, 1)
+    self.assertIsNone(reader.read())
+    self.assertEqual(reader.follower.offset, len(serialise(1)))
+    self.append(data[-3:])
+    doc = reader.read()
+    self.assertEqual([x.name for x in doc.xs], ['x0', 'x1'])
+    self.assertEqual(reader.follower.offset, len(data))
+
+  def test_follow(self):
+    def write():
+      for docid in range(4):
+        time.sleep(0.02)
+        data = serialise(docid)
+        self.append(data[:5])
+        time.sleep(0.01)
+        self.append(data[5:])
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    reader = dr.Reader(self.istream, Doc, follow=True, poll_interval=0.005)
+    docs = [reader.read() for i in range(4)]
+    thread.join()
+    self.assertEqual([doc.docid for doc in docs], [0, 1, 2, 3])
+    self.assertEqual([len(doc.xs) for doc in docs], [0, 1, 2, 3])
+    threading.Timer(0.02, reader.follower.stop).start()
+    self.assertIsNone(reader.read())
+    self.assertTrue(reader.follower.stopped)
+
+  def test_resume(self):
+    self.append(serialise(1) + serialise(2) + serialise(3))
+    reader = dr.Reader(self.istream, Doc, follow=True, idle_timeout=0)
+    reader.read()
+    offset = reader.follower.offset
+    with open(self.path, 'rb') as f:
+      f.seek(offset)
+      reader = dr.Reader(f, Doc, follow=True, idle_timeout=0)
+      self.assertEqual([doc.docid for doc in reader], [2, 3])
+
+  def test_backoff(self):
+    follower = Follower(six.BytesIO(), poll_interval=0.001, max_poll_interval=0.004, idle_timeout=0.02)
+    self.assertIsNone(follower.next_frame())
+    # Waits of 1, 2 and 4 ms, followed by waits of at most 4 ms.
+    self.assertGreaterEqual(follower.polls, 6)
+    self.assertAlmostEqual(follower.poll_time, 0.02)
+
+  def test_invalid(self):
+    self.assertRaises(ValueError, dr.Reader, self.istream, Doc, follow=True, use_mmap=True)
+    self.assertRaises(ValueError, dr.Reader, self.istream, Doc, follow=True, prefetch=4)
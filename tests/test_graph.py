@@ -0,0 +1,170 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+from __future__ import absolute_import, print_function, unicode_literals
+import array
+import unittest
+
+from schwa import dr
+from schwa.dr.graph import IN_GRAPH
+import six
+
+from testutils import write_docs
+
+
+class Node(dr.Ann):
+  label = dr.Field()
+  children = dr.SelfPointers()
+  parent = dr.SelfPointer()
+
+  class Meta:
+    name = 'test_graph.Node'
+
+
+class Group(dr.Ann):
+  members = dr.Pointers(Node)
+
+  class Meta:
+    name = 'test_graph.Group'
+
+
+class Doc(dr.Doc):
+  nodes = dr.Store(Node)
+  groups = dr.Store(Group)
+
+  class Meta:
+    name = 'test_graph.Doc'
+
+
+#      0
+#    1   2
+#   3 4   5
+EDGES = [[1, 2], [3, 4], [5], [], [], []]
+
+
+def create_doc():
+  doc = Doc()
+  for i in range(len(EDGES)):
+    doc.nodes.create(label='n{0}'.format(i))
+  for i, children in enumerate(EDGES):
+    doc.nodes[i].children = [doc.nodes[c] for c in children]
+    for c in children:
+      doc.nodes[c].parent = doc.nodes[i]
+  doc.groups.create(members=[doc.nodes[5], doc.nodes[0]])
+  doc.groups.create()
+  return doc
+
+
+def serialise(doc):
+  return write_docs([doc], Doc)
+
+
+class CSRGraphTest(unittest.TestCase):
+  def setUp(self):
+    self.graph = dr.CSRGraph.from_lists(EDGES)
+
+  def test_structure(self):
+    graph = self.graph
+    self.assertEqual(len(graph), 6)
+    self.assertEqual(list(graph.offsets), [0, 2, 4, 5, 5, 5, 5])
+    self.assertEqual(list(graph.targets), [1, 2, 3, 4, 5])
+    self.assertEqual(list(graph.neighbours(1)), [3, 4])
+    self.assertEqual(graph.degree(3), 0)
+    self.assertEqual(graph.roots(), [0])
+
+  def test_traversals(self):
+    graph = self.graph
+    nodes, depths = graph.preorder()
+    self.assertEqual(list(nodes), [0, 1, 3, 4, 2, 5])
+    self.assertEqual(list(depths), [0, 1, 2, 2, 1, 2])
+    self.assertEqual([list(a) for a in graph.preorder([2])], [[2, 5], [0, 1]])
+    self.assertEqual(list(graph.topological_order()), [0, 1, 2, 3, 4, 5])
+    self.assertEqual(list(graph.depths()), [0, 1, 1, 2, 2, 2])
+    self.assertEqual(list(graph.depths([1])), [-1, 0, -1, 1, 1, -1])
+    self.assertEqual(list(graph.heights()), [2, 1, 1, 0, 0, 0])
+    parents = graph.transpose()
+    self.assertEqual([list(parents.neighbours(i)) for i in range(6)], [[], [0], [0], [1], [1], [2]])
+    self.assertEqual(parents.transpose(), graph)
+
+  def test_cycle(self):
+    self.assertRaises(ValueError, dr.CSRGraph.from_lists([[1], [0]]).heights)
+
+  def test_from_store(self):
+    doc = create_doc()
+    self.assertEqual(doc.nodes.graph('children'), self.graph)
+    self.assertEqual(list(doc.nodes.graph('parent').targets), [0, 0, 1, 1, 2])
+    self.assertEqual(list(doc.groups.graph('members', doc.nodes).targets), [5, 0])
+
+  def test_other_store(self):
+    # The edges of a pointer into another store can be reversed, but not followed node to node.
+    doc = create_doc()
+    data = serialise(doc)
+    read = dr.Reader(six.BytesIO(data), Doc, graphs={Group: ['members']}).next()
+    for graph in (doc.groups.graph('members', doc.nodes), read.groups.graph('members')):
+      self.assertEqual((len(graph), graph.ntargets), (2, 6))
+      for method in (graph.roots, graph.preorder, graph.depths, graph.topological_order, graph.heights):
+        self.assertRaises(ValueError, method)
+      groups = graph.transpose()
+      self.assertEqual((len(groups), groups.ntargets), (6, 2))
+      self.assertEqual([list(groups.neighbours(i)) for i in range(6)], [[0], [], [], [], [], [0]])
+      self.assertEqual(groups.transpose(), dr.CSRGraph.from_lists([[0, 5], None], 6))
+
+
+class ReadGraphTest(unittest.TestCase):
+  def test_read(self):
+    data = serialise(create_doc())
+    doc = dr.Reader(six.BytesIO(data), Doc, graphs={Node: ['children', 'parent'], Group: ['members']}).next()
+    self.assertEqual(doc.nodes.graph('children'), dr.CSRGraph.from_lists(EDGES))
+    self.assertIsInstance(doc.nodes.graph('children').targets, array.array)
+    self.assertEqual(list(doc.nodes.graph('parent').offsets), [0, 0, 1, 2, 3, 4, 5])
+    self.assertEqual(list(doc.groups.graph('members').targets), [5, 0])
+    self.assertEqual([n.children for n in doc.nodes], [IN_GRAPH] * 6)
+    self.assertIs(doc.nodes[1].parent, IN_GRAPH)
+    self.assertFalse(doc.nodes[1].parent)
+    self.assertEqual([n.label for n in doc.nodes], ['n{0}'.format(i) for i in range(6)])
+
+    # The fields are written back out as they were read.
+    out = six.BytesIO()
+    dr.Writer(out, Doc).write(doc)
+    doc = dr.Reader(six.BytesIO(out.getvalue()), Doc).next()
+    self.assertEqual([[c.label for c in n.children] for n in doc.nodes], [['n{0}'.format(c) for c in children] for children in EDGES])
+    self.assertIs(doc.nodes[5].parent, doc.nodes[2])
+    self.assertEqual(doc.nodes.graph('children'), dr.CSRGraph.from_lists(EDGES))
+
+  def test_assigned(self):
+    # Assigned values, including None, replace the edges read.
+    data = serialise(create_doc())
+    doc = dr.Reader(six.BytesIO(data), Doc, graphs={Node: ['children', 'parent']}).next()
+    doc.nodes[0].children = [doc.nodes[2]]
+    doc.nodes[5].parent = None
+    doc = dr.Reader(six.BytesIO(serialise(doc)), Doc).next()
+    self.assertEqual(doc.nodes[0].children, [doc.nodes[2]])
+    self.assertEqual(doc.nodes[1].children, [doc.nodes[3], doc.nodes[4]])
+    self.assertIsNone(doc.nodes[5].parent)
+    self.assertIs(doc.nodes[4].parent, doc.nodes[1])
+
+  def test_modified_store(self):
+    data = serialise(create_doc())
+    reader = lambda: dr.Reader(six.BytesIO(data), Doc, graphs={Node: ['children', 'parent'], Group: ['members']}).next()
+    doc = reader()
+    doc.nodes.append(Node(label='new'))
+    self.assertRaises(dr.WriterException, serialise, doc)
+
+    doc = reader()
+    doc.nodes[1], doc.nodes[2] = doc.nodes[2], doc.nodes[1]
+    self.assertRaises(dr.WriterException, serialise, doc)
+
+    # The groups point into the nodes, so their edges no longer hold either.
+    doc = reader()
+    del doc.nodes[0]
+    for node in doc.nodes:
+      node.children = []
+      node.parent = None
+    self.assertRaises(dr.WriterException, serialise, doc)
+    for group in doc.groups:
+      group.members = []
+    doc = dr.Reader(six.BytesIO(serialise(doc)), Doc).next()
+    self.assertEqual(len(doc.nodes), 5)
+
+  def test_invalid(self):
+    self.assertRaises(ValueError, dr.Reader, six.BytesIO(b''), Doc, graphs={Node: ['label']})
+    self.assertRaises(ValueError, dr.Reader, six.BytesIO(b''), Doc, graphs={Doc: ['nodes']})
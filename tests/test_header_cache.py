@@ -0,0 +1,176 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+from __future__ import absolute_import, print_function, unicode_literals
+import unittest
+
+from schwa import dr
+from schwa.dr.reader import HeaderCache, RTReader
+import six
+
+
+class X(dr.Ann):
+  name = dr.Field()
+
+  class Meta:
+    name = 'test_header_cache.X'
+    serial = 'X'
+
+
+class Y(dr.Ann):
+  x = dr.Pointer(X)
+
+  class Meta:
+    name = 'test_header_cache.Y'
+    serial = 'Y'
+
+
+class Doc(dr.Doc):
+  xs = dr.Store(X)
+  ys = dr.Store(Y)
+
+  class Meta:
+    name = 'test_header_cache.Doc'
+    serial = 'Doc'
+
+
+class DocXs(dr.Doc):
+  xs = dr.Store(X)
+
+  class Meta:
+    name = 'test_header_cache.DocXs'
+    serial = 'Doc'
+
+
+class DocExtra(dr.Doc):
+  xs = dr.Store(X)
+  extra = dr.Store(X)
+
+  class Meta:
+    name = 'test_header_cache.DocExtra'
+    serial = 'Doc'
+
+
+class CountingRTReader(RTReader):
+  __slots__ = ('unpacked', )
+
+  def _unpack_klasses(self, klasses):
+    self.unpacked += 1
+    return super(CountingRTReader, self)._unpack_klasses(klasses)
+
+
+def create_stream(*sizes):
+  stream = six.BytesIO()
+  writer = dr.Writer(stream, Doc)
+  for size in sizes:
+    doc = Doc()
+    for i in range(size):
+      x = doc.xs.create(name='x{0}'.format(i))
+      doc.ys.create(x=x)
+    writer.write(doc)
+  stream.seek(0)
+  return stream
+
+
+class HeaderCacheTest(unittest.TestCase):
+  def test_shared_graph(self):
+    docs = list(dr.Reader(create_stream(2, 3, 0), Doc))
+    rts = [doc._dr_rt for doc in docs]
+    self.assertTrue(all(rt.shared for rt in rts))
+    self.assertIs(rts[0].klasses, rts[1].klasses)
+    self.assertIs(rts[0].klasses, rts[2].klasses)
+    self.assertIs(rts[0].doc.fields, rts[2].doc.fields)
+    self.assertEqual([rt.nelem for rt in rts], [[2, 2], [3, 3], [0, 0]])
+    self.assertEqual([len(doc.xs) for doc in docs], [2, 3, 0])
+    self.assertIs(docs[1].ys[2].x, docs[1].xs[2])
+
+  def test_hits(self):
+    cache = HeaderCache()
+    reader = dr.Reader(create_stream(1, 2, 3), Doc)
+    reader._read_headers._cache = cache
+    list(reader)
+    self.assertEqual(len(cache), 1)
+    self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+  def test_klasses_unpacked_on_miss(self):
+    reader = dr.Reader(create_stream(1, 2, 3), Doc)
+    reader._read_headers = CountingRTReader(reader.doc_schema, HeaderCache(), 'utf-8')
+    reader._read_headers.unpacked = 0
+    self.assertEqual([len(doc.xs) for doc in reader], [1, 2, 3])
+    self.assertEqual(reader._read_headers.unpacked, 1)
+
+  def test_store_nelem_and_lazy(self):
+    docs = list(dr.Reader(create_stream(1, 2), DocXs))
+    for doc, n in zip(docs, (1, 2)):
+      xs, ys = doc._dr_rt.doc.stores
+      self.assertEqual((xs.nelem, ys.nelem), (n, n))
+      self.assertIsNone(xs.lazy)
+      self.assertEqual(ys.lazy, doc._dr_rt.lazy[1])
+    self.assertNotEqual(docs[0]._dr_rt.doc.stores[1].lazy, docs[1]._dr_rt.doc.stores[1].lazy)
+
+  def test_bounded(self):
+    cache = HeaderCache(max_entries=2)
+    for key in 'abc':
+      cache.put(key, object())
+    self.assertEqual(len(cache), 2)
+    self.assertIsNone(cache.get('a'))
+    self.assertIsNotNone(cache.get('c'))
+
+  def test_lazy_stores_are_per_document(self):
+    docs = list(dr.Reader(create_stream(1, 2), DocXs))
+    self.assertIs(docs[0]._dr_rt.klasses, docs[1]._dr_rt.klasses)
+    lazy = [doc._dr_rt.lazy for doc in docs]
+    self.assertIsNone(lazy[0][0])
+    self.assertNotEqual(lazy[0][1], lazy[1][1])
+
+    out = six.BytesIO()
+    writer = dr.Writer(out, DocXs)
+    for doc in docs:
+      writer.write(doc)
+      self.assertIs(doc._dr_rt.klasses, docs[0]._dr_rt.klasses)
+    out.seek(0)
+    docs = list(dr.Reader(out, Doc))
+    self.assertEqual([len(doc.ys) for doc in docs], [1, 2])
+    self.assertIs(docs[1].ys[1].x, docs[1].xs[1])
+
+  def test_copy_on_write(self):
+    docs = list(dr.Reader(create_stream(1, 2), DocXs))
+    shared = docs[0]._dr_rt.klasses
+    nstores = len(shared[0].stores)
+
+    out = six.BytesIO()
+    doc = docs[0]
+    doc.extra = dr.StoreList(X)
+    doc.extra.create(name='extra')
+    dr.Writer(out, DocExtra).write(doc)
+    self.assertIsNot(doc._dr_rt.klasses, shared)
+    self.assertEqual(len(shared[0].stores), nstores)
+    self.assertEqual(len(doc._dr_rt.doc.stores), nstores + 1)
+    self.assertIs(docs[1]._dr_rt.klasses, shared)
+
+  def test_merged_copy_is_shared(self):
+    # The Writer shares the merged copy of a graph between the documents it writes with the same header.
+    docs = list(dr.Reader(create_stream(1, 2), DocXs))
+    shared = docs[0]._dr_rt.klasses
+    nstores = len(shared[0].stores)
+
+    writer = dr.Writer(six.BytesIO(), DocExtra)
+    for doc in docs:
+      doc.extra = dr.StoreList(X)
+      writer.write(doc)
+    self.assertTrue(docs[0]._dr_rt.shared)
+    self.assertIsNot(docs[0]._dr_rt.klasses, shared)
+    self.assertIs(docs[1]._dr_rt.klasses, docs[0]._dr_rt.klasses)
+    self.assertEqual(len(shared[0].stores), nstores)
+
+  def test_writer_keeps_no_document_bytes(self):
+    # The Writer caches the class graph of a header, but not the lazy stores of the document it came from.
+    orig = create_stream(1, 2)
+    out = six.BytesIO()
+    writer = dr.Writer(out, Doc)
+    for doc in dr.Reader(orig, Doc, stores=['xs']):
+      self.assertIsNotNone(doc._dr_rt.lazy[1])
+      writer.write(doc)
+    self.assertEqual(out.getvalue(), orig.getvalue())
+    for header in writer._headers._entries.values():
+      self.assertEqual(header.rt.lazy, [None, None])
+      self.assertEqual(header.rt.nelem, [None, None])
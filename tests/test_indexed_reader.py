@@ -0,0 +1,186 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+from __future__ import absolute_import, print_function, unicode_literals
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+import msgpack
+from schwa import dr
+from schwa.dr.exceptions import ReaderException
+from schwa.dr.framing import frame_end, iter_frame_offsets, iter_frames, object_end
+import six
+
+from testutils import create_docs, write_docs
+
+
+class X(dr.Ann):
+  name = dr.Field()
+
+  class Meta:
+    name = 'test_indexed_reader.X'
+
+
+class Doc(dr.Doc):
+  docid = dr.Field()
+  xs = dr.Store(X)
+
+  class Meta:
+    name = 'test_indexed_reader.Doc'
+
+
+def serialise(ndocs):
+  return write_docs(create_docs(Doc, range(ndocs), lambda docid: docid % 4, lambda j: 'x' * (j * 100)), Doc)
+
+
+class FramingTest(unittest.TestCase):
+  def test_object_end(self):
+    values = [0, -1, 127, 128, 255, 2 ** 16, 2 ** 40, -2 ** 40, 1.5, None, True, False, '', 'a' * 31, 'a' * 32, 'a' * 300, 'a' * 70000, b'\x00' * 300, [], list(range(20)), list(range(70000)), {}, {1: [1, 2, {'x': None}]}, dict((i, i) for i in range(20))]
+    for value in values:
+      packed = msgpack.packb(value, use_bin_type=True)
+      self.assertEqual(object_end(packed + b'\xc0', 0), len(packed), value)
+      self.assertIsNone(object_end(packed[:-1], 0))
+
+  def test_frame_end(self):
+    data = serialise(5)
+    offsets = list(iter_frame_offsets(data))
+    self.assertEqual(len(offsets), 5)
+    self.assertEqual(offsets[0][0], 0)
+    self.assertEqual(offsets[-1][1], len(data))
+    for (start, end), (next_start, _) in zip(offsets, offsets[1:]):
+      self.assertEqual(end, next_start)
+    start, end = offsets[3]
+    self.assertIsNone(frame_end(data, start, end - 1))
+
+  def test_truncated(self):
+    data = serialise(3)
+    with self.assertRaises(ReaderException):
+      list(iter_frame_offsets(data[:-1]))
+    with self.assertRaises(ReaderException):
+      list(iter_frames(six.BytesIO(data[:-1]), chunk_size=7))
+
+  def test_iter_frames(self):
+    data = serialise(6)
+    frames = list(iter_frames(six.BytesIO(data), chunk_size=7))
+    self.assertEqual(len(frames), 6)
+    self.assertEqual(b''.join(frames), data)
+
+
+class IndexedReaderTest(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.path = os.path.join(self.tmpdir, 'docs.dr')
+    with open(self.path, 'wb') as f:
+      f.write(serialise(10))
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def _check(self, reader):
+    self.assertEqual(len(reader), 10)
+    self.assertEqual(reader[7].docid, 7)
+    self.assertEqual(len(reader[7].xs), 3)
+    self.assertEqual(reader[-1].docid, 9)
+    self.assertEqual(reader[0].docid, 0)
+    self.assertEqual([doc.docid for doc in reader[2:8:3]], [2, 5])
+    self.assertEqual([doc.docid for doc in reader[8:]], [8, 9])
+    with self.assertRaises(IndexError):
+      reader[10]
+
+    reader.seek(4)
+    self.assertEqual(reader.tell(), 4)
+    self.assertEqual([doc.docid for doc in reader], [4, 5, 6, 7, 8, 9])
+    self.assertEqual(reader.tell(), 10)
+    reader.seek(9)
+    self.assertEqual(reader.next().docid, 9)
+    self.assertIsNone(reader.read())
+
+  def test_file(self):
+    with open(self.path, 'rb') as f:
+      self._check(dr.IndexedReader(f, Doc))
+
+  def test_stream(self):
+    with open(self.path, 'rb') as f:
+      stream = six.BytesIO(f.read())
+    self._check(dr.IndexedReader(stream, Doc))
+
+  def test_saved_index(self):
+    index_path = self.path + '.idx'
+    with open(self.path, 'rb') as f:
+      reader = dr.IndexedReader(f, Doc, index=index_path)
+      self.assertTrue(os.path.exists(index_path))
+      offsets = list(reader.index.offsets)
+
+    index = dr.DocumentIndex.load(index_path)
+    self.assertEqual(list(index.offsets), offsets)
+    self.assertEqual(index.source_size, os.path.getsize(self.path))
+    with open(self.path, 'rb') as f:
+      self._check(dr.IndexedReader(f, Doc, index=index))
+
+    # A stale index is rebuilt.
+    with open(self.path, 'ab') as f:
+      f.write(serialise(2))
+    with open(self.path, 'rb') as f:
+      reader = dr.IndexedReader(f, Doc, index=index_path)
+      self.assertEqual(len(reader), 12)
+      self.assertEqual(reader[11].docid, 1)
+    self.assertEqual(len(dr.DocumentIndex.load(index_path)), 12)
+
+  def test_saved_format(self):
+    index_path = self.path + '.idx'
+    with open(self.path, 'rb') as f:
+      offsets = list(dr.IndexedReader(f, Doc, index=index_path).index.offsets)
+    with open(index_path, 'rb') as f:
+      data = f.read()
+    header = dr.DocumentIndex.HEADER
+    self.assertEqual(data[:8], b'DRINDEX1')
+    self.assertEqual(len(data), header.size + 8 * len(offsets))
+    self.assertEqual(list(struct.unpack(str('<{0}Q'.format(len(offsets))), data[header.size:])), offsets)
+
+  def test_modified_index_rebuilt(self):
+    index_path = self.path + '.idx'
+    with open(self.path, 'rb') as f:
+      dr.IndexedReader(f, Doc, index=index_path)
+    index = dr.DocumentIndex.load(index_path)
+
+    # The file is changed in place, keeping its size and modification time.
+    with open(self.path, 'r+b') as f:
+      data = f.read()
+      f.seek(0)
+      f.write(data.replace(b'x' * 100, b'y' * 100, 1))
+    os.utime(self.path, (index.source_mtime, index.source_mtime))
+    with open(self.path, 'rb') as f:
+      self.assertFalse(index.describes(f))
+      reader = dr.IndexedReader(f, Doc, index=index_path)
+      self.assertEqual(reader[2].xs[1].name, 'y' * 100)
+    self.assertNotEqual(dr.DocumentIndex.load(index_path).source_checksum, index.source_checksum)
+
+  def test_stream_then_seek(self):
+    with open(self.path, 'rb') as f:
+      reader = dr.IndexedReader(f, Doc)
+      stream = reader.stream()
+      self.assertEqual(stream.doc.docid, 0)
+      self.assertEqual(reader.tell(), 1)
+      self.assertEqual(reader[1].docid, 1)
+
+      # Seeking away from a document part way through being streamed abandons it.
+      reader.seek(3)
+      stream = reader.stream()
+      name, objects = next(stream)
+      self.assertEqual(next(objects).name, '')
+      self.assertEqual(reader[0].docid, 0)
+      self.assertEqual(list(objects), [])
+      self.assertEqual(list(stream), [])
+      self.assertEqual(reader.next().docid, 1)
+      self.assertEqual(reader.stream().doc.docid, 2)
+      self.assertEqual(reader.tell(), 3)
+
+  def test_empty(self):
+    path = os.path.join(self.tmpdir, 'empty.dr')
+    open(path, 'wb').close()
+    with open(path, 'rb') as f:
+      reader = dr.IndexedReader(f, Doc)
+      self.assertEqual(len(reader), 0)
+      self.assertEqual(list(reader), [])
@@ -0,0 +1,219 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+from __future__ import absolute_import, print_function, unicode_literals
+import datetime
+import unittest
+
+from schwa import dr
+from schwa.dr.encoder import InstanceEncoder
+import six
+
+
+class X(dr.Ann):
+  name = dr.Field()
+  when = dr.DateTime()
+  span = dr.Slice()
+  next = dr.SelfPointer()
+  prev = dr.SelfPointers()
+  from_ = dr.Field(serial='from')
+
+  class Meta:
+    name = 'test_instance_encoder.X'
+
+
+class Y(dr.Ann):
+  x = dr.Pointer(X, store='xs')
+  xs = dr.Pointers(X, store='xs')
+  label = dr.Text()
+
+  class Meta:
+    name = 'test_instance_encoder.Y'
+
+
+class Doc(dr.Doc):
+  docid = dr.Field()
+  xs = dr.Store(X)
+  ys = dr.Store(Y)
+  others = dr.Store(X)
+
+  class Meta:
+    name = 'test_instance_encoder.Doc'
+
+
+class Counted(dr.Field):
+  """A Field which counts its to_wire calls, and fails on the values given to it."""
+  def __init__(self, fail=(), **kwargs):
+    super(Counted, self).__init__(**kwargs)
+    self.calls = 0
+    self.fail = fail
+
+  def to_wire(self, val, rtfield, cur_store, doc):
+    self.calls += 1
+    if val in self.fail:
+      raise ValueError('cannot write {0!r}'.format(val))
+    return val
+
+
+class GenericWriter(dr.Writer):
+  """A Writer which encodes every instance a field at a time."""
+  __slots__ = ()
+
+  def _encode(self, objs, store, doc, rtschema):
+    return [self._build_instance(obj, store, doc, rtschema) for obj in objs]
+
+
+def create_doc(n=10):
+  doc = Doc(docid='d')
+  for i in range(n):
+    doc.xs.create(name='x{0}'.format(i), span=slice(i, i + 2), from_=i if i % 2 else None)
+  doc.xs[0].when = datetime.datetime(2016, 1, 2, 3, 4, 5)
+  for i in range(1, n):
+    doc.xs[i].next = doc.xs[i - 1]
+    doc.xs[i].prev = list(doc.xs[:i])
+  for i in range(n):
+    doc.ys.create(x=doc.xs[i], xs=list(doc.xs[i::2]), label='y{0}'.format(i) if i % 3 else None)
+  doc.ys.create()
+  return doc
+
+
+def write(writer_klass, *docs):
+  out = six.BytesIO()
+  writer = writer_klass(out, Doc)
+  for doc in docs:
+    writer.write(doc)
+  return out.getvalue()
+
+
+class TestInstanceEncoder(unittest.TestCase):
+  def test_same_bytes(self):
+    docs = [create_doc(), create_doc(3), Doc(docid='empty')]
+    self.assertEqual(write(GenericWriter, *docs), write(dr.Writer, *docs))
+
+  def test_roundtrip(self):
+    data = write(dr.Writer, create_doc())
+    doc = next(iter(dr.Reader(six.BytesIO(data), Doc)))
+    self.assertEqual(datetime.datetime(2016, 1, 2, 3, 4, 5), doc.xs[0].when)
+    self.assertEqual(slice(4, 6), doc.xs[4].span)
+    self.assertEqual(3, doc.xs[3].from_)
+    self.assertIsNone(doc.xs[2].from_)
+    self.assertIs(doc.xs[2], doc.xs[3].next)
+    self.assertEqual(list(doc.xs[:3]), doc.xs[3].prev)
+    self.assertIs(doc.xs[5], doc.ys[5].x)
+    self.assertEqual([doc.xs[5], doc.xs[7], doc.xs[9]], doc.ys[5].xs)
+    self.assertEqual('y5', doc.ys[5].label)
+    self.assertIsNone(doc.ys[6].label)
+    self.assertIsNone(doc.ys[10].x)
+
+  def test_lazy_fields(self):
+    class XName(dr.Ann):
+      name = dr.Field()
+
+      class Meta:
+        name = 'test_instance_encoder.XName'
+        serial = 'X'
+
+    class DocName(dr.Doc):
+      docid = dr.Field()
+      xs = dr.Store(XName)
+
+      class Meta:
+        name = 'test_instance_encoder.DocName'
+        serial = 'Doc'
+
+    data = write(dr.Writer, create_doc())
+    doc = next(iter(dr.Reader(six.BytesIO(data), DocName)))
+    doc.xs[1].name = 'renamed'
+    out = six.BytesIO()
+    dr.Writer(out, DocName).write(doc)
+    doc = next(iter(dr.Reader(six.BytesIO(out.getvalue()), Doc)))
+    self.assertEqual('renamed', doc.xs[1].name)
+    self.assertEqual(slice(1, 3), doc.xs[1].span)
+    self.assertEqual(list(doc.xs[:1]), doc.xs[1].prev)
+
+  def test_pointer_outside_store(self):
+    doc = create_doc(3)
+    doc.ys[0].x = doc.others.create(name='other')
+    with self.assertRaises(dr.WriterException) as cm:
+      write(dr.Writer, doc)
+    self.assertIn('"x"', str(cm.exception))
+
+  def test_pointers_outside_store(self):
+    doc = create_doc(3)
+    doc.ys[1].xs = [doc.xs[0], X(name='unstored')]
+    with self.assertRaises(dr.WriterException) as cm:
+      write(dr.Writer, doc)
+    self.assertIn('"xs"', str(cm.exception))
+
+  def test_self_pointer_outside_store(self):
+    doc = create_doc(3)
+    doc.xs[1].next = doc.others.create(name='other')
+    with self.assertRaises(dr.WriterException) as cm:
+      write(dr.Writer, doc)
+    self.assertIn('"next"', str(cm.exception))
+
+  def test_invalid_slice(self):
+    for span in ((0, 3), slice(1, None)):
+      doc = create_doc(3)
+      doc.xs[1].span = span
+      with self.assertRaises(dr.WriterException) as cm:
+        write(dr.Writer, doc)
+      self.assertIn('"span"', str(cm.exception))
+
+  def test_to_wire_called_once(self):
+    field = Counted(fail=('bad', ))
+
+    class Z(dr.Ann):
+      value = field
+
+      class Meta:
+        name = 'test_instance_encoder.Z'
+
+    class DocZ(dr.Doc):
+      zs = dr.Store(Z)
+
+      class Meta:
+        name = 'test_instance_encoder.DocZ'
+
+    doc = DocZ()
+    doc.zs.create(value='good')
+    doc.zs.create(value='bad')
+    with self.assertRaises(dr.WriterException) as cm:
+      dr.Writer(six.BytesIO(), DocZ).write(doc)
+    self.assertIn('"value"', str(cm.exception))
+    self.assertEqual(2, field.calls)
+
+  def test_errors_propagate(self):
+    # Errors other than those of a pointer lookup are not hidden by encoding the object again.
+    class Checked(Counted):
+      def should_write(self, val):
+        self.calls += 1
+        raise KeyError(val)
+
+    field = Checked()
+
+    class W(dr.Ann):
+      value = field
+
+      class Meta:
+        name = 'test_instance_encoder.W'
+
+    class DocW(dr.Doc):
+      ws = dr.Store(W)
+
+      class Meta:
+        name = 'test_instance_encoder.DocW'
+
+    doc = DocW()
+    doc.ws.create(value='any')
+    with self.assertRaises(KeyError):
+      dr.Writer(six.BytesIO(), DocW).write(doc)
+    self.assertEqual(1, field.calls)
+
+  def test_source(self):
+    # Only the fields which are not of the core types are encoded through to_wire.
+    writer = dr.Writer(six.BytesIO(), Doc)
+    writer.write(create_doc(2))
+    sources = sorted(encoder.source for encoder in writer._encoders.values())
+    self.assertTrue(all(isinstance(encoder, InstanceEncoder) for encoder in writer._encoders.values()))
+    self.assertEqual(2, sum(source.count('.to_wire(') for source in sources))
+    self.assertTrue(any('v = obj.from_' in source for source in sources))
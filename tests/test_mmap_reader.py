@@ -0,0 +1,127 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+from __future__ import absolute_import, print_function, unicode_literals
+import os
+import shutil
+import tempfile
+import unittest
+
+from schwa import dr
+from schwa.dr.framing import RawValue, iter_frame_offsets
+import six
+
+from testutils import write_docs
+
+
+class Token(dr.Ann):
+  norm = dr.Field()
+  tags = dr.Field()
+  head = dr.SelfPointer()
+
+  class Meta:
+    name = 'test_mmap_reader.Token'
+    serial = 'Token'
+
+
+class Doc(dr.Doc):
+  docid = dr.Field()
+  tokens = dr.Store(Token)
+  others = dr.Store(Token)
+
+  class Meta:
+    name = 'test_mmap_reader.Doc'
+    serial = 'Doc'
+
+
+class SmallToken(dr.Ann):
+  norm = dr.Field()
+
+  class Meta:
+    name = 'test_mmap_reader.SmallToken'
+    serial = 'Token'
+
+
+class SmallDoc(dr.Doc):
+  tokens = dr.Store(SmallToken)
+
+  class Meta:
+    name = 'test_mmap_reader.SmallDoc'
+    serial = 'Doc'
+
+
+def serialise():
+  docs = []
+  for i in range(3):
+    doc = Doc(docid='d{0}'.format(i))
+    for j in range(i + 2):
+      token = doc.tokens.create(norm='t{0}'.format(j), tags=['a', b'b', {'c': j}])
+      token.head = doc.tokens[0]
+      doc.others.create(norm='o{0}'.format(j))
+    docs.append(doc)
+  return write_docs(docs, Doc)
+
+
+class MmapReaderTest(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.path = os.path.join(self.tmpdir, 'docs.dr')
+    self.data = serialise()
+    with open(self.path, 'wb') as f:
+      f.write(self.data)
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def test_same_as_stream(self):
+    expected = list(dr.Reader(six.BytesIO(self.data), Doc))
+    with open(self.path, 'rb') as f:
+      docs = list(dr.Reader(f, Doc, use_mmap=True))
+    self.assertEqual(len(docs), len(expected))
+    for doc, exp in zip(docs, expected):
+      self.assertEqual(doc.docid, exp.docid)
+      self.assertEqual([(t.norm, t.tags, t.head._dr_index) for t in doc.tokens], [(t.norm, t.tags, t.head._dr_index) for t in exp.tokens])
+      self.assertEqual([t.norm for t in doc.others], [t.norm for t in exp.others])
+
+  def test_lazy_views(self):
+    with open(self.path, 'rb') as f:
+      docs = list(dr.Reader(f, SmallDoc, use_mmap=True))
+    doc = docs[1]
+    lazy_store = [lazy for lazy in doc._dr_rt.lazy if lazy is not None]
+    self.assertEqual(len(lazy_store), 1)
+    self.assertIsInstance(lazy_store[0], memoryview)
+
+    lazy_fields = doc.tokens[0]._dr_lazy
+    self.assertEqual(len(lazy_fields), 2)
+    for value in lazy_fields.values():
+      self.assertIsInstance(value, RawValue)
+      self.assertIsInstance(value.data, memoryview)
+    self.assertIn(['a', b'b', {'c': 0}], [value.unpack(encoding='utf-8') for value in lazy_fields.values()])
+
+    out = six.BytesIO()
+    writer = dr.Writer(out, SmallDoc)
+    for doc in docs:
+      writer.write(doc)
+    out.seek(0)
+    docs = list(dr.Reader(out, Doc))
+    expected = list(dr.Reader(six.BytesIO(self.data), Doc))
+    for doc, exp in zip(docs, expected):
+      self.assertEqual([(t.norm, t.tags, t.head._dr_index) for t in doc.tokens], [(t.norm, t.tags, t.head._dr_index) for t in exp.tokens])
+      self.assertEqual([t.norm for t in doc.others], [t.norm for t in exp.others])
+
+  def test_position(self):
+    start = list(iter_frame_offsets(self.data))[1][0]
+    with open(self.path, 'rb') as f:
+      f.seek(start)
+      docs = list(dr.Reader(f, Doc, use_mmap=True))
+    self.assertEqual([doc.docid for doc in docs], ['d1', 'd2'])
+
+  def test_empty(self):
+    path = os.path.join(self.tmpdir, 'empty.dr')
+    open(path, 'wb').close()
+    with open(path, 'rb') as f:
+      self.assertEqual(list(dr.Reader(f, Doc, use_mmap=True)), [])
+
+  def test_not_a_file(self):
+    with self.assertRaises(ValueError):
+      dr.Reader(six.BytesIO(self.data), Doc, use_mmap=True)
+
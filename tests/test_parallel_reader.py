@@ -0,0 +1,98 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+from __future__ import absolute_import, print_function, unicode_literals
+import os
+import shutil
+import tempfile
+import unittest
+
+from schwa import dr
+import six
+
+from testutils import create_docs, write_docs
+
+
+class X(dr.Ann):
+  name = dr.Field()
+
+  class Meta:
+    name = 'test_parallel_reader.X'
+
+
+class Y(dr.Ann):
+  x = dr.Pointer(X)
+  span = dr.Slice(X)
+
+  class Meta:
+    name = 'test_parallel_reader.Y'
+
+
+class Doc(dr.Doc):
+  docid = dr.Field()
+  xs = dr.Store(X)
+  ys = dr.Store(Y)
+
+  class Meta:
+    name = 'test_parallel_reader.Doc'
+
+
+def serialise(ndocs):
+  docs = create_docs(Doc, range(ndocs), lambda docid: docid % 5)
+  for doc in docs:
+    for j, x in enumerate(doc.xs):
+      doc.ys.create(x=x, span=slice(0, j + 1))
+  return write_docs(docs, Doc)
+
+
+def count_xs(doc):
+  return doc.docid, len(doc.xs)
+
+
+class ParallelReaderTest(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.path = os.path.join(self.tmpdir, 'docs.dr')
+    self.data = serialise(50)
+    with open(self.path, 'wb') as f:
+      f.write(self.data)
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def _check(self, docs):
+    self.assertEqual([doc.docid for doc in docs], list(range(50)))
+    for doc in docs:
+      self.assertEqual(len(doc.xs), doc.docid % 5)
+      for j, y in enumerate(doc.ys):
+        self.assertIs(y.x, doc.xs[j])
+        self.assertEqual(y.span, slice(0, j + 1))
+
+  def test_path(self):
+    with dr.ParallelReader(self.path, Doc, processes=2, window=2, batch_bytes=100) as reader:
+      self._check(list(reader))
+
+  def test_file(self):
+    with open(self.path, 'rb') as f:
+      self._check(list(dr.ParallelReader(f, Doc, processes=2, batch_bytes=100)))
+
+  def test_stream(self):
+    reader = dr.ParallelReader(six.BytesIO(self.data), Doc, processes=2, window=1, batch_bytes=100)
+    self._check(list(reader))
+
+  def test_fn(self):
+    reader = dr.ParallelReader(self.path, Doc, processes=2, batch_bytes=100, fn=count_xs)
+    self.assertEqual(list(reader), [(i, i % 5) for i in range(50)])
+
+  def test_round_trip(self):
+    docs = list(dr.ParallelReader(self.path, Doc, processes=2))
+    out = six.BytesIO()
+    writer = dr.Writer(out, Doc)
+    for doc in docs:
+      writer.write(doc)
+    out.seek(0)
+    self._check(list(dr.Reader(out, Doc)))
+
+  def test_empty(self):
+    path = os.path.join(self.tmpdir, 'empty.dr')
+    open(path, 'wb').close()
+    self.assertEqual(list(dr.ParallelReader(path, Doc, processes=1)), [])
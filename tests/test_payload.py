@@ -0,0 +1,122 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+from __future__ import absolute_import, print_function, unicode_literals
+import unittest
+
+from schwa import dr
+from schwa.dr import payload
+from schwa.dr.exceptions import ReaderException
+from schwa.dr.framing import iter_frame_offsets
+import six
+
+from testutils import create_docs, write_docs
+
+
+class X(dr.Ann):
+  name = dr.Field()
+
+  class Meta:
+    name = 'test_payload.X'
+
+
+class Doc(dr.Doc):
+  docid = dr.Field()
+  xs = dr.Store(X)
+
+  class Meta:
+    name = 'test_payload.Doc'
+
+
+class SmallDoc(dr.Doc):
+  docid = dr.Field()
+
+  class Meta:
+    name = 'test_payload.SmallDoc'
+    serial = 'test_payload.Doc'
+
+
+def serialise(docids):
+  return write_docs(create_docs(Doc, docids, lambda docid: docid % 3), Doc)
+
+
+class PayloadTest(unittest.TestCase):
+  def assertDoc(self, doc, docid):
+    self.assertEqual(doc.docid, docid)
+    self.assertEqual([x.name for x in doc.xs], ['x{0}'.format(j) for j in range(docid % 3)])
+
+  def test_loads(self):
+    for i in range(3):
+      self.assertDoc(dr.loads(serialise([i]), Doc), i)
+    self.assertDoc(dr.loads(bytearray(serialise([2])), Doc), 2)
+    doc = dr.loads(serialise([5]), automagic=True)
+    self.assertEqual(doc.docid, 5)
+    self.assertEqual([x.name for x in doc.xs], ['x0', 'x1'])
+
+  def test_loads_one(self):
+    self.assertRaises(ReaderException, dr.loads, b'', Doc)
+    self.assertRaises(ReaderException, dr.loads, serialise([1, 2]), Doc)
+
+  def test_memoryview(self):
+    data = serialise(range(6))
+    view = memoryview(data)
+    payloads = [view[start:end] for start, end in iter_frame_offsets(data)]
+    docs = list(dr.decode_many(payloads, Doc))
+    self.assertEqual(len(docs), 6)
+    for i, doc in enumerate(docs):
+      self.assertDoc(doc, i)
+
+  def test_decode_many(self):
+    payloads = [serialise([0, 1]), serialise([]), serialise([2])]
+    docs = list(dr.decode_many(payloads, Doc, where=lambda doc: doc.docid != 1))
+    self.assertEqual([doc.docid for doc in docs], [0, 2])
+
+  def test_reuse(self):
+    decoder = dr.PayloadDecoder(Doc)
+    docs = decoder.decode(serialise([1, 2]))
+    self.assertEqual(len(docs), 2)
+    decoders = dict(docs[0]._dr_rt.decoders)
+    doc = decoder.loads(serialise([4]))
+    self.assertDoc(doc, 4)
+    self.assertIs(doc._dr_rt.decoders, docs[0]._dr_rt.decoders)
+    self.assertEqual(doc._dr_rt.decoders, decoders)
+    self.assertEqual(decoder.decode(b''), [])
+
+  def test_truncated(self):
+    data = serialise([1, 2])
+    decoder = dr.PayloadDecoder(Doc)
+    self.assertRaises(ReaderException, decoder.decode, data[:-2])
+    self.assertEqual(len(decoder.decode(data)), 2)
+
+  def test_lazy_roundtrip(self):
+    data = serialise(range(4))
+    decoder = dr.PayloadDecoder(SmallDoc)
+    docs = decoder.decode(data)
+    out = six.BytesIO()
+    writer = dr.Writer(out, SmallDoc)
+    for doc in docs:
+      writer.write(doc)
+    docs = list(dr.Reader(six.BytesIO(out.getvalue()), Doc))
+    for i, doc in enumerate(docs):
+      self.assertDoc(doc, i)
+
+  def test_copy(self):
+    data = bytearray(serialise(range(4)))
+    docs = dr.PayloadDecoder(SmallDoc).decode(data)
+    self.assertIsInstance(docs[1]._dr_rt.lazy[0], memoryview)
+    docs = dr.PayloadDecoder(SmallDoc, copy=True).decode(data)
+    self.assertIsInstance(docs[1]._dr_rt.lazy[0], bytes)
+    # The copied documents no longer alias the payload.
+    data[:] = b'\0' * len(data)
+    out = six.BytesIO()
+    writer = dr.Writer(out, SmallDoc)
+    for doc in docs:
+      writer.write(doc)
+    for i, doc in enumerate(dr.Reader(six.BytesIO(out.getvalue()), Doc)):
+      self.assertDoc(doc, i)
+
+  def test_loads_bounded(self):
+    data = serialise([1])
+    for i in range(payload.MAX_LOADS_DECODERS + 3):
+      self.assertDoc(dr.loads(data, Doc.schema()), 1)
+    self.assertEqual(len(payload._local.decoders), payload.MAX_LOADS_DECODERS)
+
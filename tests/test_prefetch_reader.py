@@ -0,0 +1,101 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+from __future__ import absolute_import, print_function, unicode_literals
+import gc
+import time
+import unittest
+
+from schwa import dr
+from schwa.dr.exceptions import ReaderException
+from schwa.dr.prefetch import Prefetcher
+import six
+
+from testutils import create_docs, write_docs
+
+
+class X(dr.Ann):
+  name = dr.Field()
+
+  class Meta:
+    name = 'test_prefetch_reader.X'
+
+
+class Doc(dr.Doc):
+  docid = dr.Field()
+  xs = dr.Store(X)
+
+  class Meta:
+    name = 'test_prefetch_reader.Doc'
+
+
+def serialise(ndocs):
+  return write_docs(create_docs(Doc, range(ndocs), lambda docid: docid % 4), Doc)
+
+
+class SlowStream(object):
+  """Returns a few bytes at a time, sleeping before each read."""
+  def __init__(self, data, nbytes=7, delay=0.001):
+    self._stream = six.BytesIO(data)
+    self._nbytes = nbytes
+    self._delay = delay
+
+  def read(self, n=-1):
+    time.sleep(self._delay)
+    return self._stream.read(self._nbytes)
+
+
+class PrefetchReaderTest(unittest.TestCase):
+  def assertDocs(self, docs, ndocs):
+    self.assertEqual([doc.docid for doc in docs], list(range(ndocs)))
+    for doc in docs:
+      self.assertEqual([x.name for x in doc.xs], ['x{0}'.format(j) for j in range(doc.docid % 4)])
+
+  def test_read(self):
+    for depth in (1, 4, 100):
+      reader = dr.Reader(six.BytesIO(serialise(20)), Doc, prefetch=depth)
+      self.assertDocs(list(reader), 20)
+      self.assertIsNone(reader.read())
+      self.assertGreaterEqual(reader.prefetcher.stall_time, 0.0)
+
+  def test_empty(self):
+    reader = dr.Reader(six.BytesIO(b''), Doc, prefetch=2)
+    self.assertEqual(list(reader), [])
+
+  def test_slow_stream(self):
+    reader = dr.Reader(SlowStream(serialise(10)), Doc, prefetch=3)
+    self.assertDocs(list(reader), 10)
+    self.assertGreater(reader.prefetcher.stalls, 0)
+    self.assertGreater(reader.prefetcher.stall_time, 0.0)
+
+  def test_skip_and_where(self):
+    reader = dr.Reader(six.BytesIO(serialise(10)), Doc, prefetch=2, where=lambda doc: doc.docid % 2 == 0)
+    self.assertEqual(reader.skip(3), 3)
+    self.assertEqual(reader.next().docid, 4)
+    self.assertEqual(reader.count(), 5)
+
+  def test_truncated(self):
+    data = serialise(3)
+    reader = dr.Reader(six.BytesIO(data[:-3]), Doc, prefetch=2)
+    self.assertEqual(reader.next().docid, 0)
+    self.assertEqual(reader.next().docid, 1)
+    self.assertRaises(ReaderException, reader.next)
+
+  def test_no_mmap(self):
+    self.assertRaises(ValueError, dr.Reader, six.BytesIO(b''), Doc, use_mmap=True, prefetch=2)
+    self.assertIsNone(dr.Reader(six.BytesIO(b''), Doc).prefetcher)
+
+  def test_abandoned(self):
+    prefetcher = Prefetcher(six.BytesIO(serialise(50)), depth=1)
+    thread = prefetcher._thread
+    self.assertIsNotNone(prefetcher.next_frame())
+    del prefetcher
+    gc.collect()
+    thread.join(5)
+    self.assertFalse(thread.is_alive())
+
+  def test_close(self):
+    prefetcher = Prefetcher(six.BytesIO(serialise(50)), depth=1)
+    prefetcher.close()
+    prefetcher._thread.join(5)
+    self.assertFalse(prefetcher._thread.is_alive())
+    self.assertIsNone(prefetcher.next_frame())
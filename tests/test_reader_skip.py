@@ -0,0 +1,85 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+from __future__ import absolute_import, print_function, unicode_literals
+import os
+import shutil
+import tempfile
+import unittest
+
+from schwa import dr
+from schwa.dr.count import count_docs, main
+from schwa.dr.exceptions import ReaderException
+import six
+
+from testutils import create_docs, write_docs
+
+
+class X(dr.Ann):
+  name = dr.Field()
+
+  class Meta:
+    name = 'test_reader_skip.X'
+
+
+class Doc(dr.Doc):
+  docid = dr.Field()
+  xs = dr.Store(X)
+
+  class Meta:
+    name = 'test_reader_skip.Doc'
+
+
+def serialise(ndocs):
+  return write_docs(create_docs(Doc, range(ndocs), lambda docid: docid % 3, lambda j: 'x' * (j * 50)), Doc)
+
+
+class ReaderSkipTest(unittest.TestCase):
+  def test_skip(self):
+    reader = dr.Reader(six.BytesIO(serialise(10)), Doc)
+    self.assertEqual(reader.skip(), 1)
+    self.assertEqual(reader.next().docid, 1)
+    self.assertEqual(reader.skip(5), 5)
+    self.assertEqual(reader.next().docid, 7)
+    self.assertEqual(reader.skip(5), 2)
+    self.assertEqual(reader.skip(), 0)
+    self.assertIsNone(reader.read())
+
+  def test_count(self):
+    reader = dr.Reader(six.BytesIO(serialise(10)), Doc)
+    reader.next()
+    self.assertEqual(reader.count(), 9)
+    self.assertEqual(reader.count(), 0)
+    self.assertEqual(count_docs(six.BytesIO(b'')), 0)
+
+  def test_truncated(self):
+    data = serialise(3)
+    with self.assertRaises(ReaderException):
+      count_docs(six.BytesIO(data[:-1]))
+
+  def test_indexed_reader(self):
+    reader = dr.IndexedReader(six.BytesIO(serialise(10)), Doc)
+    self.assertEqual(reader.skip(3), 3)
+    self.assertEqual(reader.tell(), 3)
+    self.assertEqual(reader.next().docid, 3)
+    self.assertEqual(reader.count(), 6)
+    self.assertEqual(reader.skip(), 0)
+
+
+class CountMainTest(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def test_main(self):
+    paths = []
+    for ndocs in (4, 0):
+      path = os.path.join(self.tmpdir, '{0}.dr'.format(ndocs))
+      with open(path, 'wb') as f:
+        f.write(serialise(ndocs))
+      paths.append(path)
+    for path in paths:
+      with open(path, 'rb') as f:
+        self.assertEqual(count_docs(f, use_mmap=True), int(os.path.basename(path)[0]))
+    main(paths)
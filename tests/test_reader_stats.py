@@ -0,0 +1,112 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+from __future__ import absolute_import, print_function, unicode_literals
+import json
+import unittest
+
+from schwa import dr
+import six
+
+from testutils import write_docs
+
+
+class Token(dr.Ann):
+  norm = dr.Field()
+
+  class Meta:
+    name = 'test_reader_stats.Token'
+
+
+class Sent(dr.Ann):
+  span = dr.Slice(Token)
+
+  class Meta:
+    name = 'test_reader_stats.Sent'
+
+
+class Doc(dr.Doc):
+  docid = dr.Field()
+  tokens = dr.Store(Token)
+  sents = dr.Store(Sent)
+
+  class Meta:
+    name = 'test_reader_stats.Doc'
+
+
+def serialise(ndocs):
+  docs = []
+  for i in range(ndocs):
+    doc = Doc(docid=i)
+    for j in range(i + 1):
+      doc.tokens.create(norm='t{0}'.format(j))
+    doc.sents.create(span=slice(0, i + 1))
+    docs.append(doc)
+  return write_docs(docs, Doc)
+
+
+class ReaderStatsTest(unittest.TestCase):
+  def test_disabled(self):
+    reader = dr.Reader(six.BytesIO(serialise(2)), Doc)
+    self.assertIsNone(reader.stats)
+    self.assertEqual(len(list(reader)), 2)
+
+  def test_counters(self):
+    reader = dr.Reader(six.BytesIO(serialise(4)), Doc, stats=True)
+    stats = reader.stats
+    self.assertIsInstance(stats, dr.ReaderStats)
+    reader.next()
+    self.assertEqual(stats.docs, 1)
+    self.assertEqual(stats.objects['test_reader_stats.Token'], 1)
+    self.assertEqual(reader.skip(), 1)
+    self.assertEqual(stats.skipped, 1)
+    self.assertEqual(len(list(reader)), 2)
+    self.assertEqual(stats.docs, 3)
+    self.assertEqual(stats.objects, {'test_reader_stats.Doc': 3, 'test_reader_stats.Token': 1 + 3 + 4, 'test_reader_stats.Sent': 3})
+    self.assertEqual(set(stats.store_bytes), {'tokens', 'sents'})
+    self.assertGreater(stats.store_bytes['tokens'], stats.store_bytes['sents'])
+    self.assertGreater(stats.doc_bytes, 0)
+    self.assertEqual(stats.lazy_bytes, 0)
+    self.assertGreater(stats.times['headers'], 0.0)
+    self.assertGreater(stats.times['decode'], 0.0)
+    self.assertAlmostEqual(stats.total_time, sum(stats.times.values()))
+    json.dumps(stats.as_dict())
+    self.assertIn('3 docs read', stats.format())
+
+  def test_lazy_and_where(self):
+    stats = dr.ReaderStats()
+    reader = dr.Reader(six.BytesIO(serialise(4)), Doc, stores=['sents'], where=lambda doc: doc.docid % 2 == 0, stats=stats)
+    self.assertIs(reader.stats, stats)
+    self.assertEqual(len(list(reader)), 2)
+    self.assertEqual(stats.docs, 2)
+    self.assertEqual(stats.rejected, 2)
+    self.assertNotIn('test_reader_stats.Token', stats.objects)
+    self.assertEqual(stats.lazy_bytes, stats.store_bytes['tokens'])
+    self.assertGreater(stats.lazy_bytes, 0)
+
+    # Counters can be shared across readers.
+    dr.Reader(six.BytesIO(serialise(1)), Doc, stats=stats).next()
+    self.assertEqual(stats.docs, 3)
+
+  def test_stream(self):
+    reader = dr.Reader(six.BytesIO(serialise(3)), Doc, stores=['tokens'], stats=True)
+    stats = reader.stats
+    stream = reader.stream()
+    self.assertEqual(stats.docs, 1)
+    self.assertEqual(stats.objects['test_reader_stats.Doc'], 1)
+    self.assertEqual([(name, len(list(objs))) for name, objs in stream], [('tokens', 1)])
+    self.assertEqual(stats.objects['test_reader_stats.Token'], 1)
+    self.assertEqual(set(stats.store_bytes), {'tokens', 'sents'})
+
+    # Stores left unread are counted as skipped.
+    stream = reader.stream()
+    next(stream)
+    skip = stats.times['skip']
+    stream.close()
+    self.assertGreater(stats.times['skip'], skip)
+    self.assertEqual(reader.stream().doc.docid, 2)
+    self.assertEqual(stats.docs, 3)
+    self.assertEqual(stats.objects['test_reader_stats.Token'], 1)
+    self.assertEqual(stats.lazy_bytes, 0)
+    self.assertGreater(stats.times['headers'], 0.0)
+    self.assertGreater(stats.times['unpack'], 0.0)
+    self.assertGreater(stats.times['decode'], 0.0)
@@ -0,0 +1,77 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+from __future__ import absolute_import, print_function, unicode_literals
+import unittest
+
+from schwa import dr
+import six
+
+
+class X(dr.Ann):
+  name = dr.Field()
+
+  class Meta:
+    name = 'test_reader_where.X'
+
+
+class Doc(dr.Doc):
+  docid = dr.Field()
+  lang = dr.Field()
+  xs = dr.Store(X)
+
+  class Meta:
+    name = 'test_reader_where.Doc'
+
+
+class PointerDoc(dr.Doc):
+  docid = dr.Field()
+  first = dr.Pointer(X)
+  xs = dr.Store(X)
+
+  class Meta:
+    name = 'test_reader_where.PointerDoc'
+
+
+def create_stream(klass):
+  stream = six.BytesIO()
+  writer = dr.Writer(stream, klass)
+  for i in range(10):
+    doc = klass(docid=i)
+    for j in range(i):
+      doc.xs.create(name='x{0}'.format(j))
+    if klass is Doc:
+      doc.lang = 'en' if i % 3 else 'de'
+    else:
+      doc.first = doc.xs[0] if doc.xs else None
+    writer.write(doc)
+  stream.seek(0)
+  return stream
+
+
+class ReaderWhereTest(unittest.TestCase):
+  def test_where(self):
+    calls = []
+
+    def where(doc):
+      calls.append(doc.docid)
+      self.assertEqual(len(doc.xs), 0)  # Stores are not read until the predicate passes.
+      return doc.lang == 'en'
+
+    docs = list(dr.Reader(create_stream(Doc), Doc, where=where))
+    self.assertEqual(calls, list(range(10)))
+    self.assertEqual([doc.docid for doc in docs], [1, 2, 4, 5, 7, 8])
+    for doc in docs:
+      self.assertEqual([x.name for x in doc.xs], ['x{0}'.format(j) for j in range(doc.docid)])
+
+  def test_where_none(self):
+    reader = dr.Reader(create_stream(Doc), Doc, where=lambda doc: False)
+    self.assertIsNone(reader.read())
+    self.assertEqual(list(reader), [])
+
+  def test_doc_pointers(self):
+    keep = set([0, 3, 9])
+    docs = list(dr.Reader(create_stream(PointerDoc), PointerDoc, where=lambda doc: doc.docid in keep))
+    self.assertEqual([doc.docid for doc in docs], [0, 3, 9])
+    self.assertIsNone(docs[0].first)
+    self.assertIs(docs[2].first, docs[2].xs[0])
+    self.assertEqual(len(docs[2].xs), 9)
@@ -96,3 +96,14 @@ class TestDoc(unittest.TestCase):
     self.assertEqual(len(d.foos), 7)
     self.assertListEqual([b'*'] * 5, [f.label for f in d.foos[sl]])
     self.assertEqual(len(set(id(f) for f in d.foos[sl])), 5)
+
+  def test_allocate(self):
+    d = Doc()
+
+    d.foos.create(label=b'x')
+    sl = d.foos.allocate(3)
+    self.assertEqual(sl, slice(1, 4))
+    self.assertEqual(len(d.foos), 4)
+    self.assertEqual(len(set(id(f) for f in d.foos)), 4)
+    self.assertTrue(all(type(f) is Foo for f in d.foos[sl]))
+    self.assertEqual(d.foos.allocate(0), slice(4, 4))
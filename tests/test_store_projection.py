@@ -0,0 +1,112 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+from __future__ import absolute_import, print_function, unicode_literals
+import os
+import shutil
+import tempfile
+import unittest
+
+from schwa import dr
+import six
+
+
+class Token(dr.Ann):
+  norm = dr.Field()
+  entity = dr.Pointer('test_store_projection.Entity')
+
+  class Meta:
+    name = 'test_store_projection.Token'
+
+
+class Entity(dr.Ann):
+  label = dr.Field()
+  span = dr.Slice(Token)
+  head = dr.Pointer(Token)
+
+  class Meta:
+    name = 'test_store_projection.Entity'
+
+
+class Doc(dr.Doc):
+  entity = dr.Pointer(Entity)
+  tokens = dr.Store(Token)
+  entities = dr.Store(Entity)
+
+  class Meta:
+    name = 'test_store_projection.Doc'
+
+
+def create_stream():
+  stream = six.BytesIO()
+  writer = dr.Writer(stream, Doc)
+  for i in range(3):
+    doc = Doc()
+    for j in range(4):
+      doc.tokens.create(norm='t{0}'.format(j))
+    for j in range(i):
+      entity = doc.entities.create(label='e{0}'.format(j), span=slice(j, j + 2), head=doc.tokens[j])
+      doc.tokens[j].entity = entity
+      doc.entity = entity
+    writer.write(doc)
+  stream.seek(0)
+  return stream
+
+
+class StoreProjectionTest(unittest.TestCase):
+  def _check_full(self, docs):
+    self.assertEqual([len(doc.entities) for doc in docs], [0, 1, 2])
+    doc = docs[2]
+    self.assertIs(doc.entity, doc.entities[1])
+    self.assertIs(doc.tokens[1].entity, doc.entities[1])
+    self.assertIs(doc.entities[1].head, doc.tokens[1])
+    self.assertEqual(doc.entities[1].span, slice(1, 3))
+
+  def test_projection(self):
+    docs = list(dr.Reader(create_stream(), Doc, stores=['tokens']))
+    for doc in docs:
+      self.assertEqual([t.norm for t in doc.tokens], ['t0', 't1', 't2', 't3'])
+      self.assertEqual(len(doc.entities), 0)
+      self.assertIsNone(doc.entity)
+      self.assertTrue(all(t.entity is None for t in doc.tokens))
+
+  def test_round_trip(self):
+    docs = list(dr.Reader(create_stream(), Doc, stores=['tokens']))
+    docs[2].tokens[3].norm = 'changed'
+    out = six.BytesIO()
+    writer = dr.Writer(out, Doc)
+    for doc in docs:
+      writer.write(doc)
+    out.seek(0)
+    docs = list(dr.Reader(out, Doc))
+    self._check_full(docs)
+    self.assertEqual(docs[2].tokens[3].norm, 'changed')
+
+  def test_round_trip_mmap(self):
+    tmpdir = tempfile.mkdtemp()
+    try:
+      path = os.path.join(tmpdir, 'docs.dr')
+      with open(path, 'wb') as f:
+        f.write(create_stream().getvalue())
+      with open(path, 'rb') as f:
+        docs = list(dr.Reader(f, Doc, use_mmap=True, stores=['entities']))
+        self.assertEqual(len(docs[2].tokens), 0)
+        self.assertEqual(docs[2].entities[1].span, slice(1, 3))
+        self.assertIsNone(docs[2].entities[1].head)
+        out = six.BytesIO()
+        writer = dr.Writer(out, Doc)
+        for doc in docs:
+          writer.write(doc)
+      out.seek(0)
+      self._check_full(list(dr.Reader(out, Doc)))
+    finally:
+      shutil.rmtree(tmpdir)
+
+  def test_modified_projected_store(self):
+    doc = dr.Reader(create_stream(), Doc, stores=['tokens']).next()
+    doc.entities.create(label='new')
+    with self.assertRaises(dr.WriterException):
+      dr.Writer(six.BytesIO(), Doc).write(doc)
+
+  def test_unknown_store(self):
+    with self.assertRaises(ValueError):
+      dr.Reader(create_stream(), Doc, stores=['tokens', 'nodes'])
@@ -0,0 +1,201 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+from __future__ import absolute_import, print_function, unicode_literals
+import os
+import shutil
+import tempfile
+import unittest
+
+from schwa import dr
+import six
+
+from testutils import write_docs
+
+
+class Token(dr.Ann):
+  raw = dr.Field()
+  span = dr.Slice()
+  head = dr.SelfPointer()
+
+  class Meta:
+    name = 'test_streaming.Token'
+
+
+class Sent(dr.Ann):
+  span = dr.Slice(Token)
+  first = dr.Pointer(Token)
+
+  class Meta:
+    name = 'test_streaming.Sent'
+
+
+class Doc(dr.Doc):
+  docid = dr.Field()
+  best = dr.Pointer(Token)
+  tokens = dr.Store(Token)
+  sents = dr.Store(Sent)
+
+  class Meta:
+    name = 'test_streaming.Doc'
+
+
+class SmallReader(dr.Reader):
+  __slots__ = ()
+  STREAM_NBYTES = 16
+
+
+class CountingReader(SmallReader):
+  __slots__ = ('streamed', )
+
+  def _stream_instances(self, nbytes, decoder):
+    self.streamed.append(decoder.klass)
+    return super(CountingReader, self)._stream_instances(nbytes, decoder)
+
+
+def create_doc(docid, ntokens):
+  doc = Doc(docid=docid)
+  for i in range(ntokens):
+    doc.tokens.create(raw='t{0}'.format(i), span=slice(i, i + 1))
+  for i in range(1, ntokens):
+    doc.tokens[i].head = doc.tokens[0]
+  for i in range(0, ntokens, 2):
+    doc.sents.create(span=slice(i, min(i + 2, ntokens)), first=doc.tokens[i])
+  if ntokens:
+    doc.best = doc.tokens[ntokens - 1]
+  return doc
+
+
+def serialise(docs):
+  return write_docs(docs, Doc)
+
+
+class StreamTest(unittest.TestCase):
+  def setUp(self):
+    self.data = serialise([create_doc(0, 5), create_doc(1, 3), create_doc(2, 4)])
+
+  def test_stream(self):
+    reader = dr.Reader(six.BytesIO(self.data), Doc)
+    stream = reader.stream()
+    doc = stream.doc
+    self.assertEqual(doc.docid, 0)
+    self.assertEqual(len(doc.tokens), 0)
+    self.assertIsNone(doc.best)
+    self.assertEqual(list(doc._dr_lazy.values()), [4])
+    # Stores are written in the order of their names.
+    name, sents = next(stream)
+    self.assertEqual(name, 'sents')
+    sents = list(sents)
+    self.assertEqual([s.span for s in sents], [slice(0, 2), slice(2, 4), slice(4, 5)])
+    self.assertEqual(list(sents[1]._dr_lazy.values()), [2])
+    name, tokens = next(stream)
+    self.assertEqual(name, 'tokens')
+    tokens = list(tokens)
+    self.assertEqual([t.raw for t in tokens], ['t{0}'.format(i) for i in range(5)])
+    self.assertEqual(tokens[2].span, slice(2, 3))
+    self.assertIsNone(tokens[2].head)
+    self.assertEqual(list(tokens[2]._dr_lazy.values()), [0])
+    self.assertRaises(StopIteration, next, stream)
+    self.assertEqual([s.doc.docid for s in iter(reader.stream, None)], [1, 2])
+
+  def test_partial(self):
+    reader = dr.Reader(six.BytesIO(self.data), Doc)
+    stream = reader.stream()
+    name, sents = next(stream)
+    self.assertEqual(next(sents).span, slice(0, 2))
+    name, tokens = next(stream)
+    self.assertEqual(len(list(tokens)), 5)
+    self.assertEqual(list(sents), [])
+    stream = reader.stream()
+    self.assertEqual(stream.doc.docid, 1)
+    next(stream)
+    doc = reader.read()
+    self.assertEqual(doc.docid, 2)
+    self.assertIs(doc.sents[1].first, doc.tokens[2])
+    self.assertIsNone(reader.stream())
+
+  def test_options(self):
+    reader = dr.Reader(six.BytesIO(self.data), Doc, stores=['sents'], where=lambda doc: doc.docid != 1)
+    streams = list(iter(reader.stream, None))
+    self.assertEqual([s.doc.docid for s in streams], [0, 2])
+    reader = SmallReader(six.BytesIO(self.data), Doc, fields={Token: ['span']})
+    for name, objects in reader.stream():
+      if name == 'tokens':
+        self.assertEqual([t.raw for t in objects], [None] * 5)
+
+  def test_chunks(self):
+    data = serialise([create_doc(0, 2500)])
+    reader = SmallReader(six.BytesIO(data), Doc)
+    stream = reader.stream()
+    self.assertEqual(len(list(next(stream)[1])), 1250)
+    name, tokens = next(stream)
+    self.assertEqual([t.raw for t in tokens], ['t{0}'.format(i) for i in range(2500)])
+
+  def test_skipped_unread(self):
+    # Stores are only unpacked once their objects are asked for, and the rest of a store is hopped
+    # over once the stream moves on.
+    data = serialise([create_doc(0, 2500), create_doc(1, 3)])
+    for use_mmap in (False, True):
+      tmpdir = tempfile.mkdtemp()
+      try:
+        path = os.path.join(tmpdir, 'docs.dr')
+        with open(path, 'wb') as f:
+          f.write(data)
+        with open(path, 'rb') as f:
+          reader = CountingReader(f, Doc, use_mmap=use_mmap)
+          reader.streamed = []
+          reader.stream().close()
+          self.assertEqual(reader.streamed, [])
+          stream = reader.stream()
+          self.assertEqual(stream.doc.docid, 1)
+          name, sents = next(stream)
+          name, tokens = next(stream)
+          self.assertEqual(next(tokens).raw, 't0')
+          self.assertEqual(list(sents), [])
+          self.assertEqual(reader.streamed, [Token])
+          self.assertIsNone(reader.stream())
+
+          f.seek(0)
+          reader = CountingReader(f, Doc, use_mmap=use_mmap)
+          reader.streamed = []
+          stream = reader.stream()
+          name, sents = next(stream)
+          name, tokens = next(stream)
+          self.assertEqual([next(tokens).raw for i in range(1500)], ['t{0}'.format(i) for i in range(1500)])
+          self.assertEqual(reader.next().docid, 1)
+          self.assertEqual(list(tokens), [])
+      finally:
+        shutil.rmtree(tmpdir)
+
+
+class LargeStoreTest(unittest.TestCase):
+  def assertDocs(self, docs, expected):
+    self.assertEqual(len(docs), len(expected))
+    for doc, other in zip(docs, expected):
+      self.assertEqual(doc.docid, other.docid)
+      self.assertEqual([t.raw for t in doc.tokens], [t.raw for t in other.tokens])
+      self.assertEqual([doc.tokens.index(t.head) if t.head else None for t in doc.tokens], [other.tokens.index(t.head) if t.head else None for t in other.tokens])
+      self.assertEqual([(s.span, doc.tokens.index(s.first)) for s in doc.sents], [(s.span, other.tokens.index(s.first)) for s in other.sents])
+
+  def test_streamed(self):
+    docs = [create_doc(0, 50), create_doc(1, 0), create_doc(2, 7)]
+    data = serialise(docs)
+    self.assertDocs(list(SmallReader(six.BytesIO(data), Doc)), docs)
+    self.assertDocs(list(SmallReader(six.BytesIO(data), Doc, text=True)), docs)
+    self.assertDocs(list(SmallReader(six.BytesIO(data), Doc, stats=True)), docs)
+    self.assertDocs(list(dr.loads(data, Doc) for data in [serialise(docs[:1])]), docs[:1])
+    tmpdir = tempfile.mkdtemp()
+    try:
+      path = os.path.join(tmpdir, 'docs.dr')
+      with open(path, 'wb') as f:
+        f.write(data)
+      with open(path, 'rb') as f:
+        self.assertDocs(list(SmallReader(f, Doc, use_mmap=True)), docs)
+    finally:
+      shutil.rmtree(tmpdir)
+
+  def test_long_array(self):
+    # Longer than the default limit of msgpack's Unpacker.
+    doc = Doc(docid=0)
+    doc.tokens.create_n(140000)
+    data = serialise([doc])
+    self.assertEqual(len(dr.Reader(six.BytesIO(data), Doc).next().tokens), 140000)
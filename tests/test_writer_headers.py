@@ -0,0 +1,118 @@
+# vim: set et nosi ai ts=2 sts=2 sw=2:
+# coding: utf-8
+from __future__ import absolute_import, print_function, unicode_literals
+import unittest
+
+from schwa import dr
+import six
+
+
+class X(dr.Ann):
+  name = dr.Field()
+
+  class Meta:
+    name = 'test_writer_headers.X'
+
+
+class Y(dr.Ann):
+  x = dr.Pointer(X)
+  xs = dr.Pointers(X)
+
+  class Meta:
+    name = 'test_writer_headers.Y'
+
+
+class Doc(dr.Doc):
+  docid = dr.Field()
+  xs = dr.Store(X)
+  ys = dr.Store(Y)
+
+  class Meta:
+    name = 'test_writer_headers.Doc'
+
+
+class DocXs(dr.Doc):
+  docid = dr.Field()
+  xs = dr.Store(X)
+
+  class Meta:
+    name = 'test_writer_headers.DocXs'
+    serial = 'test_writer_headers.Doc'
+
+
+class DocExtra(dr.Doc):
+  docid = dr.Field()
+  xs = dr.Store(X)
+  zs = dr.Store(X)
+
+  class Meta:
+    name = 'test_writer_headers.DocExtra'
+    serial = 'test_writer_headers.Doc'
+
+
+def create_docs(*sizes):
+  docs = []
+  for i, size in enumerate(sizes):
+    doc = Doc(docid=i)
+    for j in range(size):
+      x = doc.xs.create(name='x{0}'.format(j))
+      doc.ys.create(x=x, xs=doc.xs[:j + 1])
+    docs.append(doc)
+  return docs
+
+
+def write(docs, doc_schema_or_doc, unshared=False):
+  out = six.BytesIO()
+  writer = dr.Writer(out, doc_schema_or_doc)
+  for doc in docs:
+    if unshared and doc._dr_rt is not None:
+      # Documents with an unshared class graph are written without the header cache.
+      doc._dr_rt = doc._dr_rt.copy()
+    writer.write(doc)
+  return out.getvalue(), writer
+
+
+def read(data, doc_schema_or_doc, **kwargs):
+  return list(dr.Reader(six.BytesIO(data), doc_schema_or_doc, **kwargs))
+
+
+class WriterHeadersTest(unittest.TestCase):
+  def test_new_docs(self):
+    data, writer = write(create_docs(2, 0, 3), Doc)
+    self.assertEqual((writer._headers.misses, writer._headers.hits), (1, 2))
+    docs = read(data, Doc)
+    self.assertEqual([len(doc.xs) for doc in docs], [2, 0, 3])
+    self.assertIs(docs[2].ys[1].xs[1], docs[2].xs[1])
+    self.assertEqual(write(docs, Doc, unshared=True)[0], data)
+
+  def test_read_docs(self):
+    data, writer = write(create_docs(1, 2, 3), Doc)
+    docs = read(data, Doc)
+    self.assertEqual(write(docs, Doc)[0], data)
+    docs = read(data, Doc)
+    self.assertEqual(write(docs, Doc, unshared=True)[0], data)
+
+  def test_lazy_stores(self):
+    data, writer = write(create_docs(1, 4), Doc)
+    for docs in (read(data, DocXs), read(data, Doc, stores=['xs'])):
+      out, writer = write(docs, docs[0].__class__)
+      self.assertEqual(out, data)
+      self.assertEqual((writer._headers.misses, writer._headers.hits), (1, 1))
+
+  def test_merged(self):
+    data, writer = write(create_docs(1, 2), Doc)
+    docs = read(data, DocXs)
+    for doc in docs:
+      doc.zs = dr.StoreList(X)
+    docs[1].zs.create(name='z')
+    out, writer = write(docs, DocExtra)
+    self.assertEqual((writer._headers.misses, writer._headers.hits), (1, 1))
+    self.assertIs(docs[0]._dr_rt.klasses, docs[1]._dr_rt.klasses)
+    expected = read(data, DocXs)
+    for doc in expected:
+      doc.zs = dr.StoreList(X)
+    expected[1].zs.create(name='z')
+    self.assertEqual(write(expected, DocExtra, unshared=True)[0], out)
+    docs = read(out, Doc, automagic=True)
+    self.assertEqual([len(doc.ys) for doc in docs], [1, 2])
+    self.assertEqual([[z.name for z in doc.zs] for doc in docs], [[], ['z']])
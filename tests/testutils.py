@@ -15,3 +15,27 @@ def write_read(doc, out_schema, in_schema=None):
   f.seek(0)
   print('Reading {0}'.format(in_schema))
   return dr.Reader(f, in_schema).next()
+
+
+def write_docs(docs, doc_schema):
+  """Returns the bytes of the documents written in turn by one Writer."""
+  f = six.BytesIO()
+  writer = dr.Writer(f, doc_schema)
+  for doc in docs:
+    writer.write(doc)
+  return f.getvalue()
+
+
+def create_docs(doc_klass, docids, nxs, name='x{0}'.format):
+  """
+  Returns a doc_klass instance for each docid, as made by the tests with a docid field and a
+  store xs of annotations with a name field. Each has nxs(docid) annotations, the j-th of which
+  is named name(j).
+  """
+  docs = []
+  for docid in docids:
+    doc = doc_klass(docid=docid)
+    for j in range(nxs(docid)):
+      doc.xs.create(name=name(j))
+    docs.append(doc)
+  return docs